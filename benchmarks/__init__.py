@@ -0,0 +1,4 @@
+"""
+Performance benchmarks. Run a benchmark as a module from the project root, e.g.:
+    python -m benchmarks.bench_update
+"""
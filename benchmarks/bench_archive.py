@@ -0,0 +1,57 @@
+"""
+Reads of an archived day from its memory-mapped columnar segment versus the same
+reads from SQLite: the whole day, an hour, and the 'show' output path.
+"""
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import DAY_START, make_log_items, timed
+from log_processing_demo import ndjson
+from log_processing_demo.archive import Archive
+from log_processing_demo.database import Database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    day = DAY_START.date().isoformat()
+    hour = ("10:00:00", "11:00:00")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "bench_archive.db"
+        db = Database(str(db_path))
+        with db.bulk_load():
+            db.update(iter(make_log_items(args.rows)))
+        store = Archive(Path(tmp_dir) / "archive")
+        elapsed, _ = timed(
+            lambda: store.write_day(
+                day, (row for batch in db.iter_day_rows(day) for row in batch)
+            )
+        )
+        size = os.path.getsize(store.segment_path(day))
+        print(
+            f"archived {args.rows:,} rows in {elapsed:.2f} s: segment "
+            f"{size / 2 ** 20:.1f} MiB, DB file {os.path.getsize(db_path) / 2 ** 20:.1f} MiB"
+        )
+
+        with open(os.devnull, "wb") as devnull:
+            for name, storage in (("sqlite", db), ("archive", store)):
+                scenarios = {
+                    "read a day": lambda: len(storage.read(day)),
+                    "read an hour": lambda: len(storage.read(day, hour)),
+                    "show a day": lambda: ndjson.write_ndjson(
+                        storage.iter_read(day, iso_format=True), devnull, fast=True
+                    ),
+                }
+                for scenario_name, scenario in scenarios.items():
+                    best = min(timed(scenario)[0] for _ in range(args.repeats))
+                    print(f"{name:>8} {scenario_name:>14}: {best:6.3f} s")
+        db.connection.close()
+
+
+if __name__ == "__main__":
+    main()
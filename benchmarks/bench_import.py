@@ -0,0 +1,106 @@
+"""
+Offline import of a large NDJSON file in the format printed by 'show': parsing in the
+main process versus a pool of parsing processes, for a plain and a gzip'd file. The
+file is generated once into a temporary directory, several GiB by default.
+"""
+import argparse
+import gzip
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import DAY_START, WORDS, peak_rss_mib, timed
+from log_processing_demo import bulk_import, database, ndjson
+
+# Records generated and written at once
+WRITE_BATCH = 100000
+
+
+def make_rows(count: int, day: int, rng: random.Random) -> List[Dict[str, str]]:
+    start = DAY_START + timedelta(days=day)
+    return [
+        {
+            "created_at": str(start + timedelta(seconds=rng.randrange(86400))),
+            "user_id": str(100000 + rng.randrange(1000)),
+            "first_name": "Имя",
+            "second_name": "Фамилия",
+            "message": " ".join(rng.choices(WORDS, k=12)),
+        }
+        for _ in range(count)
+    ]
+
+
+def write_file(path: Path, size: int, rows_per_day: int) -> int:
+    """Write NDJSON rows until the file is 'size' bytes, return the number of rows."""
+    rng = random.Random(0)
+    encode = ndjson.batch_encoder(fast=False)
+    rows = 0
+    with open(path, "wb") as file:
+        while file.tell() < size:
+            file.write(encode(make_rows(WRITE_BATCH, rows // rows_per_day, rng)))
+            rows += WRITE_BATCH
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--gib", type=float, default=2.0, help="Size of the file.")
+    parser.add_argument(
+        "--rows-per-day", type=int, default=1000000, help="Records per date."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        action="append",
+        help="Parsing processes, 0 for the main process. Repeatable, "
+        "default 0 and the number of CPUs.",
+    )
+    parser.add_argument("--block-size", type=int, default=8, help="MiB per block.")
+    parser.add_argument("--no-gzip", action="store_true", help="Skip the gzip'd file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        plain = Path(tmp_dir) / "logs.ndjson"
+        rows = write_file(plain, int(args.gib * 2**30), args.rows_per_day)
+        files = [plain]
+        if not args.no_gzip:
+            packed = Path(tmp_dir) / "logs.ndjson.gz"
+            with open(plain, "rb") as source, gzip.open(packed, "wb", 1) as target:
+                shutil.copyfileobj(source, target, 2**20)
+            files.append(packed)
+        print(
+            f"{rows:,} records, {plain.stat().st_size / 2**30:.2f} GiB of NDJSON, "
+            f"{os.cpu_count()} CPU(s)"
+        )
+
+        for path in files:
+            for workers in args.workers or [0, os.cpu_count() or 1]:
+                db_path = Path(tmp_dir) / "import.db"
+                db = database.Database(str(db_path))
+                with db.bulk_load():
+                    elapsed, results = timed(
+                        lambda: list(
+                            bulk_import.import_files(
+                                db,
+                                [path],
+                                workers=workers,
+                                block_size=args.block_size * 2**20,
+                            )
+                        )
+                    )
+                db.connection.close()
+                db_path.unlink()
+                assert results[0].records == rows, results[0].error
+                print(
+                    f"{path.name:>15} {workers:2d} worker(s): {elapsed:7.2f} s, "
+                    f"{rows / elapsed:9.0f} records/s"
+                )
+    print(f"peak RSS {peak_rss_mib():.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Overhead of instrumentation: the previous 'db_logging' decorator, which converted
+all arguments to strings, versus the current one with metrics disabled and enabled.
+Logging is set up like the command line does it, at INFO level into a file.
+"""
+import argparse
+import functools
+import logging
+import os
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks.common import make_log_items, timed
+from log_processing_demo import database, metrics
+
+
+def legacy_db_logging(log_statement: str):
+    """The decorator as it was before the metrics module."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            result_or_none = function(*args, **kwargs)
+            database.logger.info(
+                "%s - success: %s.\nArguments:%s, %s",
+                function.__name__,
+                log_statement,
+                str(args)[:100],
+                str(kwargs)[:100],
+            )
+            return result_or_none
+
+        return wrapper
+
+    return decorator
+
+
+def noop(*args, **kwargs) -> None:
+    pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, filename=os.devnull)
+    # Same function under every kind of instrumentation, sampled logging for
+    # the current decorator leaves only the cost of instrumentation itself
+    functions = {
+        "plain call": noop,
+        "legacy db_logging": legacy_db_logging("noop")(noop),
+        "db_logging, logged": database.db_logging("noop")(noop),
+        "db_logging, sampled": database.db_logging("noop", log_every=10**9)(noop),
+        "instrument": metrics.instrument("noop")(noop),
+    }
+    print(f"per call, {args.calls:,} calls with a short argument list:")
+    for enabled in (False, True):
+        metrics.registry.enabled = enabled
+        for name, function in functions.items():
+            elapsed = min(
+                timeit.repeat(
+                    lambda: function("2021-01-23", ("10:00:00", "11:00:00")),
+                    number=args.calls,
+                    repeat=3,
+                )
+            )
+            state = "metrics on " if enabled else "metrics off"
+            print(f"{state} {name:>20}: {elapsed / args.calls * 1e9:8.0f} ns")
+
+    items = make_log_items(args.rows)
+    update = database.Database.update.__wrapped__
+    variants = {
+        "legacy db_logging": legacy_db_logging("update LOG data")(update),
+        "db_logging, metrics off": database.db_logging("update LOG data")(update),
+        "db_logging, metrics on": database.db_logging("update LOG data")(update),
+    }
+    print(f"Database.update of {args.rows:,} records given as a list:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for number, (name, function) in enumerate(variants.items()):
+            metrics.registry.enabled = name.endswith("on")
+            db = database.Database(str(Path(tmp_dir) / f"{number}.db"))
+            with db.bulk_load():
+                elapsed, _ = timed(lambda: function(db, items))
+            # Formatting of the arguments alone, which the legacy decorator adds
+            stringify, _ = timed(lambda: str((db, items))[:100])
+            print(f"{name:>24}: {elapsed:6.3f} s (str(args) alone {stringify:.3f} s)")
+            db.connection.close()
+    metrics.registry.enabled = False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Per-row memory and time of parsing API records into a list of 'LogItem' objects
+versus a columnar 'LogBatch', and of sorting and storing the result.
+"""
+import argparse
+import gc
+import json
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import make_api_payload, timed
+from log_processing_demo import sort
+from log_processing_demo.database import Database
+from log_processing_demo.log_batch import LogBatch
+from log_processing_demo.log_item import LogItem
+
+
+def retained_memory(parse: Callable[[], Any]) -> int:
+    """Memory retained by the parse result, in bytes. Tracing slows parsing down."""
+    gc.collect()
+    tracemalloc.start()
+    result = parse()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+
+    records: List[Dict[str, Any]] = json.loads(make_api_payload(args.rows))["logs"]
+    parsers: Dict[str, Callable[[], Any]] = {
+        "LogItem list": lambda: list(map(LogItem.parse_obj, records)),
+        "LogBatch": lambda: LogBatch.from_records(records),
+    }
+
+    print(f"{args.rows:,} records")
+    print(f"{'':>14}{'parse, s':>10}{'bytes/row':>11}{'sort, s':>9}{'update, s':>11}")
+    for name, parse in parsers.items():
+        retained = retained_memory(parse)
+        elapsed, logs = timed(parse)
+        sort_time, _ = timed(lambda: sort.sort_by_time(logs))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = Database(str(Path(tmp_dir) / "bench_log_batch.db"))
+            with db.bulk_load():
+                update_time, _ = timed(lambda: db.update(logs))
+            db.connection.close()
+        print(
+            f"{name:>14}{elapsed:10.3f}{retained / args.rows:11.0f}"
+            f"{sort_time:9.3f}{update_time:11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Page fetch latency by depth within a multi-million-row day: keyset pagination with
+'Database.read_page' versus LIMIT/OFFSET over the read query and slicing the output
+of a whole-day 'read'. Cursors of the keyset pages are collected by walking the day.
+"""
+import argparse
+import itertools
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.common import make_log_items
+from log_processing_demo import database
+
+# Records generated at once
+GENERATE_BATCH = 200000
+
+OFFSET_QUERY = database.READ_QUERY.replace(
+    "lms.id;", "lms.id LIMIT ? OFFSET ?;"
+).format(table="log_messages")
+
+DEPTHS = (0.0, 0.01, 0.1, 0.5, 0.9, 0.999)
+
+
+def best_ms(function: Callable[[], object], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=3000000, help="Records of the day.")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = database.Database(str(Path(tmp_dir) / "pages.db"))
+        with db.bulk_load():
+            db.update(
+                itertools.chain.from_iterable(
+                    make_log_items(min(GENERATE_BATCH, args.rows - offset), seed=seed)
+                    for seed, offset in enumerate(range(0, args.rows, GENERATE_BATCH))
+                )
+            )
+        rows = db.cursor.execute("SELECT COUNT(*) FROM log_messages").fetchone()[0]
+        print(f"{rows:,} records, pages of {args.page_size}")
+
+        # Walk the whole day, keeping the cursors of the sampled depths
+        wanted = {int(rows * depth) // args.page_size for depth in DEPTHS}
+        cursors: Dict[int, Optional[str]] = {}
+        latencies: List[float] = []
+        cursor = None
+        for number in itertools.count():
+            if number in wanted:
+                cursors[number] = cursor
+            start = time.perf_counter()
+            page = db.read_page("2021-01-23", limit=args.page_size, cursor=cursor)
+            latencies.append(time.perf_counter() - start)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        deciles = statistics.quantiles([latency * 1000 for latency in latencies], n=10)
+        print(
+            f"walked {len(latencies):,} pages: median {deciles[4]:.2f} ms, "
+            f"p90 {deciles[8]:.2f} ms, max {max(latencies) * 1000:.2f} ms"
+        )
+
+        whole_day = best_ms(lambda: db.read("2021-01-23", iso_format=True), 1)
+        print(f"whole-day read, then slice: {whole_day:9.1f} ms for any page")
+        start, end = database._time_boundaries("2021-01-23")
+        print(f"{'depth':>7} {'page':>7} {'keyset ms':>10} {'OFFSET ms':>10}")
+        for depth in DEPTHS:
+            number = int(rows * depth) // args.page_size
+            keyset = best_ms(
+                lambda: db.read_page(
+                    "2021-01-23", limit=args.page_size, cursor=cursors[number]
+                ),
+                args.repeats,
+            )
+            offset = best_ms(
+                lambda: db.cursor.execute(
+                    OFFSET_QUERY,
+                    (start, end, args.page_size, number * args.page_size),
+                ).fetchall(),
+                args.repeats,
+            )
+            print(f"{depth:7.1%} {number:7d} {keyset:10.2f} {offset:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
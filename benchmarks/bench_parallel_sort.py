@@ -0,0 +1,38 @@
+"""
+Scaling of 'sort.parallel_sort' with the number of worker processes.
+"""
+import argparse
+import os
+
+from benchmarks.common import make_log_items, timed
+from log_processing_demo import sort
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    items = make_log_items(args.count)
+    expected = sorted(items, key=lambda x: x.created_at)
+
+    print(f"{args.count:,} items, {os.cpu_count()} CPUs")
+    serial_time = None
+    for workers in args.workers:
+        data = list(items)
+        elapsed, _ = timed(
+            lambda: sort.parallel_sort(
+                data, key=lambda x: x.created_at, workers=workers, threshold=0
+            )
+        )
+        assert all(a is b for a, b in zip(data, expected))
+        serial_time = serial_time or elapsed
+        print(
+            f"{workers:>3} worker(s): {elapsed:7.2f} s, "
+            f"speedup {serial_time / elapsed:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
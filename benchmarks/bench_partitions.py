@@ -0,0 +1,53 @@
+"""
+Single-table versus per-day partitioned storage: loading several days, reading one
+day and an interval, and retention which removes the older half of the days.
+"""
+import argparse
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.common import DAY_START, make_log_items, timed
+from log_processing_demo.database import Database, PartitionedDatabase
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--rows-per-day", type=int, default=100000)
+    args = parser.parse_args()
+
+    days = [DAY_START + timedelta(days=number) for number in range(args.days)]
+    read_day = days[-1].date().isoformat()
+    retention_day = days[args.days // 2 - 1].date().isoformat()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for layout in (Database, PartitionedDatabase):
+            path = Path(tmp_dir) / f"{layout.__name__}.db"
+            db = layout(str(path))
+            with db.bulk_load():
+                elapsed = 0.0
+                for number, day in enumerate(days):
+                    items = make_log_items(args.rows_per_day, seed=number, day=day)
+                    elapsed += timed(lambda: db.update(iter(items)))[0]
+            print(f"{layout.__name__}:")
+            print(f"{'load':>24}: {elapsed:6.2f} s")
+
+            read, rows = timed(lambda: len(db.read(read_day)))
+            print(f"{'read a day':>24}: {read:6.2f} s, {rows:,} rows")
+            interval = ("10:00:00", "11:00:00")
+            read, rows = timed(lambda: len(db.read(read_day, interval)))
+            print(f"{'read an hour':>24}: {read:6.2f} s, {rows:,} rows")
+
+            size = os.path.getsize(path)
+            flush, _ = timed(lambda: db.flush(retention_day))
+            print(
+                f"{'retention of ' + retention_day:>24}: {flush:6.2f} s, file "
+                f"{size / 2 ** 20:.1f} -> {os.path.getsize(path) / 2 ** 20:.1f} MiB"
+            )
+            db.connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Pipelined ingestion versus the serial paths of the 'fetch' command: every date
+streamed and written in turn, and concurrent downloads of whole days written from the
+main thread. The local API stand-in optionally limits the bandwidth of every response
+to imitate a remote API.
+"""
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.common import api_server, make_api_payload, timed
+from log_processing_demo import database, log_receiver, pipeline
+
+
+def serial_stream(url: str, db: database.Database, dates: List[str], args) -> None:
+    receiver = log_receiver.LogReceiver(url)
+    for date_string in dates:
+        db.update(receiver.stream(date_string), chunk_size=args.chunk_size)
+
+
+def concurrent_download(
+    url: str, db: database.Database, dates: List[str], args
+) -> None:
+    receiver = log_receiver.LogReceiver(url, pool_size=args.workers)
+    for result in receiver.fetch_many(dates, workers=args.workers, columnar=True):
+        db.update(result.logs, chunk_size=args.chunk_size)
+
+
+def pipelined(url: str, db: database.Database, dates: List[str], args) -> None:
+    receiver = log_receiver.LogReceiver(url, pool_size=args.workers)
+    ingest = pipeline.Pipeline(
+        receiver,
+        db,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        chunk_size=args.chunk_size,
+    )
+    for result in ingest.run(dates):
+        assert not result.error, result.error
+    if args.report:
+        print(ingest.stats.format_report())
+
+
+VARIANTS: Dict[str, Callable[..., None]] = {
+    "serial stream": serial_stream,
+    "concurrent download": concurrent_download,
+    "pipeline": pipelined,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dates", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=50000, help="Records per date.")
+    parser.add_argument("--workers", type=int, default=log_receiver.DEFAULT_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=pipeline.DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=database.DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        action="append",
+        help="MiB/s of every response, 0 for unlimited. Repeatable, default 0 and 4.",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--report", action="store_true", help="Print stage stats.")
+    args = parser.parse_args()
+
+    dates = [f"202101{day:02d}" for day in range(1, args.dates + 1)]
+    payloads = {
+        date_string: make_api_payload(args.rows, seed=number)
+        for number, date_string in enumerate(dates)
+    }
+    total_mib = sum(map(len, payloads.values())) / 2**20
+    print(f"{args.dates} dates of {args.rows:,} records, {total_mib:.1f} MiB of JSON")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for bandwidth in args.bandwidth or [0, 4]:
+            limit = bandwidth * 2**20 if bandwidth else None
+            label = f"{bandwidth:g} MiB/s" if bandwidth else "unlimited"
+            with api_server(payloads, bandwidth=limit) as url:
+                for name, variant in VARIANTS.items():
+                    best = float("inf")
+                    for number in range(args.repeats):
+                        path = Path(tmp_dir) / f"{name} {bandwidth} {number}.db"
+                        db = database.Database(str(path))
+                        with db.bulk_load():
+                            elapsed, _ = timed(lambda: variant(url, db, dates, args))
+                        db.connection.close()
+                        best = min(best, elapsed)
+                    rate = args.dates * args.rows / best
+                    print(
+                        f"{label:>10} {name:>20}: {best:7.3f} s, {rate:9.0f} records/s"
+                    )
+
+
+if __name__ == "__main__":
+    main()
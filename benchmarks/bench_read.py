@@ -0,0 +1,121 @@
+"""
+Read latency of a version 1 DB (text timestamps, no time index) versus the
+current schema, which the same file is upgraded to in place.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from benchmarks.common import DAY_START, timed
+from log_processing_demo import database
+
+LEGACY_READ_QUERY = """
+    SELECT lms.created_at, usr.user_id, usr.first_name, usr.second_name, lms.message
+    FROM log_messages lms
+        JOIN users usr
+            ON lms.user_id = usr.user_id
+    WHERE lms.created_at > ? AND lms.created_at < ?
+    ORDER BY lms.created_at;
+"""
+
+
+def fill_legacy(db_path: str, rows: int, days: int, users: int = 1000) -> None:
+    """Create a version 1 DB with 'rows' records spread evenly over 'days' days."""
+    rng = random.Random(0)
+    connection = sqlite3.connect(db_path)
+    database._create_tables(connection.cursor())
+    connection.execute("PRAGMA user_version = 1")
+    connection.executemany(
+        "INSERT INTO users VALUES (?, ?, ?)",
+        ((str(100000 + user), "Имя", "Фамилия") for user in range(users)),
+    )
+    connection.executemany(
+        "INSERT INTO log_messages (created_at, user_id, message) VALUES (?, ?, ?)",
+        (
+            (
+                str(DAY_START + timedelta(seconds=rng.randrange(86400 * days))),
+                str(100000 + rng.randrange(users)),
+                "They will be here by nightfall.",
+            )
+            for _ in range(rows)
+        ),
+    )
+    connection.commit()
+    connection.close()
+
+
+def legacy_reader(db_path: str) -> Callable[[Tuple[str, str]], list]:
+    """Read the way it was done with text timestamps and PARSE_DECLTYPES."""
+    connection = sqlite3.connect(
+        db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+    )
+    connection.row_factory = sqlite3.Row
+
+    def read(boundaries: Tuple[str, str]) -> list:
+        cursor = connection.execute(LEGACY_READ_QUERY, boundaries)
+        return [dict(item) for item in cursor.fetchall()]
+
+    return read
+
+
+def measure(read: Callable[..., list], repeat: int) -> Dict[str, float]:
+    """Median latency of a whole-day read and a one-hour interval read."""
+    day = DAY_START.date().isoformat()
+    queries = {
+        "day": lambda: read(day),
+        "1 hour": lambda: read(day, ("12:00:00", "13:00:00")),
+    }
+    return {
+        name: statistics.median(timed(query)[0] for _ in range(repeat))
+        for name, query in queries.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = str(Path(tmp_dir) / "bench_read.db")
+        fill_legacy(db_path, args.rows, args.days)
+
+        legacy_read = legacy_reader(db_path)
+
+        def read_v1(day: str, interval: Optional[Tuple[str, str]] = None) -> list:
+            start = datetime.fromisoformat(day)
+            if interval:
+                boundaries = (f"{day} {interval[0]}", f"{day} {interval[1]}")
+            else:
+                boundaries = (str(start), str(start + timedelta(days=1)))
+            return legacy_read(boundaries)
+
+        results = {"v1 schema": measure(read_v1, args.repeat)}
+
+        upgrade_time, db = timed(lambda: database.Database(db_path))
+        results["current"] = measure(db.read, args.repeat)
+        results["current, ISO"] = measure(
+            lambda *query: db.read(*query, iso_format=True), args.repeat
+        )
+        db.connection.close()
+
+    print(f"{args.rows:,} rows over {args.days} days, upgraded in {upgrade_time:.1f} s")
+    for name, latencies in results.items():
+        print(
+            f"{name:>14}: "
+            + ", ".join(
+                f"{query} {latency * 1000:7.1f} ms"
+                for query, latency in latencies.items()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Repeated reads of a stored day: uncached 'Database.read' versus the in-process read
+cache, and the 'show' output path versus the output cache kept in the DB file.
+"""
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import DAY_START, make_log_items, timed
+from log_processing_demo import ndjson
+from log_processing_demo.database import Database
+from log_processing_demo.read_cache import ReadCache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    day = DAY_START.date().isoformat()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir) / "bench_read_cache.db")
+        db = Database(path)
+        with db.bulk_load():
+            db.update(iter(make_log_items(args.rows)))
+        cached_db = Database(path, read_cache=ReadCache())
+        encode = ndjson.batch_encoder(True)
+        variant = ndjson.encoder_variant(True)
+
+        with open(os.devnull, "wb") as devnull:
+            scenarios = {
+                "read": lambda: len(db.read(day)),
+                "read, cached": lambda: len(cached_db.read(day)),
+                "show": lambda: ndjson.write_ndjson(
+                    db.iter_read(day, iso_format=True), devnull, fast=True
+                ),
+                "show, output cache": lambda: sum(
+                    map(devnull.write, db.iter_output(day, None, variant, encode))
+                ),
+            }
+            for name, scenario in scenarios.items():
+                times = [timed(scenario)[0] for _ in range(args.repeats)]
+                print(
+                    f"{name:>20}: first {times[0]:6.3f} s, "
+                    f"then {min(times[1:], default=times[0]):6.3f} s"
+                )
+
+        print(f"Read cache: {cached_db.read_cache.stats()}")
+        db.connection.close()
+        cached_db.connection.close()
+
+
+if __name__ == "__main__":
+    main()
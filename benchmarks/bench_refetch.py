@@ -0,0 +1,57 @@
+"""
+Cost of re-fetching a day which is already stored: deduplication by the unique key
+of records versus the incremental mode which skips records below the date watermark.
+"""
+import argparse
+import shutil
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import make_log_items, timed
+from log_processing_demo.database import Database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument(
+        "--new-share",
+        type=float,
+        default=0.01,
+        help="Share of the day which appeared since the previous fetch.",
+    )
+    args = parser.parse_args()
+
+    # The API returns a day in order of creation, new records come at its end
+    items = sorted(make_log_items(args.rows), key=lambda x: x.created_at)
+    previous = items[: int(args.rows * (1 - args.new_share))]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stored_path = Path(tmp_dir) / "stored.db"
+        db = Database(str(stored_path))
+        with db.bulk_load():
+            elapsed, _ = timed(lambda: db.update(iter(previous)))
+        db.connection.close()
+        print(f"{'first fetch':>32}: {elapsed:6.2f} s, {len(previous):,} new")
+
+        scenarios = {
+            "unchanged day": (previous, False),
+            "unchanged day, incremental": (previous, True),
+            f"{args.new_share:.0%} new records": (items, False),
+            f"{args.new_share:.0%} new records, incremental": (items, True),
+        }
+        for number, (name, (logs, incremental)) in enumerate(scenarios.items()):
+            path = Path(tmp_dir) / f"refetch_{number}.db"
+            shutil.copyfile(stored_path, path)
+            db = Database(str(path))
+            with db.bulk_load():
+                elapsed, stored = timed(
+                    lambda: db.update(iter(logs), incremental=incremental)
+                )
+            total = db.cursor.execute("SELECT COUNT(*) FROM log_messages").fetchone()[0]
+            db.connection.close()
+            print(f"{name:>32}: {elapsed:6.2f} s, {stored:,} new, {total:,} stored")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Fetching a day through 'LogReceiver' without a response cache, into an empty cache,
+revalidated against the cache and served from it as an immutable past day.
+"""
+import argparse
+import tempfile
+from typing import List
+
+from benchmarks.common import api_server, make_api_payload, timed
+from log_processing_demo.log_receiver import LogReceiver
+from log_processing_demo.response_cache import ResponseCache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument(
+        "--body-only",
+        action="store_true",
+        help="Only read the response body, without parsing records.",
+    )
+    args = parser.parse_args()
+
+    date_string = "20210123"
+    payload = make_api_payload(args.rows)
+    hits: List[str] = []
+
+    with api_server({date_string: payload}, hits) as base_url:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            revalidating = ResponseCache(tmp_dir)
+            immutable = ResponseCache(tmp_dir, immutable_past=True)
+            scenarios = {
+                "no cache": LogReceiver(base_url),
+                "empty cache": LogReceiver(base_url, cache=revalidating),
+                "revalidated": LogReceiver(base_url, cache=revalidating),
+                "immutable past": LogReceiver(base_url, cache=immutable),
+            }
+
+            print(f"{args.rows:,} records, {len(payload) / 2 ** 20:.1f} MiB payload")
+            for name, receiver in scenarios.items():
+                if args.body_only:
+                    fetch = lambda: _read_body(receiver, date_string)  # noqa: E731
+                else:
+                    fetch = lambda: receiver.batch(date_string)  # noqa: E731
+                requests_before = len(hits)
+                elapsed, _ = timed(fetch)
+                print(
+                    f"{name:>16}: {elapsed:6.3f} s, "
+                    f"{len(hits) - requests_before} request(s)"
+                )
+
+            cached = sum(
+                path.stat().st_size for path in revalidating.directory.iterdir()
+            )
+            print(f"Cached size: {cached / 2 ** 20:.1f} MiB")
+
+
+def _read_body(receiver: LogReceiver, date_string: str) -> int:
+    """Read a response body through the receiver and the cache, return its size."""
+    chunks, writer = receiver.open_body(date_string, 64 * 1024)
+    try:
+        size = sum(map(len, chunks))
+        if writer:
+            writer.commit()
+    finally:
+        chunks.close()
+        if writer:
+            writer.discard()
+    return size
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Rollup tables: latency of 'Database.stats' versus the same aggregates computed from
+stored messages, and the ingest cost of keeping the rollups up to date.
+"""
+import argparse
+import contextlib
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from benchmarks.common import DAY_START, make_log_items, timed
+from log_processing_demo import database
+
+# Aggregates of a day computed from stored messages, as 'stats' would without rollups
+SCAN_QUERIES = {
+    "minute": """
+        SELECT created_at / 60000000, COUNT(*), SUM(length(CAST(message AS BLOB)))
+        FROM log_messages WHERE created_at >= ? AND created_at < ? GROUP BY 1
+    """,
+    "hour": """
+        SELECT created_at / 3600000000, COUNT(*), SUM(length(CAST(message AS BLOB)))
+        FROM log_messages WHERE created_at >= ? AND created_at < ? GROUP BY 1
+    """,
+    "user": """
+        SELECT user_id, COUNT(*), SUM(length(CAST(message AS BLOB)))
+        FROM log_messages WHERE created_at >= ? AND created_at < ? GROUP BY 1
+    """,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--load-repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    items = make_log_items(args.rows)
+    day = DAY_START.date().isoformat()
+    start, end = database._time_boundaries(day)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The rollups are switched off for the first load to measure their cost
+        for name, patch in (
+            ("without rollups", lambda: mock.patch.object(database, "_roll_up")),
+            ("with rollups", contextlib.nullcontext),
+        ):
+            best = float("inf")
+            for number in range(args.load_repeats):
+                db = database.Database(str(Path(tmp_dir) / f"{name} {number}.db"))
+                with patch(), db.bulk_load():
+                    best = min(best, timed(lambda: db.update(iter(items)))[0])
+            print(f"{'load ' + name:>24}: {best:8.3f} s")
+
+        for by, query in SCAN_QUERIES.items():
+            scan = min(
+                timed(lambda: db.cursor.execute(query, (start, end)).fetchall())[0]
+                for _ in range(args.repeats)
+            )
+            stats = min(
+                timed(lambda: db.stats(day, by))[0] for _ in range(args.repeats)
+            )
+            print(
+                f"{'stats by ' + by:>24}: {stats * 1000:8.3f} ms, "
+                f"scan of messages {scan * 1000:8.1f} ms"
+            )
+
+        elapsed, differences = timed(db.check_rollups)
+        print(
+            f"{'check_rollups':>24}: {elapsed:8.3f} s, {len(differences)} differences"
+        )
+        db.connection.close()
+
+
+if __name__ == "__main__":
+    main()
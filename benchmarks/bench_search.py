@@ -0,0 +1,86 @@
+"""
+Latency of 'Database.search' with the FTS5 index versus linear scans: a LIKE query
+in SQLite and the 'show | grep' way, reading every row and matching it in Python.
+"""
+import argparse
+import re
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.common import DAY_START, make_log_items, timed
+from log_processing_demo.database import Database
+
+# Word put into a small share of messages, all other words are very frequent
+RARE_WORD = "mithril"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=4)
+    parser.add_argument("--rows-per-day", type=int, default=500000)
+    parser.add_argument(
+        "--rare-share",
+        type=float,
+        default=0.0001,
+        help=f"Share of messages which contain '{RARE_WORD}'.",
+    )
+    args = parser.parse_args()
+
+    days = [
+        (DAY_START + timedelta(days=number)).date().isoformat()
+        for number in range(args.days)
+    ]
+    every = max(1, int(1 / args.rare_share))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(str(Path(tmp_dir) / "bench_search.db"))
+        elapsed = 0.0
+        with db.bulk_load():
+            for number in range(args.days):
+                items = make_log_items(
+                    args.rows_per_day,
+                    seed=number,
+                    day=DAY_START + timedelta(days=number),
+                )
+                for item in items[::every]:
+                    item.message = f"{item.message} {RARE_WORD}"
+                elapsed += timed(lambda: db.update(iter(items)))[0]
+        total = args.days * args.rows_per_day
+        print(f"{total:,} rows loaded with the search index in {elapsed:.1f} s")
+
+        like = (
+            "SELECT COUNT(*) FROM log_messages "
+            "WHERE message LIKE ? AND created_at > ? AND created_at < ?"
+        )
+        pattern = re.compile(rf"\b{RARE_WORD}\b", re.IGNORECASE)
+
+        def grep(day: str) -> int:
+            return sum(
+                1
+                for batch in db.iter_read(day, iso_format=True)
+                for item in batch
+                if pattern.search(item["message"])
+            )
+
+        scenarios = {
+            f"search '{RARE_WORD}'": lambda: len(db.search(RARE_WORD, limit=1000)),
+            "search 'mith*'": lambda: len(db.search("mith*", limit=1000)),
+            f"search '{RARE_WORD}', one day": lambda: len(
+                db.search(RARE_WORD, days[-1], limit=1000)
+            ),
+            "search '\"never come\"', top 20": lambda: len(db.search('"never come"')),
+            "search 'nightfall', top 20": lambda: len(db.search("nightfall")),
+            f"LIKE '%{RARE_WORD}%'": lambda: db.cursor.execute(
+                like, (f"%{RARE_WORD}%", -(2**63), 2**63 - 1)
+            ).fetchone()[0],
+            "show | grep, one day": lambda: grep(days[-1]),
+        }
+        for name, scenario in scenarios.items():
+            elapsed, found = timed(scenario)
+            print(f"{name:>34}: {elapsed * 1000:9.1f} ms, {found:,} rows")
+        db.connection.close()
+
+
+if __name__ == "__main__":
+    main()
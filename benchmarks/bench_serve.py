@@ -0,0 +1,146 @@
+"""
+Latency of 'serve' queries while a bulk ingest writes to the same DB file from
+another process, with the rollback journal and in WAL mode, against an idle baseline.
+Clients ask for random one-minute windows of a stored day over keep-alive sessions.
+The server and the ingest run in processes of their own.
+"""
+import argparse
+import multiprocessing
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import requests
+
+from benchmarks.common import DAY_START, make_log_items
+from log_processing_demo import database, server
+
+
+def run_server(db_path: str, wal: bool, pool_size: int, urls) -> None:
+    query_server = server.QueryServer(
+        db_path, ("127.0.0.1", 0), pool_size=pool_size, wal=wal
+    )
+    urls.put(query_server.url)
+    query_server.serve_forever()
+
+
+def run_ingest(db_path: str, rows: int, started, done) -> None:
+    items = make_log_items(rows, seed=1, day=DAY_START + timedelta(days=1))
+    db = database.open_database(db_path)
+    started.set()
+    with db.bulk_load():
+        db.update(items)
+    db.connection.close()
+    done.set()
+
+
+def client(url: str, stop: threading.Event, latencies: List[float], errors: List[int]):
+    session = requests.Session()
+    rng = random.Random(threading.get_ident())
+    while not stop.is_set():
+        minute = rng.randrange(24 * 60 - 1)
+        interval = f"{minute // 60:02d}:{minute % 60:02d}:00-"
+        interval += f"{(minute + 1) // 60:02d}:{(minute + 1) % 60:02d}:00"
+        start = time.perf_counter()
+        response = session.get(f"{url}/logs/2021-01-23", params={"interval": interval})
+        response.content
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+def measure(
+    db_path: str, wal: bool, args, ingest_rows: Optional[int]
+) -> Tuple[List[float], int, float]:
+    """Latencies, error count and seconds of clients running until the ingest ends."""
+    context = multiprocessing.get_context("fork")
+    urls = context.Queue()
+    server_process = context.Process(
+        target=run_server, args=(db_path, wal, args.clients, urls), daemon=True
+    )
+    server_process.start()
+    url = urls.get()
+
+    started, done = context.Event(), context.Event()
+    ingest = None
+    if ingest_rows:
+        ingest = context.Process(
+            target=run_ingest, args=(db_path, ingest_rows, started, done)
+        )
+        ingest.start()
+        started.wait()
+
+    stop = threading.Event()
+    latencies: List[float] = []
+    errors: List[int] = []
+    threads = [
+        threading.Thread(target=client, args=(url, stop, latencies, errors))
+        for _ in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    if ingest:
+        done.wait()
+        ingest.join()
+    else:
+        time.sleep(args.idle_seconds)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server_process.terminate()
+    server_process.join()
+    return latencies, len(errors), elapsed
+
+
+def percentile(values: List[float], share: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000, help="Records stored.")
+    parser.add_argument(
+        "--ingest-rows", type=int, default=500000, help="Records of the bulk ingest."
+    )
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        template = Path(tmp_dir) / "template.db"
+        db = database.Database(str(template))
+        with db.bulk_load():
+            db.update(make_log_items(args.rows))
+        db.connection.close()
+        print(
+            f"{args.rows:,} records stored, {args.ingest_rows:,} ingested, "
+            f"{args.clients} client(s)"
+        )
+
+        for mode, wal in (("rollback", False), ("wal", True)):
+            for label, ingest_rows in (("idle", None), ("ingest", args.ingest_rows)):
+                db_path = Path(tmp_dir) / f"{mode}-{label}.db"
+                shutil.copy(template, db_path)
+                latencies, errors, elapsed = measure(
+                    str(db_path), wal, args, ingest_rows
+                )
+                ms = [latency * 1000 for latency in latencies]
+                print(
+                    f"{mode:>8} {label:>6}: {len(ms) / elapsed:6.0f} queries/s, "
+                    f"p50 {statistics.median(ms):7.1f} ms, "
+                    f"p95 {percentile(ms, 0.95):7.1f} ms, "
+                    f"p99 {percentile(ms, 0.99):7.1f} ms, "
+                    f"max {max(ms):7.1f} ms, {errors} error(s), {elapsed:.1f} s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Throughput and peak memory of the 'show' output path: the old read/print loop versus
+batched 'Database.iter_read' + 'ndjson.write_ndjson', with and without the fast encoder.
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.common import DAY_START, make_log_items, timed
+from log_processing_demo import ndjson
+from log_processing_demo.database import Database
+
+
+def legacy_show(db: Database, day: str, devnull: io.TextIOBase) -> int:
+    """Materialize the whole day and print it line by line."""
+    lines = 0
+    for element in db.read(day):
+        element["created_at"] = str(element["created_at"])
+        print(json.dumps(element, ensure_ascii=False), file=devnull)
+        lines += 1
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+
+    day = DAY_START.date().isoformat()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(str(Path(tmp_dir) / "bench_show.db"))
+        with db.bulk_load():
+            db.update(make_log_items(args.rows))
+
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            scenarios = {
+                "print per line": lambda: legacy_show(db, day, devnull),
+                "batched": lambda: ndjson.write_ndjson(
+                    db.iter_read(day, iso_format=True), devnull.buffer
+                ),
+                "batched, fast JSON": lambda: ndjson.write_ndjson(
+                    db.iter_read(day, iso_format=True), devnull.buffer, fast=True
+                ),
+            }
+            for name, scenario in scenarios.items():
+                elapsed, lines = timed(scenario)
+                # Memory is measured in a separate run, tracing slows everything down
+                tracemalloc.start()
+                scenario()
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+                print(
+                    f"{name:>20}: {lines / elapsed:10,.0f} lines/sec, "
+                    f"peak traced memory {peak:7.1f} MiB"
+                )
+        db.connection.close()
+
+    if ndjson.orjson is None:
+        print("orjson is not installed, fast JSON used the compact stdlib encoder")
+
+
+if __name__ == "__main__":
+    main()
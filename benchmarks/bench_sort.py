@@ -0,0 +1,91 @@
+"""
+Sorting 'LogItem' lists by 'created_at': the previous recursive Mergesort versus the
+current 'sort.sort' versus the built-in 'sorted' on typical input orders.
+"""
+import argparse
+import random
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import make_log_items, timed
+from log_processing_demo import sort
+from log_processing_demo.log_item import LogItem
+
+
+def legacy_sort(input_list: List[Any], key: Callable[[Any], Any]) -> None:
+    """Top-down recursive Mergesort calling 'key' on every comparison."""
+
+    def merge_sort(left_index: int, right_index: int) -> None:
+        if left_index >= right_index:
+            return
+        middle = (left_index + right_index) // 2
+        merge_sort(left_index, middle)
+        merge_sort(middle + 1, right_index)
+
+        left_copy = input_list[left_index : middle + 1]
+        right_copy = input_list[middle + 1 : right_index + 1]
+        left_copy_index = right_copy_index = 0
+        sorted_index = left_index
+        while left_copy_index < len(left_copy) and right_copy_index < len(right_copy):
+            if key(left_copy[left_copy_index]) <= key(right_copy[right_copy_index]):
+                input_list[sorted_index] = left_copy[left_copy_index]
+                left_copy_index += 1
+            else:
+                input_list[sorted_index] = right_copy[right_copy_index]
+                right_copy_index += 1
+            sorted_index += 1
+        rest = left_copy[left_copy_index:] + right_copy[right_copy_index:]
+        input_list[sorted_index : sorted_index + len(rest)] = rest
+
+    merge_sort(0, len(input_list) - 1)
+
+
+def make_orders(count: int, seed: int = 0) -> Dict[str, List[LogItem]]:
+    """Random, sorted, reversed and nearly sorted (1% of local swaps) LOG lists."""
+    rng = random.Random(seed)
+    items = make_log_items(count, seed=seed)
+    ordered = sorted(items, key=lambda x: x.created_at)
+    nearly_sorted = list(ordered)
+    for _ in range(count // 100):
+        index = rng.randrange(count - 10)
+        offset = rng.randrange(1, 10)
+        nearly_sorted[index], nearly_sorted[index + offset] = (
+            nearly_sorted[index + offset],
+            nearly_sorted[index],
+        )
+    return {
+        "random": items,
+        "sorted": ordered,
+        "reversed": ordered[::-1],
+        "nearly sorted": nearly_sorted,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    def by_time(item: LogItem) -> Any:
+        return item.created_at
+
+    engines: Dict[str, Callable[[List[LogItem]], None]] = {
+        "legacy": lambda data: legacy_sort(data, key=by_time),
+        "sort.sort": lambda data: sort.sort(data, key=by_time),
+        "list.sort": lambda data: data.sort(key=by_time),
+    }
+
+    print(f"{args.count:,} items, seconds")
+    print(f"{'order':>14}" + "".join(f"{name:>12}" for name in engines))
+    for order, data in make_orders(args.count).items():
+        expected = sorted(data, key=by_time)
+        line = f"{order:>14}"
+        for engine in engines.values():
+            copy = list(data)
+            elapsed, _ = timed(lambda: engine(copy))
+            assert copy == expected
+            line += f"{elapsed:12.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
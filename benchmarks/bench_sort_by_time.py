@@ -0,0 +1,57 @@
+"""
+Sorting 'LogItem' lists by 'created_at': the pure-Python 'sort.sort' versus the
+NumPy-backed 'sort.sort_by_time' versus the built-in 'list.sort'.
+"""
+import argparse
+from typing import Callable, Dict, List
+
+from benchmarks.common import make_log_items, timed
+from log_processing_demo import sort
+from log_processing_demo.log_item import LogItem
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--counts", type=int, nargs="+", default=[10000, 1000000, 10000000]
+    )
+    parser.add_argument(
+        "--python-limit",
+        type=int,
+        default=1000000,
+        help="Skip 'sort.sort' for larger lists, it takes minutes on 10M items.",
+    )
+    args = parser.parse_args()
+
+    if sort.numpy is None:
+        parser.error("NumPy is not installed, 'sort_by_time' would fall back to 'sort'")
+
+    def by_time(item: LogItem) -> object:
+        return item.created_at
+
+    engines: Dict[str, Callable[[List[LogItem]], None]] = {
+        "sort.sort": lambda data: sort.sort(data, key=by_time),
+        "sort_by_time": sort.sort_by_time,
+        "list.sort": lambda data: data.sort(key=by_time),
+    }
+
+    print("seconds, random order")
+    print(f"{'items':>12}" + "".join(f"{name:>14}" for name in engines))
+    for count in args.counts:
+        items = make_log_items(count)
+        expected = sorted(items, key=by_time)
+        line = f"{count:>12,}"
+        for name, engine in engines.items():
+            if name == "sort.sort" and count > args.python_limit:
+                line += f"{'-':>14}"
+                continue
+            data = list(items)
+            elapsed, _ = timed(lambda: engine(data))
+            assert all(a is b for a, b in zip(data, expected))
+            line += f"{elapsed:14.3f}"
+        print(line, flush=True)
+        del items, expected
+
+
+if __name__ == "__main__":
+    main()
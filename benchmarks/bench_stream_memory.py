@@ -0,0 +1,65 @@
+"""
+Peak RSS of 'LogReceiver.__call__' (whole body in memory) versus 'LogReceiver.stream'.
+
+Every measurement runs in a fresh subprocess, so the numbers are real peak RSS.
+"""
+import argparse
+import subprocess
+import sys
+
+from benchmarks.common import api_server, make_api_payload, peak_rss_mib
+from log_processing_demo.log_receiver import LogReceiver
+
+
+def child(mode: str, base_url: str) -> None:
+    """Consume one day in the given mode and print peak RSS in MiB."""
+    receiver = LogReceiver(base_url)
+    if mode == "list":
+        count = len(receiver("20210123"))
+    else:
+        count = sum(1 for _ in receiver.stream("20210123"))
+    print(f"{count} {peak_rss_mib():.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument(
+        "--child", nargs=2, metavar=("MODE", "URL"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print(
+        f"{'records':>10} {'payload MiB':>12} {'list RSS MiB':>13} {'stream RSS MiB':>15}"
+    )
+    for size in args.sizes:
+        payload = make_api_payload(size)
+        with api_server({"20210123": payload}) as base_url:
+            peaks = []
+            for mode in ("list", "stream"):
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.bench_stream_memory",
+                        "--child",
+                        mode,
+                        base_url,
+                    ],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout.split()
+                assert int(output[0]) == size
+                peaks.append(float(output[1]))
+        print(
+            f"{size:>10} {len(payload) / 2**20:>12.1f} {peaks[0]:>13.1f} {peaks[1]:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
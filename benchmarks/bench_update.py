@@ -0,0 +1,59 @@
+"""
+Ingest throughput: per-row INSERT loop versus batched 'Database.update'.
+"""
+import argparse
+import tempfile
+from pathlib import Path
+from typing import List
+
+from benchmarks.common import make_log_items, timed
+from log_processing_demo.database import Database
+from log_processing_demo.log_item import LogItem
+
+
+def legacy_update(db: Database, message_list: List[LogItem]) -> None:
+    """Row-by-row ingest as it was done before batching."""
+    for element in message_list:
+        db.cursor.execute(
+            "INSERT OR IGNORE INTO users (user_id, first_name, second_name) "
+            "VALUES (?, ?, ?)",
+            (element.user_id, element.first_name, element.second_name),
+        )
+        db.cursor.execute(
+            "INSERT INTO log_messages (created_at, user_id, message) VALUES (?, ?, ?)",
+            (element.created_at, element.user_id, element.message),
+        )
+    db.connection.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    items = make_log_items(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scenarios = {
+            "legacy loop": lambda db: legacy_update(db, items),
+            "update": lambda db: db.update(items, chunk_size=args.chunk_size),
+        }
+
+        def bulk(db: Database) -> None:
+            with db.bulk_load():
+                db.update(iter(items), chunk_size=args.chunk_size)
+
+        scenarios["update + bulk_load"] = bulk
+
+        for number, (name, scenario) in enumerate(scenarios.items()):
+            db = Database(str(Path(tmp_dir) / f"bench_{number}.db"))
+            elapsed, _ = timed(lambda: scenario(db))
+            print(
+                f"{name:>20}: {args.rows / elapsed:12,.0f} rows/sec ({elapsed:.2f} s)"
+            )
+            db.connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Cost of picking up new records of the current day: a cron-style 'fetch --incremental'
+run, which starts Python, imports the package and opens the DB every time, versus
+a poll of a resident 'watch.Watcher'. Between ticks the local API stand-in appends
+records to the day.
+"""
+import argparse
+import cProfile
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from benchmarks.common import api_server, make_log_items, timed
+from log_processing_demo import database, log_receiver, watch
+
+
+def payload(items) -> bytes:
+    logs = ",".join(
+        json.dumps(
+            {**item.dict(), "created_at": item.created_at.isoformat()},
+            ensure_ascii=False,
+        )
+        for item in items
+    )
+    return f'{{"error": "", "logs": [{logs}]}}'.encode("utf-8")
+
+
+class TickPayloads:
+    """Payloads of a date by the number of the current tick."""
+
+    def __init__(self, date_string: str, payloads: List[bytes], tick_number) -> None:
+        self.date_string = date_string
+        self.payloads = payloads
+        self.tick_number = tick_number
+
+    def get(self, date_string: str) -> Optional[bytes]:
+        if date_string != self.date_string:
+            return None
+        return self.payloads[self.tick_number.value]
+
+
+def serve(date_string: str, payloads: List[bytes], tick_number, urls) -> None:
+    with api_server(TickPayloads(date_string, payloads, tick_number)) as url:
+        urls.put(url)
+        threading.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000, help="Records of the day.")
+    parser.add_argument("--appended", type=int, default=100, help="Records per tick.")
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    date_string = today.strftime(log_receiver.DATE_PATH_FORMAT)
+    total = args.rows + args.appended * args.ticks
+    items = sorted(make_log_items(total, day=today), key=lambda item: item.created_at)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    # Day of every tick, served by a separate process in both modes like a remote API
+    payloads = [
+        payload(items[: args.rows + number * args.appended])
+        for number in range(args.ticks + 1)
+    ]
+    del items  # don't make the garbage collector of the resident process slower
+    tick_number = multiprocessing.Value("i", 0)
+    urls: multiprocessing.Queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(date_string, payloads, tick_number, urls), daemon=True
+    )
+    server.start()
+    url = urls.get()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in ("cron fetch", "watch poll"):
+            db_file = Path(tmp_dir) / f"{mode}.db"
+            if mode == "cron fetch":
+
+                def tick() -> None:
+                    subprocess.run(
+                        [
+                            sys.executable,
+                            "-m",
+                            "log_processing_demo",
+                            "fetch",
+                            url,
+                            date_string,
+                            str(db_file),
+                            "--incremental",
+                        ],
+                        check=True,
+                        stdout=subprocess.DEVNULL,
+                        cwd=tmp_dir,
+                        env=env,
+                    )
+
+            else:
+                db = database.Database(str(db_file))
+                watcher = watch.Watcher(log_receiver.LogReceiver(url), db)
+                tick = watcher.poll
+                if args.profile:
+                    tick()
+                    cProfile.runctx("tick()", globals(), locals(), sort="cumtime")
+
+            tick_number.value = 0
+            initial, _ = timed(tick)
+            seconds = []
+            for number in range(1, args.ticks + 1):
+                tick_number.value = number
+                seconds.append(timed(tick)[0])
+            print(
+                f"{mode:>12}: first {initial:6.3f} s, "
+                f"then {sum(seconds) / len(seconds):6.3f} s per tick "
+                f"({args.appended} new of {args.rows:,} records)"
+            )
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
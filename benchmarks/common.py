@@ -0,0 +1,210 @@
+"""
+Helpers shared by benchmark scripts.
+"""
+import contextlib
+import hashlib
+import json
+import random
+import resource
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from log_processing_demo.log_item import LogItem
+
+DAY_START = datetime(2021, 1, 23)
+
+# Size of a write of a bandwidth limited 'api_server' response
+THROTTLED_WRITE_SIZE = 16 * 1024
+WORDS = (
+    "They will be here by nightfall. Leave now and never come back. "
+    "Shall I describe it to you? Or would you like me to find you a box?"
+).split()
+
+
+def make_log_items(
+    count: int,
+    users: int = 1000,
+    seed: int = 0,
+    day: datetime = DAY_START,
+    message_words: int = 12,
+    disorder: float = 1.0,
+) -> List[LogItem]:
+    """Generate a deterministic list of LOG records within one day.
+
+    Parameters
+    ----------
+    count : int
+        Number of records.
+    users : int
+        Number of distinct users.
+    seed : int
+        Random seed.
+    day : datetime
+        Day the records belong to.
+    message_words : int
+        Number of words in a message.
+    disorder : float
+        Share of records out of creation time order: 0 gives sorted records, 1 gives
+        records in random order.
+
+    Returns
+    -------
+    List[LogItem]
+        Synthetic LOG records.
+
+    """
+    rng = random.Random(seed)
+    items = [
+        LogItem.construct(
+            user_id=str(100000 + rng.randrange(users)),
+            created_at=day + timedelta(seconds=rng.randrange(86400)),
+            first_name="Имя",
+            second_name="Фамилия",
+            message=" ".join(rng.choices(WORDS, k=message_words)),
+        )
+        for _ in range(count)
+    ]
+    if disorder < 1:
+        items.sort(key=lambda item: item.created_at)
+        # Displaced records swap places with each other at random
+        displaced = rng.sample(range(count), int(count * disorder))
+        moved = [items[index] for index in displaced]
+        rng.shuffle(moved)
+        for index, item in zip(displaced, moved):
+            items[index] = item
+    return items
+
+
+def timed(function: Callable[[], object]) -> Tuple[float, object]:
+    """Call a function once and measure wall time.
+
+    Parameters
+    ----------
+    function : Callable[[], object]
+        Function without arguments.
+
+    Returns
+    -------
+    Tuple[float, object]
+        Elapsed seconds and the function result.
+
+    """
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def peak_rss_mib() -> float:
+    """Peak RSS of the current process.
+
+    'ru_maxrss' survives exec() and would include the parent's memory at fork time,
+    so the per-process high-water mark from /proc is preferred where available.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_api_payload(count: int, seed: int = 0, **options: Any) -> bytes:
+    """Build an API response body with 'count' synthetic records.
+
+    Parameters
+    ----------
+    count : int
+        Number of records.
+    seed : int
+        Random seed.
+    **options : Any
+        Other 'make_log_items' arguments.
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON in the LOG API format.
+
+    """
+    logs = [
+        {**item.dict(), "created_at": item.created_at.isoformat()}
+        for item in make_log_items(count, seed=seed, **options)
+    ]
+    return json.dumps({"error": "", "logs": logs}, ensure_ascii=False).encode("utf-8")
+
+
+@contextlib.contextmanager
+def api_server(
+    payloads: Dict[str, bytes],
+    hits: Optional[List[str]] = None,
+    bandwidth: Optional[float] = None,
+) -> Iterator[str]:
+    """Serve prepared API responses from a local HTTP server in a background thread.
+
+    Responses carry an ETag, conditional requests are answered with 304 Not Modified.
+
+    Parameters
+    ----------
+    payloads : Dict[str, bytes]
+        Response bodies by date path, e.g. {"20210123": b"{...}"}.
+    hits : Optional[List[str]]
+        List to append the date path of every served request to.
+    bandwidth : Optional[float]
+        Bytes per second sent in every response, to imitate a remote API.
+        Unlimited by default.
+
+    Returns
+    -------
+    Iterator[str]
+        Base URL of the server.
+
+    """
+
+    hits = [] if hits is None else hits
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            date_string = self.path.rsplit("/", 1)[-1]
+            body = payloads.get(date_string)
+            if body is None:
+                self.send_error(404)
+                return
+            hits.append(date_string)
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            if bandwidth is None:
+                self.wfile.write(body)
+                return
+            start = time.perf_counter()
+            for offset in range(0, len(body), THROTTLED_WRITE_SIZE):
+                self.wfile.write(body[offset : offset + THROTTLED_WRITE_SIZE])
+                delay = start + offset / bandwidth - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/logs/"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,382 @@
+"""
+End-to-end benchmark suite: fetch from a local API stand-in, ingest, read, sort and
+the 'show' CLI on a synthetic day. Reports throughput, latency percentiles and peak
+memory of every scenario, and compares them with stored baselines.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from benchmarks.common import DAY_START, api_server, make_log_items, peak_rss_mib
+from log_processing_demo import database, sort
+from log_processing_demo.log_item import LogItem
+from log_processing_demo.log_receiver import LogReceiver
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+
+# Allowed share of throughput loss and memory growth against the baseline
+DEFAULT_TOLERANCE = 0.3
+
+# Peak memory growth below this is never a regression, small peaks are noisy
+MEMORY_SLACK_MIB = 1.0
+
+
+class Workload(NamedTuple):
+    """Data shared by the scenarios, prepared once."""
+
+    items: List[LogItem]
+    payload: bytes
+    db_path: Path
+    tmp_dir: Path
+
+
+class Measurement(NamedTuple):
+    """Outcome of a single run of a scenario."""
+
+    rows: int
+    latencies: List[float]  # seconds of every operation of the run
+    peak_rss_mib: Optional[float] = None  # for scenarios run in a subprocess
+
+
+def fetch_scenario(workload: Workload) -> Measurement:
+    """Stream the day from the API stand-in, a single request."""
+    with api_server({"20210123": workload.payload}) as base_url:
+        receiver = LogReceiver(base_url)
+        start = time.perf_counter()
+        rows = sum(1 for _ in receiver.stream("20210123"))
+        return Measurement(rows, [time.perf_counter() - start])
+
+
+def ingest_scenario(workload: Workload) -> Measurement:
+    """Store the day into a new DB file the way 'fetch' does, latency per chunk."""
+    handle, path = tempfile.mkstemp(suffix=".db", dir=workload.tmp_dir)
+    os.close(handle)
+    db = database.Database(path)
+    latencies: List[float] = []
+    try:
+        with db.bulk_load():
+            rows = db.update(
+                _timed_chunks(workload.items, database.DEFAULT_CHUNK_SIZE, latencies)
+            )
+    finally:
+        db.connection.close()
+        os.remove(path)
+    return Measurement(rows, latencies)
+
+
+def read_scenario(workload: Workload) -> Measurement:
+    """Read the day hour by hour, latency per hour."""
+    db = database.Database(str(workload.db_path))
+    day = DAY_START.date().isoformat()
+    rows = 0
+    latencies = []
+    try:
+        for hour in range(24):
+            interval = (f"{hour:02d}:00:00", f"{hour:02d}:59:59")
+            start = time.perf_counter()
+            rows += len(db.read(day, interval))
+            latencies.append(time.perf_counter() - start)
+    finally:
+        db.connection.close()
+    return Measurement(rows, latencies)
+
+
+def sort_scenario(workload: Workload) -> Measurement:
+    """Sort a copy of the day by creation time with 'sort.sort'."""
+    items = list(workload.items)
+    start = time.perf_counter()
+    sort.sort(items, key=lambda x: x.created_at)
+    return Measurement(len(items), [time.perf_counter() - start])
+
+
+def show_scenario(workload: Workload) -> Measurement:
+    """Run the 'show' command for the day in a subprocess, output is discarded."""
+    # The packages may be importable only thanks to relative PYTHONPATH entries
+    roots = [
+        str(Path(database.__file__).resolve().parents[1]),
+        str(Path(__file__).resolve().parents[1]),
+    ]
+    python_path = os.pathsep.join(filter(None, [*roots, os.getenv("PYTHONPATH")]))
+    start = time.perf_counter()
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.suite",
+            "--show-child",
+            DAY_START.date().isoformat(),
+            str(workload.db_path),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+        cwd=workload.tmp_dir,  # the command writes its log file there
+        env={**os.environ, "PYTHONPATH": python_path},
+    )
+    elapsed = time.perf_counter() - start
+    peak = float(output.stderr.split()[-1])
+    return Measurement(len(workload.items), [elapsed], peak)
+
+
+def show_child(log_date: str, db_file: str) -> None:
+    """Run the 'show' command in this process and print its peak RSS to stderr."""
+    sys.argv = ["log_processing_demo", "show", log_date, db_file]
+    try:
+        runpy.run_module("log_processing_demo", run_name="__main__", alter_sys=True)
+    finally:
+        print(f"{peak_rss_mib():.1f}", file=sys.stderr)
+
+
+SCENARIOS: Dict[str, Callable[[Workload], Measurement]] = {
+    "fetch": fetch_scenario,
+    "ingest": ingest_scenario,
+    "read": read_scenario,
+    "sort": sort_scenario,
+    "show": show_scenario,
+}
+
+
+def run_scenario(
+    scenario: Callable[[Workload], Measurement], workload: Workload, repeats: int
+) -> Dict[str, Any]:
+    """Run a scenario several times and summarize its measurements.
+
+    Parameters
+    ----------
+    scenario : Callable[[Workload], Measurement]
+        One of SCENARIOS.
+    workload : Workload
+        Prepared data.
+    repeats : int
+        Number of timed runs.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Throughput of the fastest run in rows per second, latency percentiles of
+        operations of all runs in milliseconds and peak memory in MiB: RSS of a
+        subprocess or memory traced by 'tracemalloc' in an extra run.
+
+    """
+    best = math.inf
+    latencies: List[float] = []
+    peaks = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        measurement = scenario(workload)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed / measurement.rows)
+        latencies += measurement.latencies
+        if measurement.peak_rss_mib is not None:
+            peaks.append(measurement.peak_rss_mib)
+
+    if peaks:
+        memory, peak = "rss", max(peaks)
+    else:
+        # Tracing slows everything down, so memory is measured in a run of its own
+        tracemalloc.start()
+        try:
+            scenario(workload)
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+        memory = "traced"
+
+    return {
+        "rows_per_sec": round(1 / best),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "peak_mib": round(peak, 1),
+        "memory": memory,
+    }
+
+
+def find_regressions(
+    results: Dict[str, Any], baselines: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Compare results with baselines recorded with the same parameters.
+
+    Parameters
+    ----------
+    results : Dict[str, Any]
+        Output of this suite.
+    baselines : Dict[str, Any]
+        Stored output of an earlier run.
+    tolerance : float
+        Allowed share of throughput loss and of peak memory growth.
+
+    Returns
+    -------
+    List[str]
+        Descriptions of regressions, empty if there are none.
+
+    Raises
+    ------
+    ValueError
+        Rised if the baselines were recorded with other workload parameters.
+
+    """
+    if results["parameters"] != baselines["parameters"]:
+        raise ValueError(
+            f"Baselines were recorded with {baselines['parameters']}, "
+            f"not {results['parameters']}"
+        )
+
+    regressions = []
+    for name, result in results["scenarios"].items():
+        baseline = baselines["scenarios"].get(name)
+        if baseline is None:
+            continue
+        if result["rows_per_sec"] < baseline["rows_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['rows_per_sec']:,} rows/sec, "
+                f"baseline {baseline['rows_per_sec']:,}"
+            )
+        allowed_mib = baseline["peak_mib"] * (1 + tolerance) + MEMORY_SLACK_MIB
+        if result["peak_mib"] > allowed_mib:
+            regressions.append(
+                f"{name}: peak memory {result['peak_mib']} MiB, "
+                f"baseline {baseline['peak_mib']} MiB"
+            )
+    return regressions
+
+
+def _timed_chunks(
+    items: Iterable[LogItem], size: int, latencies: List[float]
+) -> Iterator[LogItem]:
+    """Pass items through, recording the time spent by the consumer on every chunk."""
+    start = time.perf_counter()
+    for number, item in enumerate(items, start=1):
+        yield item
+        if number % size == 0:
+            now = time.perf_counter()
+            latencies.append(now - start)
+            start = now
+    latencies.append(time.perf_counter() - start)
+
+
+def _percentile(values: List[float], share: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--message-words", type=int, default=12)
+    parser.add_argument(
+        "--disorder",
+        type=float,
+        default=1.0,
+        help="Share of records out of time order, 0 is sorted, 1 is random.",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--baselines", type=Path, default=BASELINES_PATH)
+    parser.add_argument(
+        "--save-baselines",
+        action="store_true",
+        help="Store the results as the new baselines.",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if any scenario is slower or takes more memory "
+        "than its baseline beyond the tolerance.",
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument(
+        "--show-child", nargs=2, metavar=("DATE", "DB"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.show_child:
+        show_child(*args.show_child)
+        return
+    if args.check:
+        if not args.baselines.exists():
+            sys.exit(
+                f"No baselines in {args.baselines}, save them with --save-baselines"
+            )
+        # Read before the run, which may overwrite them with --save-baselines
+        baselines = json.loads(args.baselines.read_text())
+
+    parameters = {
+        "rows": args.rows,
+        "users": args.users,
+        "message_words": args.message_words,
+        "disorder": args.disorder,
+    }
+    items = make_log_items(
+        args.rows,
+        users=args.users,
+        message_words=args.message_words,
+        disorder=args.disorder,
+    )
+    logs = [
+        {**item.dict(), "created_at": item.created_at.isoformat()} for item in items
+    ]
+    payload = json.dumps({"error": "", "logs": logs}, ensure_ascii=False).encode()
+    del logs
+
+    results: Dict[str, Any] = {
+        "parameters": parameters,
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPU, "
+        f"Python {platform.python_version()}",
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "suite.db"
+        db = database.Database(str(db_path))
+        with db.bulk_load():
+            db.update(items)
+        db.connection.close()
+        workload = Workload(items, payload, db_path, Path(tmp_dir))
+
+        print(f"{args.rows:,} records, payload {len(payload) / 2 ** 20:.1f} MiB")
+        print(
+            f"{'scenario':>10} {'rows/sec':>12} {'p50 ms':>10} {'p95 ms':>10} "
+            f"{'p99 ms':>10} {'peak MiB':>10}"
+        )
+        for name in args.scenarios:
+            result = run_scenario(SCENARIOS[name], workload, args.repeats)
+            results["scenarios"][name] = result
+            print(
+                f"{name:>10} {result['rows_per_sec']:>12,} {result['p50_ms']:>10.1f} "
+                f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} "
+                f"{result['peak_mib']:>7.1f} {result['memory']}"
+            )
+
+    if args.save_baselines:
+        args.baselines.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baselines saved to {args.baselines}")
+    if args.check:
+        if baselines["machine"] != results["machine"]:
+            print(f"Baselines were recorded on another machine: {baselines['machine']}")
+        try:
+            regressions = find_regressions(results, baselines, args.tolerance)
+        except ValueError as error:
+            sys.exit(str(error))
+        if regressions:
+            sys.exit("Regressions:\n" + "\n".join(regressions))
+        print(f"No regressions beyond {args.tolerance:.0%} of the baselines.")
+
+
+if __name__ == "__main__":
+    main()
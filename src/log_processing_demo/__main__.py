@@ -1,14 +1,29 @@
 """
 Entry point for command line use.
 """
-
 import argparse
-import json
+import atexit
+import cProfile
 import logging
+import os
+import sqlite3
 import sys
+import time
 from pathlib import Path
 
-from log_processing_demo import database, log_receiver
+from log_processing_demo import (
+    archive,
+    bulk_import,
+    database,
+    log_receiver,
+    metrics,
+    ndjson,
+    pipeline,
+    response_cache,
+    server,
+    sort,
+    watch,
+)
 
 # Set up logging format
 logging.basicConfig(
@@ -21,6 +36,19 @@ logging.basicConfig(
 # Commands and their arguments handling
 
 parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--metrics",
+    action="store_true",
+    help="Print counts, sizes and durations of DB operations, API requests and "
+    "sorts to stderr when the command ends.",
+)
+parser.add_argument(
+    "--profile",
+    type=Path,
+    metavar="FILE",
+    help="Profile the command with cProfile and save the statistics to FILE, "
+    "see 'python -m pstats FILE'. Only the main thread is profiled.",
+)
 subparsers = parser.add_subparsers(title="commands", dest="command")
 
 # -- Command for fetching log messages from URL and putting them to the DB
@@ -28,14 +56,180 @@ parser_fetch = subparsers.add_parser(
     "fetch", help="Retrieve LOG messages via API for desired date."
 )
 parser_fetch.add_argument("base_url", type=str, help="Base LOG API URL.")
-parser_fetch.add_argument("date_path", type=str, help="LOG date in format YYYYMMDD")
 parser_fetch.add_argument(
+    "date_path",
+    type=str,
+    help="LOG date in format YYYYMMDD. Several dates are given as a comma-separated "
+    "list and/or ranges: YYYYMMDD-YYYYMMDD,YYYYMMDD",
+)
+parser_fetch.add_argument(
+    "db_file",
+    nargs="?",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
+parser_fetch.add_argument(
+    "--chunk-size",
+    type=int,
+    help=f"Number of records written to the DB at once. Default is {database.DEFAULT_CHUNK_SIZE}.",
+    default=database.DEFAULT_CHUNK_SIZE,
+)
+parser_fetch.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    help=f"Number of dates fetched concurrently. Default is {log_receiver.DEFAULT_WORKERS}.",
+    default=log_receiver.DEFAULT_WORKERS,
+)
+parser_fetch.add_argument(
+    "--sort",
+    action="store_true",
+    help="Store records sorted by creation time. Large days are sorted via temporary files.",
+)
+parser_fetch.add_argument(
+    "--max-items-in-memory",
+    type=int,
+    help="Number of records sorted in memory at once, see --sort. "
+    f"Default is {sort.DEFAULT_MAX_ITEMS_IN_MEMORY}.",
+    default=sort.DEFAULT_MAX_ITEMS_IN_MEMORY,
+)
+parser_fetch.add_argument(
+    "--incremental",
+    action="store_true",
+    help="Skip records older than the latest one already stored for their date. "
+    "For repeated fetches of a day that is still being written.",
+)
+parser_fetch.add_argument(
+    "--cache-dir",
+    type=Path,
+    help="Directory of the API response cache. Cached days are downloaded again "
+    "only if they have changed. No cache is used by default.",
+)
+parser_fetch.add_argument(
+    "--cache-size",
+    type=int,
+    help="Size limit of the response cache in MiB, least recently used days are "
+    f"evicted. Default is {response_cache.DEFAULT_MAX_BYTES // 2 ** 20}.",
+    default=response_cache.DEFAULT_MAX_BYTES // 2**20,
+)
+parser_fetch.add_argument(
+    "--immutable-past",
+    action="store_true",
+    help="Serve cached days before today (UTC) without contacting the API.",
+)
+parser_fetch.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="Bypass the response cache: neither read nor update it.",
+)
+parser_fetch.add_argument(
+    "--prune-cache",
+    action="store_true",
+    help="Evict least recently used days until the cache fits --cache-size "
+    "before fetching.",
+)
+parser_fetch.add_argument(
+    "--partitioned",
+    action="store_true",
+    help="Store every day in a table of its own, so that old days are dropped "
+    "instantly. An existing DB file is converted.",
+)
+parser_fetch.add_argument(
+    "--pipeline",
+    action="store_true",
+    help="Download, parse and write in separate threads connected by bounded "
+    "queues, and print the throughput of every stage and the queue depths. "
+    "Days are sorted in memory with --sort.",
+)
+parser_fetch.add_argument(
+    "--queue-size",
+    type=int,
+    help="Capacity of the queues between pipeline stages, see --pipeline. "
+    f"Default is {pipeline.DEFAULT_QUEUE_SIZE}.",
+    default=pipeline.DEFAULT_QUEUE_SIZE,
+)
+
+# -- Command for polling the current day and putting new messages to the DB
+parser_watch = subparsers.add_parser(
+    "watch",
+    help="Poll LOG API for the current day (UTC) and store new messages until "
+    "stopped with SIGTERM or Ctrl-C.",
+)
+parser_watch.add_argument("base_url", type=str, help="Base LOG API URL.")
+parser_watch.add_argument(
     "db_file",
     nargs="?",
     type=Path,
     help="Database file. Default is 'database.db'.",
     default=Path("database.db"),
 )
+parser_watch.add_argument(
+    "--interval",
+    type=float,
+    help=f"Seconds between polls. Default is {watch.DEFAULT_INTERVAL:g}.",
+    default=watch.DEFAULT_INTERVAL,
+)
+parser_watch.add_argument(
+    "--chunk-size",
+    type=int,
+    help=f"Number of records written to the DB at once. Default is {database.DEFAULT_CHUNK_SIZE}.",
+    default=database.DEFAULT_CHUNK_SIZE,
+)
+parser_watch.add_argument(
+    "--partitioned",
+    action="store_true",
+    help="Store every day in a table of its own, see 'fetch --partitioned'.",
+)
+
+# -- Command for loading saved log messages from files to the DB
+parser_import = subparsers.add_parser(
+    "import",
+    help="Load LOG messages from NDJSON files printed by 'show' or saved API "
+    "responses, optionally gzip'd. Files are parsed by a pool of processes.",
+)
+parser_import.add_argument(
+    "files", nargs="+", type=Path, help="NDJSON or API response files."
+)
+parser_import.add_argument(
+    "--db-file",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
+parser_import.add_argument(
+    "--format",
+    choices=bulk_import.FORMATS,
+    help="Format of the files, 'json' for API responses. By default it is detected "
+    "for every file.",
+    default="auto",
+)
+parser_import.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    help="Number of parsing processes, 0 to parse in the main process. "
+    "Default is the number of CPUs.",
+    default=os.cpu_count() or 1,
+)
+parser_import.add_argument(
+    "--block-size",
+    type=int,
+    help="MiB of NDJSON parsed by a process at once. "
+    f"Default is {bulk_import.DEFAULT_BLOCK_SIZE // 2 ** 20}.",
+    default=bulk_import.DEFAULT_BLOCK_SIZE // 2**20,
+)
+parser_import.add_argument(
+    "--chunk-size",
+    type=int,
+    help=f"Number of records written to the DB at once. Default is {database.DEFAULT_CHUNK_SIZE}.",
+    default=database.DEFAULT_CHUNK_SIZE,
+)
+parser_import.add_argument(
+    "--partitioned",
+    action="store_true",
+    help="Store every day in a table of its own, see 'fetch --partitioned'.",
+)
 
 # -- Command to view log messages from the DB in NDJSON format
 parser_show = subparsers.add_parser(
@@ -55,34 +249,609 @@ parser_show.add_argument(
 parser_show.add_argument(
     "-i", "--interval", type=str, help="Time interval. Format: HH:MM:SS-HH:MM:SS"
 )
+parser_show.add_argument(
+    "--fast-json",
+    action="store_true",
+    help="Use orjson if installed. Output is compact JSON without extra spaces.",
+)
+parser_show.add_argument(
+    "--cache",
+    action="store_true",
+    help="Keep the output in the DB file and reuse it until the shown data changes. "
+    "Storing it needs the write lock of the DB file, it is skipped if another "
+    "process is writing.",
+)
+parser_show.add_argument(
+    "--archive-dir",
+    type=Path,
+    help="Directory of archived days, which are read from there. "
+    "Default is the DB file path with '.archive' suffix.",
+)
+parser_show.add_argument(
+    "--limit",
+    type=int,
+    help="Print at most this many records. The cursor of the next page is printed "
+    "to stderr if there are more.",
+)
+parser_show.add_argument(
+    "--cursor",
+    type=str,
+    help="Continue after the page of this cursor, see --limit.",
+)
+parser_show.add_argument(
+    "--desc",
+    action="store_true",
+    help="Print the latest records first.",
+)
+
+# -- Command to find log messages in the DB by words and phrases
+parser_search = subparsers.add_parser(
+    "search",
+    help="Print LOG messages matching a full-text query in NDJSON format, "
+    "best matches first.",
+)
+parser_search.add_argument(
+    "query",
+    type=str,
+    help='Words, "quoted phrases" and prefixes like night*, combined with AND, OR, '
+    "NOT. Archived dates are not searched.",
+)
+parser_search.add_argument(
+    "db_file",
+    nargs="?",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
+parser_search.add_argument(
+    "-d", "--date", type=str, help="Search only this date. Format: YYYY-MM-DD"
+)
+parser_search.add_argument(
+    "-i",
+    "--interval",
+    type=str,
+    help="Time interval within --date. Format: HH:MM:SS-HH:MM:SS",
+)
+parser_search.add_argument(
+    "--limit",
+    type=int,
+    default=database.DEFAULT_SEARCH_LIMIT,
+    help=f"Number of results on a page. Default is {database.DEFAULT_SEARCH_LIMIT}.",
+)
+parser_search.add_argument(
+    "--page", type=int, default=1, help="Page of results, starting from 1."
+)
+parser_search.add_argument(
+    "--fast-json",
+    action="store_true",
+    help="Use orjson if installed. Output is compact JSON without extra spaces.",
+)
+
+# -- Command to view message counts and sizes without reading messages
+parser_stats = subparsers.add_parser(
+    "stats",
+    help="Print message counts and sizes of a date per minute, hour or user "
+    "in NDJSON format.",
+)
+parser_stats.add_argument(
+    "date", type=str, help="Date of LOG messages. Format: YYYY-MM-DD"
+)
+parser_stats.add_argument(
+    "db_file",
+    nargs="?",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
+parser_stats.add_argument(
+    "--by",
+    choices=list(database.ROLLUPS),
+    default="hour",
+    help="Grouping of messages. Default is 'hour'.",
+)
+parser_stats.add_argument(
+    "-i",
+    "--interval",
+    type=str,
+    help="Time interval, whole minutes or hours that overlap it are counted. "
+    "Format: HH:MM:SS-HH:MM:SS",
+)
+parser_stats.add_argument(
+    "--archive-dir",
+    type=Path,
+    help="Directory of archived days. Stats count only records in the DB, a "
+    "warning is printed for an archived date. Default is the DB file path with "
+    "'.archive' suffix.",
+)
+
+# -- Command to answer queries over HTTP while the DB is being written
+parser_serve = subparsers.add_parser(
+    "serve",
+    help="Answer 'show', 'search' and 'stats' queries over HTTP until stopped with "
+    "SIGTERM or Ctrl-C. The DB is switched to WAL mode, so queries don't wait for "
+    "writers.",
+)
+parser_serve.add_argument(
+    "db_file",
+    nargs="?",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
+parser_serve.add_argument(
+    "--host",
+    type=str,
+    help=f"Address to listen on. Default is {server.DEFAULT_HOST}.",
+    default=server.DEFAULT_HOST,
+)
+parser_serve.add_argument(
+    "--port",
+    type=int,
+    help=f"Port to listen on. Default is {server.DEFAULT_PORT}.",
+    default=server.DEFAULT_PORT,
+)
+parser_serve.add_argument(
+    "--pool-size",
+    type=int,
+    help="Number of read-only DB connections, i.e. queries served at the same time. "
+    f"Default is {server.DEFAULT_POOL_SIZE}.",
+    default=server.DEFAULT_POOL_SIZE,
+)
+parser_serve.add_argument(
+    "--busy-timeout",
+    type=float,
+    help="Seconds to wait for a DB lock held by another connection. "
+    f"Default is {database.DEFAULT_BUSY_TIMEOUT:g}.",
+    default=database.DEFAULT_BUSY_TIMEOUT,
+)
+parser_serve.add_argument(
+    "--watch",
+    type=str,
+    metavar="BASE_URL",
+    help="Also poll LOG API for the current day like 'watch' does, through the "
+    "single writer connection of the server.",
+)
+parser_serve.add_argument(
+    "--interval",
+    type=float,
+    help=f"Seconds between polls, see --watch. Default is {watch.DEFAULT_INTERVAL:g}.",
+    default=watch.DEFAULT_INTERVAL,
+)
+
+# -- Command to verify message counts and sizes against stored messages
+parser_check_stats = subparsers.add_parser(
+    "check-stats",
+    help="Recount stored LOG messages and print differences from the kept stats "
+    "in NDJSON format.",
+)
+parser_check_stats.add_argument(
+    "db_file",
+    nargs="?",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
+parser_check_stats.add_argument(
+    "--repair",
+    action="store_true",
+    help="Replace the kept stats with the recounted ones.",
+)
+
+# -- Command to move a finished day from the DB to the columnar archive
+parser_archive = subparsers.add_parser(
+    "archive",
+    help="Write stored LOG data of a finished date into a read-only columnar file.",
+)
+parser_archive.add_argument(
+    "date", type=str, help="Date of LOG messages. Format: YYYY-MM-DD"
+)
+parser_archive.add_argument(
+    "db_file",
+    nargs="?",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
+parser_archive.add_argument(
+    "--archive-dir",
+    type=Path,
+    help="Archive directory. Default is the DB file path with '.archive' suffix.",
+)
+parser_archive.add_argument(
+    "--remove",
+    action="store_true",
+    help="Delete the date from the DB once it is archived.",
+)
+
+# -- Command to upgrade a DB file to the current schema
+parser_migrate = subparsers.add_parser(
+    "migrate",
+    help="Upgrade DB file to the current schema version, converting stored data.",
+)
+parser_migrate.add_argument(
+    "db_file",
+    nargs="?",
+    type=Path,
+    help="Database file. Default is 'database.db'.",
+    default=Path("database.db"),
+)
 
 args = parser.parse_args()
 
+# Instrumentation, reported on exit since commands end with 'sys.exit' on errors
+if args.metrics:
+    metrics.registry.enabled = True
+    atexit.register(lambda: print(metrics.registry.format_summary(), file=sys.stderr))
+if args.profile:
+    profiler = cProfile.Profile()
+    atexit.register(profiler.dump_stats, args.profile)
+    profiler.enable()
+
 # Processing a command
 
 if args.command == "fetch":
     print("Fetching LOG data...")
     try:
-        get_logs = log_receiver.LogReceiver(args.base_url)
-        db = database.Database(args.db_file)
-        db.update(get_logs(args.date_path))
+        dates = log_receiver.expand_dates(args.date_path)
+        cache = None
+        if args.cache_dir and not args.no_cache:
+            cache = response_cache.ResponseCache(
+                args.cache_dir,
+                max_bytes=args.cache_size * 2**20,
+                immutable_past=args.immutable_past,
+            )
+            if args.prune_cache:
+                print(f"{cache.prune()} cached day(s) evicted.")
+        get_logs = log_receiver.LogReceiver(
+            args.base_url, pool_size=args.workers, cache=cache
+        )
+        if args.partitioned:
+            db = database.PartitionedDatabase(args.db_file)
+        else:
+            db = database.open_database(args.db_file)
+        failed = []
+        with db.bulk_load():
+            if args.pipeline:
+                ingest = pipeline.Pipeline(
+                    get_logs,
+                    db,
+                    workers=args.workers,
+                    queue_size=args.queue_size,
+                    chunk_size=args.chunk_size,
+                    sort_by_time=args.sort,
+                    incremental=args.incremental,
+                )
+                for result in ingest.run(dates):
+                    if result.error:
+                        logging.error(
+                            "%s - fetch failed: %s", result.date_string, result.error
+                        )
+                        print(f"{result.date_string}: {result.error}", file=sys.stderr)
+                        failed.append(result.date_string)
+                    else:
+                        print(
+                            f"{result.date_string}: {result.records} records, "
+                            f"{result.stored} new."
+                        )
+                print(ingest.stats.format_report())
+            elif len(dates) == 1:
+                records = get_logs.stream(
+                    dates[0],
+                    sort_by_time=args.sort,
+                    max_items_in_memory=args.max_items_in_memory,
+                )
+                stored = db.update(
+                    records, chunk_size=args.chunk_size, incremental=args.incremental
+                )
+                print(f"{dates[0]}: {stored} new records.")
+            else:
+                # Downloads run concurrently, while the DB is written from this thread only.
+                # Days are kept as compact columnar batches until written.
+                results = get_logs.fetch_many(
+                    dates, workers=args.workers, sort_by_time=args.sort, columnar=True
+                )
+                for result in results:
+                    if result.error:
+                        logging.error(
+                            "%s - fetch failed: %s", result.date_string, result.error
+                        )
+                        print(f"{result.date_string}: {result.error}", file=sys.stderr)
+                        failed.append(result.date_string)
+                    else:
+                        stored = db.update(
+                            result.logs,
+                            chunk_size=args.chunk_size,
+                            incremental=args.incremental,
+                        )
+                        print(
+                            f"{result.date_string}: {len(result.logs)} records, "
+                            f"{stored} new."
+                        )
+        if failed:
+            sys.exit(
+                f"Failed to fetch {len(failed)} of {len(dates)} date(s): {', '.join(sorted(failed))}"
+            )
         print("Done.")
     except Exception as error:
         logging.exception(error)
         sys.exit(
             f"Error fetching LOG data: {str(error)}\nSee additional info in logfile."
         )
+elif args.command == "watch":
+    try:
+        if args.partitioned:
+            db = database.PartitionedDatabase(args.db_file)
+        else:
+            db = database.open_database(args.db_file)
+        watcher = watch.Watcher(
+            log_receiver.LogReceiver(args.base_url),
+            db,
+            interval=args.interval,
+            chunk_size=args.chunk_size,
+        )
+        print(
+            f"Polling LOG data every {args.interval:g} s, stop with Ctrl-C...",
+            flush=True,
+        )
+        with watch.stop_on_signals(watcher):
+            for result in watcher.run():
+                if result.error:
+                    print(f"{result.date_string}: {result.error}", file=sys.stderr)
+                elif result.stored:
+                    print(
+                        f"{result.date_string}: {result.stored} new records.",
+                        flush=True,
+                    )
+        print("Stopped.")
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(
+            f"Error watching LOG data: {str(error)}\nSee additional info in logfile."
+        )
+elif args.command == "import":
+    print("Importing LOG data...")
+    try:
+        if args.partitioned:
+            db = database.PartitionedDatabase(args.db_file)
+        else:
+            db = database.open_database(args.db_file)
+        failed = []
+        total = 0
+        start = time.perf_counter()
+        with db.bulk_load():
+            results = bulk_import.import_files(
+                db,
+                args.files,
+                workers=args.workers,
+                file_format=args.format,
+                block_size=args.block_size * 2**20,
+                chunk_size=args.chunk_size,
+            )
+            for result in results:
+                if result.error:
+                    logging.error("%s - import failed: %s", result.path, result.error)
+                    print(f"{result.path}: {result.error}", file=sys.stderr)
+                    failed.append(str(result.path))
+                else:
+                    total += result.records
+                    print(
+                        f"{result.path}: {result.records} records, {result.stored} new."
+                    )
+        elapsed = time.perf_counter() - start
+        print(f"{total} records in {elapsed:.1f} s, {total / elapsed:.0f} records/s.")
+        if failed:
+            sys.exit(
+                f"Failed to import {len(failed)} of {len(args.files)} file(s): {', '.join(failed)}"
+            )
+        print("Done.")
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(
+            f"Error importing LOG data: {str(error)}\nSee additional info in logfile."
+        )
 elif args.command == "show":
-    if not args.db_file.exists():
+    store = archive.Archive(args.archive_dir or args.db_file.with_suffix(".archive"))
+    archived = store.has_day(args.date)
+    if not archived and not args.db_file.exists():
         sys.exit(f"DB file ({args.db_file}) does not exist.")
+    paginated = args.limit is not None or args.cursor or args.desc
+    if args.limit is not None and args.limit < 1:
+        sys.exit("--limit must be positive.")
+    if archived and paginated:
+        sys.exit("--limit, --cursor and --desc are not supported for archived days.")
     try:
-        db = database.Database(args.db_file)
         time_interval = tuple(args.interval.split("-")) if args.interval else None
-        for element in db.read(args.date, time_interval):
-            element["created_at"] = str(element["created_at"])
-            print(json.dumps(element, ensure_ascii=False))
+        if args.limit:
+            db = database.open_database(args.db_file)
+            page = db.read_page(
+                args.date,
+                time_interval,
+                limit=args.limit,
+                cursor=args.cursor,
+                descending=args.desc,
+                iso_format=True,
+            )
+            ndjson.write_ndjson([page.rows], sys.stdout.buffer, fast=args.fast_json)
+            if page.next_cursor:
+                print(f"Next page: --cursor {page.next_cursor}", file=sys.stderr)
+        elif paginated:
+            db = database.open_database(args.db_file)
+            ndjson.write_ndjson(
+                db.iter_read(
+                    args.date,
+                    time_interval,
+                    iso_format=True,
+                    cursor=args.cursor,
+                    descending=args.desc,
+                ),
+                sys.stdout.buffer,
+                fast=args.fast_json,
+            )
+        elif archived:
+            # Records written to the DB after the date was archived are shown too
+            if args.db_file.exists():
+                db = database.open_database(args.db_file)
+                stored = db.iter_rows(args.date, time_interval)
+            else:
+                stored = iter([])
+            ndjson.write_ndjson(
+                store.iter_read(
+                    args.date, time_interval, iso_format=True, stored=stored
+                ),
+                sys.stdout.buffer,
+                fast=args.fast_json,
+            )
+        elif args.cache:
+            db = database.open_database(args.db_file)
+            for chunk in db.iter_output(
+                args.date,
+                time_interval,
+                ndjson.encoder_variant(args.fast_json),
+                ndjson.batch_encoder(args.fast_json),
+            ):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            db = database.open_database(args.db_file)
+            ndjson.write_ndjson(
+                db.iter_read(args.date, time_interval, iso_format=True),
+                sys.stdout.buffer,
+                fast=args.fast_json,
+            )
     except Exception as error:
         logging.exception(error)
         sys.exit(
             f"Error reading LOG data from DB: {str(error)}\nSee additional info in logfile."
         )
+elif args.command == "search":
+    if not args.db_file.exists():
+        sys.exit(f"DB file ({args.db_file}) does not exist.")
+    if args.interval and not args.date:
+        sys.exit("--interval requires --date.")
+    if args.limit < 1 or args.page < 1:
+        sys.exit("--limit and --page must be positive.")
+    try:
+        db = database.open_database(args.db_file)
+        time_interval = tuple(args.interval.split("-")) if args.interval else None
+        results = db.search(
+            args.query,
+            args.date,
+            time_interval,
+            limit=args.limit,
+            offset=(args.page - 1) * args.limit,
+            iso_format=True,
+        )
+        ndjson.write_ndjson([results], sys.stdout.buffer, fast=args.fast_json)
+    except database.SearchQueryError as error:
+        sys.exit(str(error))
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(
+            f"Error searching LOG data: {str(error)}\nSee additional info in logfile."
+        )
+elif args.command == "stats":
+    if not args.db_file.exists():
+        sys.exit(f"DB file ({args.db_file}) does not exist.")
+    if args.interval and args.by == "user":
+        sys.exit("--interval is not supported with --by user.")
+    try:
+        db = database.open_database(args.db_file)
+        time_interval = tuple(args.interval.split("-")) if args.interval else None
+        ndjson.write_ndjson(
+            [db.stats(args.date, args.by, time_interval)], sys.stdout.buffer
+        )
+        store = archive.Archive(
+            args.archive_dir or args.db_file.with_suffix(".archive")
+        )
+        if store.has_day(args.date):
+            print(
+                f"{args.date} is archived, stats count only its records in the DB. "
+                "Records removed with 'archive --remove' are not counted.",
+                file=sys.stderr,
+            )
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(
+            f"Error reading LOG stats from DB: {str(error)}\nSee additional info in logfile."
+        )
+elif args.command == "serve":
+    try:
+        query_server = server.QueryServer(
+            args.db_file,
+            (args.host, args.port),
+            pool_size=args.pool_size,
+            busy_timeout=args.busy_timeout,
+        )
+        watcher = None
+        if args.watch:
+            watcher = watch.Watcher(
+                log_receiver.LogReceiver(args.watch),
+                database.open_database(args.db_file, busy_timeout=args.busy_timeout),
+                interval=args.interval,
+            )
+        print(
+            f"Serving LOG data at {query_server.url}, stop with Ctrl-C...", flush=True
+        )
+        with query_server:
+            for result in server.serve(query_server, watcher):
+                if result.error:
+                    print(f"{result.date_string}: {result.error}", file=sys.stderr)
+                elif result.stored:
+                    print(
+                        f"{result.date_string}: {result.stored} new records.",
+                        flush=True,
+                    )
+        print("Stopped.")
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(
+            f"Error serving LOG data: {str(error)}\nSee additional info in logfile."
+        )
+elif args.command == "check-stats":
+    if not args.db_file.exists():
+        sys.exit(f"DB file ({args.db_file}) does not exist.")
+    try:
+        db = database.open_database(args.db_file)
+        differences = db.check_rollups(repair=args.repair)
+        ndjson.write_ndjson([differences], sys.stdout.buffer)
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(
+            f"Error checking LOG stats: {str(error)}\nSee additional info in logfile."
+        )
+    if differences and not args.repair:
+        sys.exit(f"{len(differences)} difference(s) found.")
+elif args.command == "archive":
+    if not args.db_file.exists():
+        sys.exit(f"DB file ({args.db_file}) does not exist.")
+    try:
+        db = database.open_database(args.db_file)
+        store = archive.Archive(
+            args.archive_dir or args.db_file.with_suffix(".archive")
+        )
+        rows = (row for batch in db.iter_day_rows(args.date) for row in batch)
+        count = store.write_day(args.date, rows)
+        print(
+            f"{args.date}: {count} records archived to {store.segment_path(args.date)}."
+        )
+        if args.remove:
+            db.delete_day(args.date)
+            print(f"{args.date}: removed from the DB.")
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(
+            f"Error archiving LOG data: {str(error)}\nSee additional info in logfile."
+        )
+elif args.command == "migrate":
+    if not args.db_file.exists():
+        sys.exit(f"DB file ({args.db_file}) does not exist.")
+    try:
+        connection = sqlite3.connect(args.db_file)
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        connection.close()
+        print(f"Upgrading DB schema from version {version}...")
+        db = database.open_database(args.db_file)
+        print(f"Done. DB schema version: {db.schema_version}.")
+    except Exception as error:
+        logging.exception(error)
+        sys.exit(f"Error upgrading DB: {str(error)}\nSee additional info in logfile.")
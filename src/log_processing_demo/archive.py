@@ -0,0 +1,579 @@
+"""
+Columnar archive of finished days in immutable, memory-mapped segment files.
+
+A segment holds one day. After a fixed header come 8-byte aligned sections:
+
+- creation times: int64 epoch microseconds, sorted;
+- user codes: uint32 indexes into the user dictionary;
+- message offsets: int64, n + 1 offsets into the message blob;
+- user offsets: int64, 3 * u + 1 offsets into the user blob, which holds
+  (user_id, first_name, second_name) of every distinct user;
+- user blob and message blob: UTF-8 text.
+
+Segments are opened with 'mmap', so only the pages of requested rows are read from
+disk, and a time interval is found with a binary search on the creation times.
+Integers are stored in native byte order, which is checked on open.
+
+Rows of an archived day may still be in the DB, or be written there later, e.g.
+by 'fetch'. Reads merge them in with 'merge_rows'.
+"""
+import bisect
+import heapq
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from log_processing_demo.database import DAY_US, READ_COLUMNS, ReadRow
+from log_processing_demo.log_batch import LogBatch
+from log_processing_demo.log_item import LogItem
+from log_processing_demo.log_updater import LogUpdater
+from log_processing_demo.timestamps import (
+    epoch_us_to_iso,
+    from_epoch_us,
+    iso_to_epoch_us,
+    to_epoch_us,
+)
+
+# Segment file signature and format version
+MAGIC = b"LOGSEG01"
+# Magic, byte order check, day start, number of rows, users, user and message blob sizes
+HEADER = struct.Struct("=8sqqqqqq")
+BYTE_ORDER_CHECK = 0x0102030405060708
+
+SEGMENT_SUFFIX = ".logseg"
+
+# Number of rows in a batch of 'Segment.iter_rows'
+DEFAULT_BATCH_SIZE = 5000
+
+
+class ArchiveError(Exception):
+    """Exception for a malformed segment file or an invalid archive operation."""
+
+    pass
+
+
+def write_segment(
+    path: Union[str, Path], day_start: int, rows: Iterable[ReadRow]
+) -> int:
+    """Write rows of a day into a segment file, replacing it atomically.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        Segment file path.
+    day_start : int
+        Start of the day in epoch microseconds.
+    rows : Iterable[ReadRow]
+        Rows of the day sorted by creation time. NULL messages are stored as
+        empty strings.
+
+    Returns
+    -------
+    int
+        Number of written rows.
+
+    Raises
+    ------
+    ArchiveError
+        Rised for rows out of order or outside of the day.
+
+    """
+    created_at = array("q")
+    user_codes = array("I")
+    message_offsets = array("q", [0])
+    messages = bytearray()
+    user_index: Dict[Tuple[str, str, str], int] = {}
+
+    previous = day_start
+    for row in rows:
+        if not previous <= row[0] < day_start + DAY_US:
+            raise ArchiveError(
+                f"Row created at {epoch_us_to_iso(row[0])} is out of order "
+                "or outside of the day"
+            )
+        previous = row[0]
+        created_at.append(row[0])
+        user = (row[1], row[2], row[3])
+        code = user_index.get(user)
+        if code is None:
+            code = user_index[user] = len(user_index)
+        user_codes.append(code)
+        if row[4]:
+            messages += row[4].encode("utf-8")
+        message_offsets.append(len(messages))
+
+    user_offsets = array("q", [0])
+    users = bytearray()
+    for user in user_index:
+        for field in user:
+            users += field.encode("utf-8")
+            user_offsets.append(len(users))
+
+    header = HEADER.pack(
+        MAGIC,
+        BYTE_ORDER_CHECK,
+        day_start,
+        len(created_at),
+        len(user_index),
+        len(users),
+        len(messages),
+    )
+    path = Path(path)
+    handle, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as segment:
+            segment.write(header)
+            for section in (created_at, user_codes, message_offsets, user_offsets):
+                segment.write(section)
+                segment.write(b"\0" * _padding(len(section) * section.itemsize))
+            segment.write(users)
+            segment.write(b"\0" * _padding(len(users)))
+            segment.write(messages)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return len(created_at)
+
+
+class Segment:
+    """Read-only memory-mapped segment file. See module docstring."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """Constructor maps the file and decodes the user dictionary.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Segment file path.
+
+        Raises
+        ------
+        ArchiveError
+            Rised for a file which is not a valid segment.
+
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as segment:
+            try:
+                self._mmap = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                raise ArchiveError(f"{self.path} is not a segment file") from None
+        try:
+            self._parse()
+        except BaseException:
+            self._mmap.close()
+            raise
+
+    def _parse(self) -> None:
+        """Check the header and map columns of the segment."""
+        if len(self._mmap) < HEADER.size:
+            raise ArchiveError(f"{self.path} is not a segment file")
+        (
+            magic,
+            byte_order,
+            day_start,
+            rows,
+            users,
+            users_size,
+            messages_size,
+        ) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ArchiveError(f"{self.path} is not a segment file")
+        if byte_order != BYTE_ORDER_CHECK:
+            raise ArchiveError(f"{self.path} was written with another byte order")
+        self.day_start = day_start
+
+        # Offsets of sections, every one is padded to 8 bytes
+        sizes = [rows * 8, rows * 4, (rows + 1) * 8, (3 * users + 1) * 8, users_size]
+        offsets = [HEADER.size]
+        for size in sizes:
+            offsets.append(offsets[-1] + size + _padding(size))
+        if offsets[-1] + messages_size > len(self._mmap):
+            raise ArchiveError(f"{self.path} is truncated")
+        self._messages_start = offsets[-1]
+
+        view = memoryview(self._mmap)
+        self.created_at = view[offsets[0] : offsets[0] + sizes[0]].cast("q")
+        self._user_codes = view[offsets[1] : offsets[1] + sizes[1]].cast("I")
+        self._message_offsets = view[offsets[2] : offsets[2] + sizes[2]].cast("q")
+        with view[offsets[3] : offsets[3] + sizes[3]].cast("q") as section:
+            user_offsets = section.tolist()
+        user_blob = self._mmap[offsets[4] : offsets[4] + users_size]
+        view.release()
+
+        fields = [
+            user_blob[user_offsets[i] : user_offsets[i + 1]].decode("utf-8")
+            for i in range(3 * users)
+        ]
+        self.users: List[Tuple[str, str, str]] = list(
+            zip(fields[0::3], fields[1::3], fields[2::3])
+        )
+
+    def __len__(self) -> int:
+        return len(self.created_at)
+
+    def __enter__(self) -> "Segment":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the file. Rows read before stay valid.
+
+        Returns
+        -------
+        None
+
+        """
+        for view in (self.created_at, self._user_codes, self._message_offsets):
+            view.release()
+        self._mmap.close()
+
+    def row_range(self, start: int, end: int) -> Tuple[int, int]:
+        """Indexes of rows created within a time range, found by binary search.
+
+        Parameters
+        ----------
+        start : int
+            Exclusive lower boundary, epoch microseconds.
+        end : int
+            Exclusive upper boundary, epoch microseconds.
+
+        Returns
+        -------
+        Tuple[int, int]
+            First row and the row after the last one.
+
+        """
+        first = bisect.bisect_right(self.created_at, start)
+        return first, max(first, bisect.bisect_left(self.created_at, end, first))
+
+    def iter_rows(
+        self, start: int, end: int, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[List[ReadRow]]:
+        """Rows created within a time range, like 'Database.iter_rows' returns them.
+
+        Parameters
+        ----------
+        start : int
+            Exclusive lower boundary, epoch microseconds.
+        end : int
+            Exclusive upper boundary, epoch microseconds.
+        batch_size : int
+            Number of rows in a batch.
+
+        Returns
+        -------
+        Iterator[List[ReadRow]]
+            Batches of rows in order of creation time.
+
+        """
+        first, last = self.row_range(start, end)
+        users = self.users
+        data = self._mmap
+        base = self._messages_start
+        for batch_start in range(first, last, batch_size):
+            batch_end = min(batch_start + batch_size, last)
+            offsets = self._message_offsets[batch_start : batch_end + 1].tolist()
+            yield [
+                (created_at, *users[code], data[base + begin : base + stop].decode())
+                for created_at, code, begin, stop in zip(
+                    self.created_at[batch_start:batch_end].tolist(),
+                    self._user_codes[batch_start:batch_end].tolist(),
+                    offsets,
+                    offsets[1:],
+                )
+            ]
+
+
+class Archive(LogUpdater):
+    """LOG storage in a directory of per-day segment files. See module docstring.
+
+    Segments are immutable: updating an archived day rewrites its segment.
+    """
+
+    def __init__(self, directory: Union[str, Path]) -> None:
+        """Constructor. The directory is created when the first day is written.
+
+        Parameters
+        ----------
+        directory : Union[str, Path]
+            Archive directory.
+        """
+        self.directory = Path(directory)
+
+    def segment_path(self, log_date: str) -> Path:
+        """Path of the segment file of a date.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+
+        Returns
+        -------
+        Path
+            Segment file path, which may not exist.
+
+        """
+        return self.directory / f"{log_date}{SEGMENT_SUFFIX}"
+
+    def has_day(self, log_date: str) -> bool:
+        """Whether a date is archived.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+
+        Returns
+        -------
+        bool
+            True if the date has a segment.
+
+        """
+        return self.segment_path(log_date).is_file()
+
+    @property
+    def days(self) -> List[str]:
+        """Archived dates in order, format: YYYY-MM-DD."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            path.name[: -len(SEGMENT_SUFFIX)]
+            for path in self.directory.glob(f"*{SEGMENT_SUFFIX}")
+        )
+
+    def write_day(self, log_date: str, rows: Iterable[ReadRow]) -> int:
+        """Archive a finished day, replacing its segment if there is one.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+        rows : Iterable[ReadRow]
+            Rows of the day sorted by creation time, e.g. from 'Database.iter_rows'.
+
+        Returns
+        -------
+        int
+            Number of archived rows.
+
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return write_segment(
+            self.segment_path(log_date), iso_to_epoch_us(log_date), rows
+        )
+
+    def update(self, message_list: Union[Iterable[LogItem], LogBatch]) -> int:
+        """Add LOG records to the segments of their days.
+
+        Records identical to archived ones are skipped, like 'Database.update' does.
+
+        Parameters
+        ----------
+        message_list : Union[Iterable[LogItem], LogBatch]
+            Output of call to LogReceiver object.
+
+        Returns
+        -------
+        int
+            Number of records actually stored.
+
+        """
+        days: Dict[int, List[ReadRow]] = {}
+        for item in message_list:
+            created_at = to_epoch_us(item.created_at)
+            days.setdefault(created_at // DAY_US, []).append(
+                (
+                    created_at,
+                    item.user_id,
+                    item.first_name,
+                    item.second_name,
+                    item.message,
+                )
+            )
+
+        stored = 0
+        for day, rows in days.items():
+            log_date = from_epoch_us(day * DAY_US).date().isoformat()
+            archived = list(self._iter_day_rows(log_date))
+            seen = {(row[0], row[1], row[4]) for row in archived}
+            new_rows = []
+            for row in rows:
+                key = (row[0], row[1], row[4])
+                if key not in seen:
+                    seen.add(key)
+                    new_rows.append(row)
+            if new_rows:
+                # Same order as the time index of 'Database' gives
+                merged = sorted(archived + new_rows, key=lambda row: row[:2])
+                self.write_day(log_date, merged)
+                stored += len(new_rows)
+        return stored
+
+    def _iter_day_rows(self, log_date: str) -> Iterator[ReadRow]:
+        if not self.has_day(log_date):
+            return
+        with Segment(self.segment_path(log_date)) as segment:
+            for batch in segment.iter_rows(
+                segment.day_start - 1, segment.day_start + DAY_US
+            ):
+                yield from batch
+
+    def read(
+        self,
+        log_date: str,
+        time_interval: Optional[Tuple[str, str]] = None,
+        iso_format: bool = False,
+        stored: Iterable[List[ReadRow]] = (),
+    ) -> List[Dict[str, Union[datetime, str]]]:
+        """Read archived messages of a date, optionally filtering by time.
+
+        Parameters
+        ----------
+        date : str
+            LOG date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS
+        iso_format : bool
+            Return 'created_at' as 'YYYY-MM-DD HH:MM:SS' string instead of datetime.
+        stored : Iterable[List[ReadRow]]
+            Rows of the same date and interval in the DB, see 'iter_read'.
+
+        Returns
+        -------
+        List[Dict[str, Union[datetime, str]]]
+            Same as 'Database.read' returns.
+
+        """
+        return [
+            item
+            for batch in self.iter_read(
+                log_date, time_interval, iso_format, stored=stored
+            )
+            for item in batch
+        ]
+
+    def iter_read(
+        self,
+        log_date: str,
+        time_interval: Optional[Tuple[str, str]] = None,
+        iso_format: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        stored: Iterable[List[ReadRow]] = (),
+    ) -> Iterator[List[Dict[str, Union[datetime, str]]]]:
+        """Read archived messages in batches, like 'Database.iter_read' does.
+
+        Parameters
+        ----------
+        date : str
+            LOG date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS
+        iso_format : bool
+            Return 'created_at' as 'YYYY-MM-DD HH:MM:SS' string instead of datetime.
+        batch_size : int
+            Number of rows in a batch.
+        stored : Iterable[List[ReadRow]]
+            Rows of the same date and interval in the DB, e.g. from
+            'Database.iter_rows'. They are merged in, see 'merge_rows'.
+
+        Returns
+        -------
+        Iterator[List[Dict[str, Union[datetime, str]]]]
+            Batches of rows in order of creation time. Nothing for a date which
+            is not archived.
+
+        """
+        if not self.has_day(log_date):
+            return
+        start = iso_to_epoch_us(log_date)
+        end = start + DAY_US
+        if time_interval:
+            start = iso_to_epoch_us(f"{log_date}T{time_interval[0]}")
+            end = iso_to_epoch_us(f"{log_date}T{time_interval[1]}")
+        convert = epoch_us_to_iso if iso_format else from_epoch_us
+
+        stored = iter(stored)
+        first_stored = next(stored, None)
+        with Segment(self.segment_path(log_date)) as segment:
+            batches = segment.iter_rows(start, end, batch_size)
+            if first_stored is not None:
+                merged = merge_rows(batches, itertools.chain([first_stored], stored))
+                batches = iter(lambda: list(itertools.islice(merged, batch_size)), [])
+            for rows in batches:
+                batch = [dict(zip(READ_COLUMNS, row)) for row in rows]
+                for item in batch:
+                    item["created_at"] = convert(item["created_at"])
+                yield batch
+
+    def flush(self, from_date: Optional[str] = None) -> None:
+        """Remove segments. Optionally for a particular date.
+
+        Parameters
+        ----------
+        from_date : Optional[str]
+            From this date and earlier all segments will be removed.
+
+        Returns
+        -------
+        None
+
+        """
+        for log_date in self.days:
+            if from_date is None or log_date <= from_date:
+                self.segment_path(log_date).unlink()
+
+
+def merge_rows(
+    archived: Iterable[List[ReadRow]], stored: Iterable[List[ReadRow]]
+) -> Iterator[ReadRow]:
+    """Merge rows of an archived day with rows of the same day in the DB.
+
+    Both are ordered by creation time and user ID, as the segment and the time
+    index of the DB keep them. DB rows equal to archived ones, e.g. left in the DB
+    by 'archive' without '--remove', are skipped.
+
+    Parameters
+    ----------
+    archived : Iterable[List[ReadRow]]
+        Batches of rows of a segment.
+    stored : Iterable[List[ReadRow]]
+        Batches of rows in the DB.
+
+    Returns
+    -------
+    Iterator[ReadRow]
+        Rows in order of creation time.
+
+    """
+    key = itemgetter(0, 1)
+    # Ties are taken from the archive first
+    merged = heapq.merge(
+        itertools.chain.from_iterable(archived),
+        itertools.chain.from_iterable(stored),
+        key=key,
+    )
+    for _, group in itertools.groupby(merged, key=key):
+        # Segments keep NULL messages as empty strings
+        seen = set()
+        for row in group:
+            message = row[4] or ""
+            if message not in seen:
+                seen.add(message)
+                yield row
+
+
+def _padding(size: int) -> int:
+    """Number of bytes which align a section of 'size' bytes to 8 bytes."""
+    return -size % 8
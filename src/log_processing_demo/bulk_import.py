@@ -0,0 +1,391 @@
+"""
+Offline import of saved LOG data: NDJSON as printed by 'show' and API responses,
+optionally gzip'd.
+
+NDJSON files are split into chunks of whole lines in the main process: plain files
+by looking for line ends in a memory map, gzip'd ones by large buffered reads. A
+pool of processes parses and validates the chunks into 'LogBatch' objects, which
+the main process, the only one touching the DB, writes in file order. An API
+response is a single JSON document and is parsed by a single worker.
+"""
+import gzip
+import json
+import mmap
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from log_processing_demo import database
+from log_processing_demo.log_batch import LogBatch, LogBatchError
+from log_processing_demo.log_receiver import ERROR_NAME, LOG_LIST_NAME
+
+try:
+    import orjson
+except ImportError:  # optional dependency, see 'fast' extra
+    orjson = None
+
+# Bytes of NDJSON parsed by a worker at once
+DEFAULT_BLOCK_SIZE = 8 * 2**20
+
+# Bytes read to detect the format of a file
+SNIFF_SIZE = 64 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+FORMATS = ("auto", "ndjson", "json")
+
+Task = Tuple[Callable[..., LogBatch], Tuple[Any, ...]]
+
+_loads: Callable[[bytes], Any] = orjson.loads if orjson is not None else json.loads
+
+
+class ImportFormatError(ValueError):
+    """Exception for a file which is neither NDJSON nor an API response, or has
+    a malformed record."""
+
+    pass
+
+
+class ImportResult(NamedTuple):
+    """Outcome of importing a single file with 'import_files'."""
+
+    path: Path
+    records: int
+    stored: int
+    error: Optional[Exception]
+
+
+def import_files(
+    db: database.Database,
+    paths: Iterable[Path],
+    workers: Optional[int] = None,
+    file_format: str = "auto",
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    chunk_size: int = database.DEFAULT_CHUNK_SIZE,
+) -> Iterator[ImportResult]:
+    """Store LOG records of files, each in a transaction of its own.
+
+    Import is idempotent like 'Database.update'. A file which can't be read or has
+    a malformed record is reported in its result and leaves nothing in the DB.
+    DB errors are re-rised.
+
+    Parameters
+    ----------
+    db : database.Database
+        Destination DB.
+    paths : Iterable[Path]
+        Files to import.
+    workers : Optional[int]
+        Number of parsing processes, 0 to parse in the calling process. Default is
+        the number of CPUs.
+    file_format : str
+        'ndjson', 'json' for API responses or 'auto' to detect it for every file,
+        see 'detect_format'.
+    block_size : int
+        Bytes of NDJSON parsed by a worker at once.
+    chunk_size : int
+        Number of records written to the DB at once.
+
+    Returns
+    -------
+    Iterator[ImportResult]
+        Results in order of the files.
+
+    Raises
+    ------
+    ValueError
+        Rised for an unknown format or a non-positive block size.
+
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format!r}, expected one of {FORMATS}")
+    if block_size < 1:
+        raise ValueError(f"block_size must be positive, got {block_size}")
+    workers = os.cpu_count() or 1 if workers is None else workers
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+    try:
+        for path in paths:
+            path = Path(path)
+            records = 0
+
+            def chunks() -> Iterator[database.RowChunk]:
+                nonlocal records
+                kind = detect_format(path) if file_format == "auto" else file_format
+                tasks = (
+                    _response_tasks(path)
+                    if kind == "json"
+                    else _ndjson_tasks(path, block_size)
+                )
+                # Two blocks per worker are in flight, so memory usage is bounded
+                for batch in _map_in_order(executor, tasks, 2 * workers):
+                    records += len(batch)
+                    yield from database.row_chunks(batch, chunk_size)
+
+            rows = chunks()
+            try:
+                stored = db.update_chunks(rows)
+            except (OSError, ValueError) as error:
+                # Blocks of the file which are still pending are cancelled
+                rows.close()
+                yield ImportResult(path, records, 0, error)
+                continue
+            yield ImportResult(path, records, stored, None)
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+def detect_format(path: Path) -> str:
+    """Tell NDJSON from an API response by the first line of a file.
+
+    Parameters
+    ----------
+    path : Path
+        File, optionally gzip'd.
+
+    Returns
+    -------
+    str
+        'ndjson' if the first line is a JSON object without the members of an API
+        response, 'json' otherwise.
+
+    Raises
+    ------
+    ImportFormatError
+        Rised if the file doesn't start with a JSON object.
+
+    """
+    with _open(path) as stream:
+        head = stream.read(SNIFF_SIZE).lstrip()
+    if not head:
+        return "ndjson"  # nothing to import either way
+    if not head.startswith(b"{"):
+        raise ImportFormatError(f"{path}: not NDJSON or an API response")
+    try:
+        first = _loads(head.split(b"\n", 1)[0])
+    except ValueError:
+        return "json"  # a document spanning lines, or a long one
+    if isinstance(first, dict) and not {LOG_LIST_NAME, ERROR_NAME} & set(first):
+        return "ndjson"
+    return "json"
+
+
+def parse_lines(data: bytes, path: str, offset: int = 0) -> LogBatch:
+    """Parse and validate NDJSON lines into a batch. Used by worker processes.
+
+    Parameters
+    ----------
+    data : bytes
+        Whole lines. Empty lines are skipped.
+    path : str
+        File name for error messages.
+    offset : int
+        Position of 'data' in the (decompressed) file, for error messages.
+
+    Returns
+    -------
+    LogBatch
+        Records in order of the lines.
+
+    Raises
+    ------
+    ImportFormatError
+        Rised for a line which isn't JSON or a record which doesn't pass validation.
+
+    """
+    records = []
+    offsets = []
+    position = 0
+    for line in data.split(b"\n"):
+        if line.strip():
+            try:
+                records.append(_loads(line))
+            except ValueError as error:
+                raise ImportFormatError(
+                    f"{path}, byte {offset + position}: {error}"
+                ) from error
+            offsets.append(offset + position)
+        position += len(line) + 1
+
+    batch = LogBatch()
+    try:
+        batch.extend(records)
+    except LogBatchError as error:
+        # Records before the malformed one stay in the batch
+        message = str(error).split(": ", 1)[-1]
+        raise ImportFormatError(
+            f"{path}, byte {offsets[len(batch)]}: {message}"
+        ) from error
+    return batch
+
+
+def parse_range(path: str, start: int, end: int) -> LogBatch:
+    """Parse and validate NDJSON lines of a plain file range, see 'parse_lines'.
+
+    Parameters
+    ----------
+    path : str
+        Plain NDJSON file.
+    start : int
+        Position of the first line.
+    end : int
+        Position after the last line.
+
+    Returns
+    -------
+    LogBatch
+        Records in order of the lines.
+
+    """
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as memory:
+        data = memory[start:end]
+    return parse_lines(data, path, start)
+
+
+def parse_response(path: str) -> LogBatch:
+    """Parse and validate a saved API response. Used by worker processes.
+
+    Parameters
+    ----------
+    path : str
+        API response file, optionally gzip'd.
+
+    Returns
+    -------
+    LogBatch
+        Records in the order of the response.
+
+    Raises
+    ------
+    ImportFormatError
+        Rised for malformed JSON, a response with an error message or a record
+        which doesn't pass validation.
+
+    """
+    with _open(Path(path)) as stream:
+        try:
+            data = _loads(stream.read())
+        except ValueError as error:
+            raise ImportFormatError(f"{path}: {error}") from error
+    if not isinstance(data, dict) or not isinstance(data.get(LOG_LIST_NAME, []), list):
+        raise ImportFormatError(f"{path}: not an API response")
+    if data.get(ERROR_NAME):
+        raise ImportFormatError(f"{path}: API error {data[ERROR_NAME]!r}")
+    try:
+        return LogBatch.from_records(data.get(LOG_LIST_NAME, []))
+    except LogBatchError as error:
+        raise ImportFormatError(f"{path}: {error}") from error
+
+
+def _open(path: Path) -> BinaryIO:
+    """Open a file for binary reading, decompressing it if it is gzip'd."""
+    with open(path, "rb") as file:
+        compressed = file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    return gzip.open(path, "rb") if compressed else open(path, "rb")
+
+
+def _response_tasks(path: Path) -> Iterator[Task]:
+    """The single task of parsing an API response file."""
+    yield parse_response, (str(path),)
+
+
+def _ndjson_tasks(path: Path, block_size: int) -> Iterator[Task]:
+    """Split an NDJSON file into tasks of whole lines of about 'block_size' bytes.
+
+    Workers read ranges of plain files themselves, blocks of gzip'd files are
+    decompressed here and handed over.
+    """
+    with open(path, "rb") as file:
+        compressed = file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+        size = os.fstat(file.fileno()).st_size
+        if not compressed:
+            if not size:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory:
+                for start, end in _line_ranges(memory, size, block_size):
+                    yield parse_range, (str(path), start, end)
+            return
+
+    with gzip.open(path, "rb") as stream:
+        offset = 0
+        tail = b""
+        while True:
+            block = stream.read(block_size)
+            if not block:
+                break
+            data = tail + block
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                yield parse_lines, (data[:cut], str(path), offset)
+                offset += cut
+            tail = data[cut:]
+        if tail:
+            yield parse_lines, (tail, str(path), offset)
+
+
+def _line_ranges(
+    memory: mmap.mmap, size: int, block_size: int
+) -> List[Tuple[int, int]]:
+    """Split a memory map into ranges of whole lines of about 'block_size' bytes."""
+    ranges = []
+    start = 0
+    while start < size:
+        line_end = memory.find(b"\n", min(start + block_size, size) - 1)
+        end = size if line_end < 0 else line_end + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _map_in_order(
+    executor: Optional[Executor], tasks: Iterable[Task], max_pending: int
+) -> Iterator[LogBatch]:
+    """Run tasks in an executor, or in place without one, and yield results in order.
+
+    Parameters
+    ----------
+    executor : Optional[Executor]
+        Process pool.
+    tasks : Iterable[Task]
+        Functions and their arguments.
+    max_pending : int
+        Number of tasks submitted ahead of the result being yielded.
+
+    Returns
+    -------
+    Iterator[LogBatch]
+        Task results.
+
+    """
+    if executor is None:
+        for function, args in tasks:
+            yield function(*args)
+        return
+
+    pending: Deque[Future] = deque()
+    try:
+        for function, args in tasks:
+            pending.append(executor.submit(function, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -1,66 +1,692 @@
 """
 Database interaction module.
 """
+import base64
+import contextlib
 import functools
+import hashlib
+import heapq
+import itertools
+import json
 import logging
 import sqlite3
+import tempfile
+import time
+import urllib.parse
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Union
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
+from log_processing_demo import metrics
+from log_processing_demo.log_batch import LogBatch
 from log_processing_demo.log_item import LogItem
 from log_processing_demo.log_updater import LogUpdater
+from log_processing_demo.read_cache import ReadCache
+from log_processing_demo.timestamps import (
+    epoch_us_to_iso,
+    from_epoch_us,
+    iso_to_epoch_us,
+    to_epoch_us,
+)
 
 logger = logging.getLogger(__name__)
 
+# Number of LOG records written with a single 'executemany' call
+DEFAULT_CHUNK_SIZE = 10000
 
-def db_logging(log_statement: str):
-    """Decorator for logging database operations.
+# PRAGMA settings applied by 'Database.bulk_load' for the duration of a load
+BULK_LOAD_PRAGMAS: Dict[str, Union[str, int]] = {
+    "synchronous": "OFF",
+    "journal_mode": "MEMORY",
+    "cache_size": -65536,  # negative value means KiB, i.e. 64 MiB
+}
+
+# Number of rows fetched from a cursor at once by 'Database.iter_read'
+DEFAULT_FETCH_SIZE = 5000
+
+# PRAGMAs that are allowed to be tuned through 'Database.bulk_load'
+TUNABLE_PRAGMAS = ("synchronous", "journal_mode", "cache_size")
+
+# Seconds a connection waits for a lock held by another connection before failing
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+# Queries for a table of LOG messages: 'log_messages' or a partition of it
+READ_QUERY = """
+    SELECT lms.created_at, usr.user_id, usr.first_name, usr.second_name, lms.message
+    FROM {table} lms
+        JOIN users usr
+            ON lms.user_id = usr.user_id
+    WHERE lms.created_at > ? AND lms.created_at < ?
+    ORDER BY lms.created_at, lms.user_id, lms.id;
+"""
+# Page of a table of LOG messages after or before a key, see 'Database.read_page'.
+# Rows are ordered by (created_at, user_id, id): the time index ends with the
+# implicit row ID, so a page is a single index seek and no sort is needed.
+PAGE_QUERY = """
+    SELECT lms.created_at, usr.user_id, usr.first_name, usr.second_name, lms.message,
+        lms.id
+    FROM {table} lms
+        JOIN users usr
+            ON lms.user_id = usr.user_id
+    WHERE (lms.created_at, lms.user_id, lms.id) {after} (?, ?, ?)
+        AND lms.created_at {before} ?
+    ORDER BY lms.created_at {order}, lms.user_id {order}, lms.id {order}
+    LIMIT ?;
+"""
+INSERT_QUERY = """
+    INSERT OR IGNORE INTO {table} (created_at, user_id, message)
+    VALUES (?, ?, ?);
+"""
+
+# Storage layouts, see 'Database' and 'PartitionedDatabase'
+SINGLE_TABLE_LAYOUT = "single_table"
+PARTITIONED_LAYOUT = "partitioned"
+
+# Name prefix of per-day tables, the date follows as YYYYMMDD
+PARTITION_PREFIX = "log_messages_"
+PARTITION_GLOB = PARTITION_PREFIX + "[0-9]" * 8
+
+# Full-text search over a table of LOG messages, ranked by bm25. Ranks of different
+# tables are computed with the statistics of each table's own index
+SEARCH_QUERY = """
+    SELECT lms.created_at, usr.user_id, usr.first_name, usr.second_name, lms.message,
+        fts.rank
+    FROM {table}_fts fts
+        JOIN {table} lms
+            ON lms.id = fts.rowid
+        JOIN users usr
+            ON lms.user_id = usr.user_id
+    WHERE fts.{table}_fts MATCH ? AND lms.created_at > ? AND lms.created_at < ?
+    ORDER BY fts.rank, lms.created_at
+    LIMIT ? OFFSET ?;
+"""
+
+# Empty full-text index which search queries are checked against, in the temporary
+# schema of a connection. Its column is named like the column of the real indexes
+QUERY_CHECK_TABLE = "temp.search_query_check"
+
+# Number of search results returned by default
+DEFAULT_SEARCH_LIMIT = 20
+
+# Number of rows of a page returned by 'Database.read_page' by default
+DEFAULT_PAGE_SIZE = 100
+
+UserRow = Tuple[str, str, str]
+MessageRow = Tuple[int, str, str]
+# Users not written before and 'log_messages' rows of a chunk of LOG records
+RowChunk = Tuple[List[UserRow], List[MessageRow]]
+ReadRow = Tuple[int, str, str, str, Optional[str]]
+# Sort key of a row in paginated reads: (created_at, user_id, id)
+PageKey = Tuple[int, str, int]
+
+# Keys of rows returned by 'Database.read', in order of READ_QUERY columns
+READ_COLUMNS = ("created_at", "user_id", "first_name", "second_name", "message")
+
+# Keys of rows returned by 'Database.stats' for time buckets and for users
+BUCKET_STATS_COLUMNS = ("start", "messages", "bytes")
+USER_STATS_COLUMNS = ("user_id", "first_name", "second_name", "messages", "bytes")
+
+# Microseconds in a day
+DAY_US = 86400 * 1000000
+
+# Creation time range that covers any stored record
+MIN_EPOCH_US = -(2**63)
+MAX_EPOCH_US = 2**63 - 1
+
+# Default size limit of the output cache used by 'Database.iter_output'
+OUTPUT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Rollups of message counts and UTF-8 byte totals: name -> (table, bucket length in
+# microseconds, key columns). The first key is the bucket number since the epoch,
+# rounded down like Python's '//', also before 1970.
+ROLLUPS: Dict[str, Tuple[str, int, Tuple[str, ...]]] = {
+    "minute": ("rollup_minutes", 60 * 1000000, ("minute",)),
+    "hour": ("rollup_hours", 3600 * 1000000, ("hour",)),
+    "user": ("rollup_users", DAY_US, ("day", "user_id")),
+}
+
+# Aggregates rows of a table of LOG messages inserted after a row ID by rollup keys
+ROLLUP_SELECT = """
+    SELECT {expressions}, COUNT(*), SUM(COALESCE(length(CAST(message AS BLOB)), 0))
+    FROM {table}
+    WHERE id > ?
+    GROUP BY {expressions}
+"""
+
+
+class SchemaVersionError(Exception):
+    """Exception for a DB created by a newer version of the module."""
+
+    pass
+
+
+class StorageLayoutError(Exception):
+    """Exception for a DB file opened with a class of another storage layout."""
+
+    pass
+
+
+class SearchQueryError(ValueError):
+    """Exception for a malformed full-text search query."""
+
+    pass
+
+
+def _create_tables(cursor: sqlite3.Cursor) -> None:
+    """Schema version 1: LOG messages and users tables."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS log_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at timestamp NOT NULL,
+            user_id TEXT NOT NULL,
+            message TEXT,
+            CONSTRAINT fk_users
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id)
+                ON DELETE CASCADE
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            first_name TEXT,
+            second_name TEXT
+        );
+        """
+    )
+
+
+def _create_time_index(cursor: sqlite3.Cursor) -> None:
+    """Schema version 2: index for time range reads ordered by creation time."""
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_log_messages_created_at_user_id
+        ON log_messages (created_at, user_id);
+        """
+    )
+
+
+def _store_epoch_timestamps(cursor: sqlite3.Cursor) -> None:
+    """Schema version 3: 'created_at' as integer epoch microseconds instead of text."""
+    cursor.connection.create_function(
+        "to_epoch_us",
+        1,
+        lambda value: value if isinstance(value, int) else iso_to_epoch_us(value),
+        deterministic=True,
+    )
+    cursor.execute(
+        """
+        CREATE TABLE log_messages_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            message TEXT,
+            CONSTRAINT fk_users
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id)
+                ON DELETE CASCADE
+        );
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO log_messages_new (id, created_at, user_id, message)
+        SELECT id, to_epoch_us(created_at), user_id, message
+        FROM log_messages;
+        """
+    )
+    cursor.execute("DROP TABLE log_messages;")
+    cursor.execute("ALTER TABLE log_messages_new RENAME TO log_messages;")
+    _create_time_index(cursor)
+
+
+def _content_hash(created_at: int, user_id: str, message: Optional[str]) -> int:
+    """Signed 64-bit hash of a LOG record, stored by schema versions 4 to 8.
+
+    Parameters
+    ----------
+    created_at : int
+        Creation time in epoch microseconds.
+    user_id : str
+        User ID.
+    message : Optional[str]
+        Message text.
+
+    Returns
+    -------
+    int
+        Hash which fits an SQLite INTEGER.
+
+    """
+    # The length of 'user_id' keeps fields apart whatever they contain, a missing
+    # separator tells a None message from any text
+    text = f"{created_at}:{len(user_id)}:{user_id}"
+    if message is not None:
+        text += f":{message}"
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _add_content_hash(cursor: sqlite3.Cursor) -> None:
+    """Schema version 4: unique content hash of messages and per-date ingest watermarks.
+
+    Duplicates stored by earlier versions are removed, the oldest copy is kept.
+    """
+    cursor.connection.create_function(
+        "content_hash", 3, _content_hash, deterministic=True
+    )
+    cursor.execute("ALTER TABLE log_messages ADD COLUMN content_hash INTEGER;")
+    cursor.execute(
+        "UPDATE log_messages SET content_hash = content_hash(created_at, user_id, message);"
+    )
+    cursor.execute(
+        """
+        DELETE FROM log_messages
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM log_messages GROUP BY created_at, user_id, message
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE UNIQUE INDEX idx_log_messages_content_hash
+        ON log_messages (content_hash);
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE ingest_watermarks (
+            log_date TEXT PRIMARY KEY,
+            created_at INTEGER NOT NULL
+        );
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO ingest_watermarks (log_date, created_at)
+        SELECT date(created_at / 1000000, 'unixepoch'), MAX(created_at)
+        FROM log_messages
+        GROUP BY 1;
+        """
+    )
+
+
+def _drop_content_hash(cursor: sqlite3.Cursor) -> None:
+    """Schema version 9: unique (created_at, user_id, message) key instead of a unique
+    content hash, which silently dropped a record on a hash collision.
+
+    Version 4 used to add a 'content_hash' column, the tables which have it are
+    rebuilt without it. Row IDs are kept, so search indexes stay valid.
+    """
+    for table in ["log_messages", *_list_partitions(cursor)]:
+        columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table});")]
+        if "content_hash" not in columns:
+            continue
+        # Index names must be free for the new table
+        indexes = cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+            "AND sql IS NOT NULL;",
+            (table,),
+        ).fetchall()
+        for (index,) in indexes:
+            cursor.execute(f"DROP INDEX {index};")
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old;")
+        if table == "log_messages":
+            cursor.execute(
+                """
+                CREATE TABLE log_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at INTEGER NOT NULL,
+                    user_id TEXT NOT NULL,
+                    message TEXT,
+                    CONSTRAINT fk_users
+                        FOREIGN KEY (user_id)
+                        REFERENCES users(user_id)
+                        ON DELETE CASCADE
+                );
+                """
+            )
+            _create_time_index(cursor)
+            _create_unique_key(cursor, table)
+        else:
+            _create_partition_table(cursor, table)
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (id, created_at, user_id, message)
+            SELECT id, created_at, user_id, message FROM {table}_old;
+            """
+        )
+        cursor.execute(f"DROP TABLE {table}_old;")
+
+
+def _create_unique_key(cursor: sqlite3.Cursor, table: str) -> None:
+    """Create the unique index of a table of LOG messages, the key of idempotent ingest.
+
+    Messages are never NULL in ingested records, validation rejects them.
+    """
+    cursor.execute(
+        f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_unique_key
+        ON {table} (created_at, user_id, message);
+        """
+    )
+
+
+def _create_partition_table(cursor: sqlite3.Cursor, table: str) -> None:
+    """Create a per-day table of LOG messages and its indexes if they don't exist."""
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            created_at INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            message TEXT
+        );
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_{table}_created_at_user_id
+        ON {table} (created_at, user_id);
+        """
+    )
+    _create_unique_key(cursor, table)
+
+
+def _create_output_cache(cursor: sqlite3.Cursor) -> None:
+    """Schema version 5: rendered query output cached across processes."""
+    cursor.execute(
+        """
+        CREATE TABLE output_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_us INTEGER NOT NULL,
+            end_us INTEGER NOT NULL,
+            variant TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            UNIQUE (start_us, end_us, variant)
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE output_cache_chunks (
+            entry_id INTEGER NOT NULL,
+            number INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            PRIMARY KEY (entry_id, number)
+        );
+        """
+    )
+
+
+def _create_settings(cursor: sqlite3.Cursor) -> None:
+    """Schema version 6: DB-wide settings, starting with the storage layout."""
+    cursor.execute(
+        """
+        CREATE TABLE settings (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        """
+    )
+    cursor.execute(
+        "INSERT INTO settings (name, value) VALUES ('layout', ?);",
+        (SINGLE_TABLE_LAYOUT,),
+    )
+
+
+def _add_message_search(cursor: sqlite3.Cursor) -> None:
+    """Schema version 7: full-text index of messages, filled from stored ones."""
+    for table in ["log_messages", *_list_partitions(cursor)]:
+        _create_message_index(cursor, table)
+        cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild');")
+
+
+def _create_rollups(cursor: sqlite3.Cursor) -> None:
+    """Schema version 8: per-minute, per-hour and per-user daily rollups, filled from
+    stored messages."""
+    for rollup, _, keys in ROLLUPS.values():
+        key_columns = "".join(
+            f"{key} {'TEXT' if key == 'user_id' else 'INTEGER'} NOT NULL, "
+            for key in keys
+        )
+        cursor.execute(
+            f"""
+            CREATE TABLE {rollup} (
+                {key_columns}
+                messages INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                PRIMARY KEY ({', '.join(keys)})
+            ) WITHOUT ROWID;
+            """
+        )
+    for table in ["log_messages", *_list_partitions(cursor)]:
+        _roll_up(cursor, table, 0)
+
+
+def _roll_up(cursor: sqlite3.Cursor, table: str, last_id: int) -> None:
+    """Add rows of a table of LOG messages inserted after 'last_id' to all rollups.
+
+    Parameters
+    ----------
+    cursor : sqlite3.Cursor
+        Cursor of the DB file.
+    table : str
+        Table name.
+    last_id : int
+        Largest row ID before the insert.
+
+    Returns
+    -------
+    None
+
+    """
+    for rollup, unit, keys in ROLLUPS.values():
+        cursor.execute(
+            f"""
+            INSERT INTO {rollup} ({', '.join(keys)}, messages, bytes)
+            {_rollup_select(unit, keys, table)}
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                messages = messages + excluded.messages,
+                bytes = bytes + excluded.bytes;
+            """,
+            (last_id,),
+        )
+
+
+def _rollup_select(unit: int, keys: Tuple[str, ...], table: str) -> str:
+    """ROLLUP_SELECT for the keys of a rollup and a table of LOG messages."""
+    return ROLLUP_SELECT.format(
+        expressions=", ".join((_bucket_expression(unit), *keys[1:])), table=table
+    )
+
+
+def _bucket_expression(unit: int) -> str:
+    """SQL number of the 'unit' long time bucket of 'created_at', like Python's '//'."""
+    # SQLite's '/' truncates towards zero, negative times are rounded down instead
+    return f"created_at / {unit} - (created_at % {unit} < 0)"
+
+
+def _floor_rollup_buckets(cursor: sqlite3.Cursor) -> None:
+    """Schema version 10: rollups rebuilt if messages created before 1970 are stored.
+
+    Version 8 truncated bucket numbers of such messages towards zero, while 'stats'
+    rounds them down.
+    """
+    tables = ["log_messages", *_list_partitions(cursor)]
+    if not any(
+        cursor.execute(
+            f"SELECT 1 FROM {table} WHERE created_at < 0 LIMIT 1;"
+        ).fetchone()
+        for table in tables
+    ):
+        return
+    for rollup, _, _ in ROLLUPS.values():
+        cursor.execute(f"DELETE FROM {rollup};")
+    for table in tables:
+        _roll_up(cursor, table, 0)
+
+
+def _create_message_index(cursor: sqlite3.Cursor, table: str) -> None:
+    """Create the FTS5 index of a table of LOG messages if it doesn't exist.
+
+    The index stores no copy of the text, it refers to the rows of the table. It is
+    kept up to date by 'Database' explicitly, a chunk of rows at a time: per-row
+    triggers make ingest several times slower.
+    """
+    cursor.execute(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5 (
+            message, content='{table}', content_rowid='id'
+        );
+        """
+    )
+
+
+def _list_partitions(
+    cursor: sqlite3.Cursor,
+    low: str = PARTITION_PREFIX,
+    high: str = PARTITION_PREFIX + "9",
+) -> List[str]:
+    """Names of per-day tables within a range of names, in order of their days."""
+    return [
+        name
+        for (name,) in cursor.execute(
+            """
+            SELECT name FROM sqlite_master
+            WHERE type = 'table'
+                AND name GLOB ?
+                AND name BETWEEN ? AND ?
+            ORDER BY name;
+            """,
+            (PARTITION_GLOB, low, high),
+        ).fetchall()
+    ]
+
+
+# Schema migrations. Migration N brings the schema from version N-1 to version N,
+# the current version is stored in 'PRAGMA user_version'. Append only.
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    _create_tables,
+    _create_time_index,
+    _store_epoch_timestamps,
+    _add_content_hash,
+    _create_output_cache,
+    _create_settings,
+    _add_message_search,
+    _create_rollups,
+    _drop_content_hash,
+    _floor_rollup_buckets,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def db_logging(log_statement: str, log_every: int = 1):
+    """Decorator for logging and timing database operations.
+
+    Arguments are described in log lines by 'metrics.LazyArguments', so a call with
+    a large list of records isn't converted to a string. The duration and row count
+    of every call are recorded as 'db.<function name>' if metrics are enabled.
 
     Parameters
     ----------
     log_statement : str
         Log statement that describes DB operation.
+    log_every : int
+        Log only the first and every N-th successful call, for frequent operations.
+        Errors are always logged.
     """
 
     def decorator(function):
+        name = f"db.{function.__name__}"
+        calls = itertools.count()
+
         @functools.wraps(function)
         def wrapper(*args, **kwargs):
+            start = time.perf_counter() if metrics.registry.enabled else None
             try:
                 result_or_none = function(*args, **kwargs)
-                logger.info(
-                    "%s - success: %s.\nArguments:%s, %s",
-                    function.__name__,
-                    log_statement,
-                    str(args)[:100],
-                    str(kwargs)[:100],
-                )
-                return result_or_none
             except Exception as error:
+                if start is not None:
+                    metrics.registry.record(
+                        name, time.perf_counter() - start, error=True
+                    )
                 logger.error(
-                    "%s - ERROR: %s.\n%s\nArguments:%s, %s",
+                    "%s - ERROR: %s.\n%s\nArguments: %s",
                     function.__name__,
                     log_statement,
-                    str(error),
-                    str(args)[:100],
-                    str(kwargs)[:100],
+                    error,
+                    metrics.LazyArguments(args, kwargs),
                 )
                 raise
+            if start is not None:
+                metrics.registry.record(
+                    name,
+                    time.perf_counter() - start,
+                    metrics.count_rows(result_or_none),
+                )
+            if next(calls) % log_every == 0:
+                logger.info(
+                    "%s - success: %s.\nArguments: %s",
+                    function.__name__,
+                    log_statement,
+                    metrics.LazyArguments(args, kwargs),
+                )
+            return result_or_none
 
         return wrapper
 
     return decorator
 
 
+class Page(NamedTuple):
+    """Rows returned by 'Database.read_page' and the cursor of the next page."""
+
+    rows: List[Dict[str, Union[datetime, str]]]
+    next_cursor: Optional[str]
+
+
 class Database(LogUpdater):
     """Class to update and read from a DB."""
 
-    def __init__(self, db_uri: str) -> None:
+    # Storage layout of DB files opened with this class
+    LAYOUT = SINGLE_TABLE_LAYOUT
+
+    def __init__(
+        self,
+        db_uri: str,
+        read_cache: Optional[ReadCache] = None,
+        read_only: bool = False,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+    ) -> None:
         """Constructor.
 
         Parameters
         ----------
         db_uri : str
             *.db file path or ':memory:'.
+        read_cache : Optional[ReadCache]
+            Cache of 'read' results. It is invalidated by writes of this object and
+            dropped entirely when another connection changes the DB.
+        read_only : bool
+            Open an existing DB file for queries only. The connection may be used
+            from any thread, one at a time, and the schema isn't upgraded.
+        busy_timeout : float
+            Seconds to wait for a lock held by another connection.
 
         Returns
         -------
@@ -68,160 +694,1869 @@ class Database(LogUpdater):
 
         """
         self.db_uri = db_uri
-        self._connect_to_db(self.db_uri)
+        self.read_cache = read_cache
+        self.read_only = read_only
+        self._connect_to_db(self.db_uri, busy_timeout)
+        self._data_version = self._current_data_version()
 
     @db_logging("connect to database")
-    def _connect_to_db(self, db_uri: str) -> None:
-        """Initializes SQLite connection with options to handle timestamps.
+    def _connect_to_db(self, db_uri: str, busy_timeout: float) -> None:
+        """Initializes SQLite connection and brings the schema up to date.
 
         Parameters
         ----------
         db_uri : str
             *.db file path or ':memory:'.
+        busy_timeout : float
+            Seconds to wait for a lock held by another connection.
 
         Returns
         -------
         None
 
+        Raises
+        ------
+        SchemaVersionError
+            Rised for a read-only DB file with an outdated schema.
+        StorageLayoutError
+            Rised for a read-only DB file with a different layout.
+
         """
-        self.connection: sqlite3.Connection = sqlite3.connect(
-            db_uri, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+        self.connection: sqlite3.Connection = _connect(
+            db_uri, self.read_only, busy_timeout
         )
         self.connection.row_factory = sqlite3.Row
         self.cursor: sqlite3.Cursor = self.connection.cursor()
+        if not self.read_only:
+            self._migrate()
+            self._check_layout()
+            return
 
-    @db_logging("update LOG data")
-    def update(self, message_list: List[LogItem]) -> None:
-        """Update database with logs fetched by LogReceiver.
+        if self.schema_version != SCHEMA_VERSION:
+            raise SchemaVersionError(
+                f"DB schema version {self.schema_version} differs from "
+                f"{SCHEMA_VERSION}, open the DB for writing to upgrade it"
+            )
+        if self.layout != self.LAYOUT:
+            raise StorageLayoutError(
+                f"DB layout is '{self.layout}', open it with 'open_database'"
+            )
 
-        Parameters
-        ----------
-        message_list : List[LogItem]
-            Output of call to LogReceiver object.
+    @db_logging("migrate database schema")
+    def _migrate(self) -> None:
+        """Bring the DB schema to SCHEMA_VERSION, upgrading existing DB files in place.
+
+        Every migration runs in its own transaction together with the version bump.
 
         Returns
         -------
         None
 
-        """
-        self.cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS log_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                created_at timestamp NOT NULL,
-                user_id TEXT NOT NULL,
-                message TEXT,
-                CONSTRAINT fk_users
-                    FOREIGN KEY (user_id)
-                    REFERENCES users(user_id)
-                    ON DELETE CASCADE
-            );
-            """
-        )
-        self.cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                user_id TEXT PRIMARY KEY,
-                first_name TEXT,
-                second_name TEXT
-            );
-            """
-        )
-        self.connection.commit()
+        Raises
+        ------
+        SchemaVersionError
+            Rised if the DB schema is newer than SCHEMA_VERSION.
 
-        for element in message_list:
-            self.cursor.execute(
-                """
-                INSERT OR IGNORE INTO users (user_id, first_name, second_name)
-                VALUES (?, ?, ?)
-                """,
-                (element.user_id, element.first_name, element.second_name),
+        """
+        version = self.schema_version
+        if version > SCHEMA_VERSION:
+            raise SchemaVersionError(
+                f"DB schema version {version} is newer than supported {SCHEMA_VERSION}"
             )
-            self.cursor.execute(
-                """
-                INSERT INTO 'log_messages'
-                    ('created_at', 'user_id', 'message')
-                VALUES (?, ?, ?);
-                """,
-                (
-                    element.created_at,
-                    element.user_id,
-                    element.message,
-                ),
+
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            self.cursor.execute("BEGIN")
+            try:
+                migration(self.cursor)
+                # PRAGMA values can't be bound as parameters
+                self.cursor.execute(f"PRAGMA user_version = {number:d}")
+            except Exception:
+                self.connection.rollback()
+                raise
+            self.connection.commit()
+            logger.info("DB schema upgraded to version %d.", number)
+
+    def _check_layout(self) -> None:
+        """Make sure the DB file stores LOG messages in a single table.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        StorageLayoutError
+            Rised for a partitioned DB file.
+
+        """
+        if self.layout != SINGLE_TABLE_LAYOUT:
+            raise StorageLayoutError(
+                f"DB layout is '{self.layout}', open it with 'open_database'"
             )
-        self.connection.commit()
 
-    @db_logging("retrieve LOG data")
-    def read(
-        self, log_date: str, time_interval: Optional[Tuple[str, str]] = None
-    ) -> List[Dict[str, Union[datetime, str]]]:
-        """Read log messages for desired date from database, optionally filtering by time.
+    @property
+    def schema_version(self) -> int:
+        """Current version of the DB schema."""
+        return self.cursor.execute("PRAGMA user_version").fetchone()[0]
+
+    @property
+    def layout(self) -> str:
+        """Storage layout of LOG messages in the DB file."""
+        return _read_layout(self.cursor)
+
+    @property
+    def journal_mode(self) -> str:
+        """Journal mode of the connection, e.g. 'delete' or 'wal'."""
+        return self.cursor.execute("PRAGMA journal_mode").fetchone()[0].lower()
+
+    def enable_wal(self) -> None:
+        """Switch the DB file to write-ahead logging, which persists across connections.
+
+        In WAL mode readers see the last committed state and are not blocked by a
+        writer, and a writer isn't blocked by readers. Only one connection writes at a
+        time.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            Rised for a DB which doesn't support WAL, e.g. ':memory:'.
+
+        """
+        mode = self.cursor.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            raise ValueError(f"WAL mode is not supported for {self.db_uri!r}")
+
+    @db_logging("update LOG data")
+    def update(
+        self,
+        message_list: Union[Iterable[LogItem], LogBatch],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        incremental: bool = False,
+    ) -> int:
+        """Update database with logs fetched by LogReceiver.
+
+        Records are written in chunks with 'executemany' inside a single transaction,
+        so either all of them are stored or none. Users are deduplicated in memory
+        before touching the 'users' table.
+
+        Ingest is idempotent: a record identical to a stored one (same creation time,
+        user and message) is skipped, so re-fetching a date stores only new records.
+        The latest creation time stored for every date is kept as its watermark.
 
         Parameters
         ----------
-        date : str
-            LOG date. Format: YYYY-MM-DD
-        time_interval : Optional[Tuple[str]]
-            Tuple of desired time boundaries. Time format: HH:MM:SS
+        message_list : Union[Iterable[LogItem], LogBatch]
+            Output of call to LogReceiver object. Any iterable, including generators.
+            A 'LogBatch' is written straight from its columns.
+        chunk_size : int
+            Number of records written with a single 'executemany' call.
+        incremental : bool
+            Drop records created before the watermark of their date in Python,
+            before any INSERT, so they are neither written nor looked up in the
+            unique (created_at, user_id, message) index. Only safe if the API never
+            adds records to the past of a date, e.g. for repeated fetches of the
+            current day.
 
         Returns
         -------
-        List[Dict[str, Union[datetime, str]]]
-            Structure is identical to LogReceiver output.
+        int
+            Number of records actually stored.
 
         """
-        time_boundaries: Tuple[datetime, datetime]
+        return self._write_chunks(row_chunks(message_list, chunk_size), incremental)
 
-        if time_interval:
-            time_boundaries = (
-                datetime.fromisoformat(f"{log_date}T{time_interval[0]}"),
-                datetime.fromisoformat(f"{log_date}T{time_interval[1]}"),
-            )
-        else:
-            time_boundaries = (
-                datetime.fromisoformat(f"{log_date}"),
-                datetime.fromisoformat(f"{log_date}") + timedelta(days=1),
-            )
+    @db_logging("update LOG data from prepared chunks")
+    def update_chunks(
+        self, chunks: Iterable[RowChunk], incremental: bool = False
+    ) -> int:
+        """Update database with LOG records already converted to DB rows.
 
-        self.cursor.execute(
-            """
-            SELECT lms.created_at, usr.user_id, usr.first_name, usr.second_name, lms.message
-            FROM log_messages lms
-                JOIN users usr
-                    ON lms.user_id = usr.user_id
-            WHERE lms.created_at > ? AND lms.created_at < ?
-            ORDER BY lms.created_at;
-            """,
-            time_boundaries,
-        )
+        Same as 'update', for callers which convert records themselves, e.g.
+        'pipeline.Pipeline' with batches arriving from other threads. All chunks are
+        written in a single transaction, an exception raised by the iterable rolls
+        it back.
 
-        return [dict(item) for item in self.cursor.fetchall()]
+        Parameters
+        ----------
+        chunks : Iterable[RowChunk]
+            Chunks as returned by 'row_chunks'. Users of a chunk must include every
+            user of its rows not given in previous chunks.
+        incremental : bool
+            See 'update'.
 
-    def flush(self, from_date: Optional[str] = None) -> None:
-        """Remove LOG messages from database. Optionally for a particular date.
+        Returns
+        -------
+        int
+            Number of records actually stored.
+
+        """
+        return self._write_chunks(chunks, incremental)
+
+    def _write_chunks(self, chunks: Iterable[RowChunk], incremental: bool) -> int:
+        """Write chunks of users and 'log_messages' rows in a single transaction.
 
         Parameters
         ----------
-        from_date : Optional[str]
-            From this date and earlier all messages will be erased.
+        chunks : Iterable[RowChunk]
+            Users and rows of every chunk.
+        incremental : bool
+            See 'update'.
 
         Returns
         -------
-        None
+        int
+            Number of records actually stored.
 
         """
-        if from_date:
-            self.cursor.execute(
+        # Day number -> watermark stored before this update, None if there is none
+        watermarks: Dict[int, Optional[int]] = {}
+        # Day number -> earliest and latest creation time in this update
+        earliest: Dict[int, int] = {}
+        latest: Dict[int, int] = {}
+        stored = 0
+
+        with self.connection:
+            for new_users, rows in chunks:
+                if incremental:
+                    rows = self._skip_below_watermarks(rows, watermarks)
+                for row in rows:
+                    day = row[0] // DAY_US
+                    if row[0] > latest.get(day, row[0] - 1):
+                        latest[day] = row[0]
+                    if row[0] < earliest.get(day, row[0] + 1):
+                        earliest[day] = row[0]
+
+                self.cursor.executemany(
+                    """
+                    INSERT OR IGNORE INTO users (user_id, first_name, second_name)
+                    VALUES (?, ?, ?)
+                    """,
+                    new_users,
+                )
+                stored += self._insert_messages(rows)
+
+            self.cursor.executemany(
                 """
-                DELETE FROM log_messages
-                WHERE created_at > ?
+                INSERT INTO ingest_watermarks (log_date, created_at)
+                VALUES (?, ?)
+                ON CONFLICT (log_date)
+                    DO UPDATE SET created_at = MAX(created_at, excluded.created_at);
                 """,
-                (datetime.fromisoformat(from_date),),
-            )
-        else:
-            self.cursor.execute(
-                """
-                DELETE FROM log_messages;
-                """
+                [(_day_to_date(day), created_at) for day, created_at in latest.items()],
             )
-        self.connection.commit()
+            if stored:
+                self._invalidate_caches(
+                    [(earliest[day], latest[day]) for day in latest]
+                )
+
+        return stored
+
+    def _insert_messages(self, rows: List[MessageRow]) -> int:
+        """Store 'log_messages' rows, skipping duplicates.
+
+        Parameters
+        ----------
+        rows : List[MessageRow]
+            'log_messages' rows.
+
+        Returns
+        -------
+        int
+            Number of stored rows.
+
+        """
+        return self._insert_into("log_messages", rows)
+
+    def _insert_into(self, table: str, rows: List[MessageRow]) -> int:
+        """Store rows into a table of LOG messages and add them to its search index.
+
+        Parameters
+        ----------
+        table : str
+            Table name.
+        rows : List[MessageRow]
+            'log_messages' rows.
+
+        Returns
+        -------
+        int
+            Number of stored rows.
+
+        """
+        last_id = self._last_message_id(table)
+        self.cursor.executemany(INSERT_QUERY.format(table=table), rows)
+        stored = self.cursor.rowcount
+        if stored:
+            self._index_messages(table, last_id)
+            _roll_up(self.cursor, table, last_id)
+        return stored
+
+    def _last_message_id(self, table: str) -> int:
+        """Largest row ID of a table of LOG messages, 0 for an empty one."""
+        return self.cursor.execute(
+            f"SELECT COALESCE(MAX(id), 0) FROM {table}"
+        ).fetchone()[0]
+
+    def _index_messages(self, table: str, last_id: int) -> None:
+        """Add rows inserted after 'last_id' to the search index of their table.
+
+        New rows always get larger IDs: rows are never deleted from the end of a
+        partition alone, and 'log_messages' IDs are AUTOINCREMENT.
+
+        Parameters
+        ----------
+        table : str
+            Table name.
+        last_id : int
+            Largest row ID before the insert.
+
+        Returns
+        -------
+        None
+
+        """
+        self.cursor.execute(
+            f"""
+            INSERT INTO {table}_fts (rowid, message)
+            SELECT id, message FROM {table} WHERE id > ?;
+            """,
+            (last_id,),
+        )
+
+    def _skip_below_watermarks(
+        self, rows: List[MessageRow], watermarks: Dict[int, Optional[int]]
+    ) -> List[MessageRow]:
+        """Drop rows created before the stored watermark of their date.
+
+        Parameters
+        ----------
+        rows : List[MessageRow]
+            'log_messages' rows.
+        watermarks : Dict[int, Optional[int]]
+            Cache of watermarks by day number, filled in as new days are met.
+
+        Returns
+        -------
+        List[MessageRow]
+            Rows at or after the watermark. Records created at the very watermark
+            are kept, they are deduplicated by the unique key.
+
+        """
+        kept = []
+        for row in rows:
+            day = row[0] // DAY_US
+            if day not in watermarks:
+                watermark = self.cursor.execute(
+                    "SELECT created_at FROM ingest_watermarks WHERE log_date = ?",
+                    (_day_to_date(day),),
+                ).fetchone()
+                watermarks[day] = watermark[0] if watermark else None
+            if watermarks[day] is None or row[0] >= watermarks[day]:
+                kept.append(row)
+        return kept
+
+    @contextlib.contextmanager
+    def bulk_load(self, **pragmas: Union[str, int]) -> Iterator["Database"]:
+        """Context manager that tunes SQLite for a large load and restores settings after.
+
+        The journal mode of a DB file in WAL mode is kept unless it is passed
+        explicitly: leaving WAL needs exclusive access and would block readers.
+
+        Parameters
+        ----------
+        **pragmas : Union[str, int]
+            Overrides for BULK_LOAD_PRAGMAS. Allowed names are listed in
+            TUNABLE_PRAGMAS. Pass None to leave a PRAGMA untouched.
+
+        Returns
+        -------
+        Iterator[Database]
+            The database object itself.
+
+        Raises
+        ------
+        ValueError
+            Rised for a PRAGMA name which is not in TUNABLE_PRAGMAS or a malformed value.
+
+        """
+        unknown = set(pragmas) - set(TUNABLE_PRAGMAS)
+        if unknown:
+            raise ValueError(f"Unsupported PRAGMA(s): {', '.join(sorted(unknown))}")
+
+        settings = {**BULK_LOAD_PRAGMAS, **pragmas}
+        if "journal_mode" not in pragmas and self.journal_mode == "wal":
+            settings["journal_mode"] = None
+        previous = {}
+        for name, value in settings.items():
+            if value is None:
+                continue
+            # PRAGMA values can't be bound as parameters, so they are checked here
+            if not isinstance(value, int) and not str(value).isalnum():
+                raise ValueError(f"Malformed value for PRAGMA {name}: {value!r}")
+            previous[name] = self.cursor.execute(f"PRAGMA {name}").fetchone()[0]
+            self.cursor.execute(f"PRAGMA {name} = {value}")
+
+        try:
+            yield self
+        finally:
+            for name, value in previous.items():
+                self.cursor.execute(f"PRAGMA {name} = {value}")
+
+    @db_logging("retrieve ingest watermark", log_every=100)
+    def watermark(self, log_date: str) -> Optional[datetime]:
+        """Latest creation time stored for a date, see 'update'.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+
+        Returns
+        -------
+        Optional[datetime]
+            Naive UTC datetime, None if nothing has been stored for the date.
+
+        """
+        row = self.cursor.execute(
+            "SELECT created_at FROM ingest_watermarks WHERE log_date = ?", (log_date,)
+        ).fetchone()
+        return from_epoch_us(row[0]) if row else None
+
+    @db_logging("retrieve LOG data", log_every=100)
+    def read(
+        self,
+        log_date: str,
+        time_interval: Optional[Tuple[str, str]] = None,
+        iso_format: bool = False,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Dict[str, Union[datetime, str]]]:
+        """Read log messages for desired date from database, optionally filtering by time.
+
+        Parameters
+        ----------
+        date : str
+            LOG date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS
+        iso_format : bool
+            Return 'created_at' as 'YYYY-MM-DD HH:MM:SS' string instead of datetime.
+            No datetime objects are built in that case.
+        limit : Optional[int]
+            Maximum number of rows. Use 'read_page' to get the cursor of the next page.
+        cursor : Optional[str]
+            Return rows after the page of this cursor, see 'read_page'.
+        descending : bool
+            Latest rows first.
+
+        Returns
+        -------
+        List[Dict[str, Union[datetime, str]]]
+            Structure is identical to LogReceiver output.
+
+        """
+        if self.read_cache is None or limit or cursor or descending:
+            batches = self.iter_read(
+                log_date,
+                time_interval,
+                iso_format,
+                limit=limit,
+                cursor=cursor,
+                descending=descending,
+            )
+            return [item for batch in batches for item in batch]
+
+        self._check_data_version()
+        key = (*_time_boundaries(log_date, time_interval), iso_format)
+        rows = self.read_cache.get(key)
+        if rows is None:
+            rows = [
+                item
+                for batch in self.iter_read(log_date, time_interval, iso_format)
+                for item in batch
+            ]
+            self.read_cache.put(key, rows)
+        # Callers may modify the rows, the cached ones must stay intact
+        return list(map(dict.copy, rows))
+
+    @db_logging("retrieve LOG data page", log_every=100)
+    def read_page(
+        self,
+        log_date: str,
+        time_interval: Optional[Tuple[str, str]] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        descending: bool = False,
+        iso_format: bool = False,
+    ) -> Page:
+        """Read a page of log messages with keyset pagination.
+
+        A page starts right after the last row of the previous one, found with an
+        index seek, so deep pages are as fast as the first one. Rows stored in the
+        meantime don't shift pages, unlike with OFFSET.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS
+        limit : int
+            Maximum number of rows.
+        cursor : Optional[str]
+            'next_cursor' of the previous page, None for the first page.
+        descending : bool
+            Latest rows first.
+        iso_format : bool
+            Return 'created_at' as 'YYYY-MM-DD HH:MM:SS' string instead of datetime.
+
+        Returns
+        -------
+        Page
+            Rows with the structure of 'read', in order of creation time, latest
+            first if 'descending', and the opaque cursor of the next page, None if
+            this page is the last one.
+
+        Raises
+        ------
+        ValueError
+            Rised for a non-positive limit or a malformed cursor.
+
+        """
+        if limit < 1:
+            raise ValueError(f"limit must be positive, got {limit}")
+        start, end = _time_boundaries(log_date, time_interval)
+        # One extra row tells whether there is a next page
+        rows = [
+            row
+            for batch in self._iter_page_rows(
+                start, end, limit + 1, cursor, descending, limit + 1
+            )
+            for row in batch
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1][0], rows[-1][1], rows[-1][5])
+
+        convert = epoch_us_to_iso if iso_format else from_epoch_us
+        page = [dict(zip(READ_COLUMNS, row)) for row in rows]
+        for item in page:
+            item["created_at"] = convert(item["created_at"])
+        return Page(page, next_cursor)
+
+    def iter_output(
+        self,
+        log_date: str,
+        time_interval: Optional[Tuple[str, str]],
+        variant: str,
+        encode: Callable[[List[Dict[str, Union[datetime, str]]]], bytes],
+        max_bytes: int = OUTPUT_CACHE_MAX_BYTES,
+    ) -> Iterator[bytes]:
+        """Rendered output of 'iter_read' batches, cached in the DB across processes.
+
+        On a miss the output is rendered batch by batch with 'iso_format' rows and
+        spooled to a temporary file while it is yielded, then stored in the DB,
+        unless another connection changed the DB in the meantime. Cached output is
+        invalidated by 'update' and 'flush' like the 'read' cache.
+
+        Storing takes the write lock of the DB file. It is skipped rather than
+        waited for if another connection, e.g. a 'fetch', holds the lock, and
+        with a read-only connection.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS
+        variant : str
+            Name of the output format, part of the cache key.
+        encode : Callable[[List[Dict[str, Union[datetime, str]]]], bytes]
+            Renders a batch of rows.
+        max_bytes : int
+            Larger output is not cached. Older entries are evicted to keep the
+            whole output cache within this size.
+
+        Returns
+        -------
+        Iterator[bytes]
+            Output chunks.
+
+        """
+        start, end = _time_boundaries(log_date, time_interval)
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        entry = cursor.execute(
+            """
+            SELECT id FROM output_cache
+            WHERE start_us = ? AND end_us = ? AND variant = ?
+            """,
+            (start, end, variant),
+        ).fetchone()
+        if entry:
+            try:
+                cursor.execute(
+                    """
+                    SELECT payload FROM output_cache_chunks
+                    WHERE entry_id = ?
+                    ORDER BY number
+                    """,
+                    entry,
+                )
+                for (payload,) in cursor:
+                    yield payload
+            finally:
+                cursor.close()
+            return
+        cursor.close()
+
+        data_version = self._current_data_version()
+        sizes: List[int] = []
+        with tempfile.TemporaryFile() as spool:
+            for batch in self.iter_read(log_date, time_interval, iso_format=True):
+                payload = encode(batch)
+                if sum(sizes) + len(payload) <= max_bytes:
+                    spool.write(payload)
+                    sizes.append(len(payload))
+                else:
+                    sizes.append(-1)  # too large to cache
+                yield payload
+
+            if -1 in sizes or self.read_only or not self._try_begin_immediate():
+                return
+            spool.seek(0)
+            with self.connection:
+                # Somebody else has written to the DB since the output was rendered
+                if self._current_data_version() != data_version:
+                    return
+                self._prune_output_cache(max_bytes - sum(sizes))
+                self.cursor.execute(
+                    """
+                    INSERT OR REPLACE INTO output_cache
+                        (start_us, end_us, variant, size)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (start, end, variant, sum(sizes)),
+                )
+                entry_id = self.cursor.lastrowid
+                self.cursor.executemany(
+                    """
+                    INSERT INTO output_cache_chunks (entry_id, number, payload)
+                    VALUES (?, ?, ?)
+                    """,
+                    (
+                        (entry_id, number, spool.read(size))
+                        for number, size in enumerate(sizes)
+                    ),
+                )
+
+    def _try_begin_immediate(self) -> bool:
+        """Start a write transaction unless another connection holds the write lock.
+
+        Returns
+        -------
+        bool
+            Whether the transaction has been started.
+
+        """
+        busy_timeout = self.cursor.execute("PRAGMA busy_timeout").fetchone()[0]
+        self.cursor.execute("PRAGMA busy_timeout = 0")
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as error:
+            logger.info("Output is not cached: %s", error)
+            return False
+        finally:
+            self.cursor.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+        return True
+
+    def _prune_output_cache(self, max_bytes: int) -> None:
+        """Evict the oldest cached output until the rest fits 'max_bytes'.
+
+        Parameters
+        ----------
+        max_bytes : int
+            Size limit of the remaining entries.
+
+        Returns
+        -------
+        None
+
+        """
+        total = 0
+        stale = []
+        for entry_id, size in self.cursor.execute(
+            "SELECT id, size FROM output_cache ORDER BY id DESC"
+        ).fetchall():
+            total += size
+            if total > max_bytes:
+                stale.append((entry_id,))
+        self.cursor.executemany(
+            "DELETE FROM output_cache_chunks WHERE entry_id = ?", stale
+        )
+        self.cursor.executemany("DELETE FROM output_cache WHERE id = ?", stale)
+
+    def _invalidate_caches(self, ranges: Iterable[Tuple[int, int]]) -> None:
+        """Drop cached results which may contain rows created within the ranges.
+
+        Must be called within the transaction of the change.
+
+        Parameters
+        ----------
+        ranges : Iterable[Tuple[int, int]]
+            Inclusive (earliest, latest) creation time ranges of changed rows,
+            epoch microseconds.
+
+        Returns
+        -------
+        None
+
+        """
+        for start, end in ranges:
+            if self.read_cache is not None:
+                self.read_cache.invalidate(start, end)
+            stale = "SELECT id FROM output_cache WHERE start_us < ? AND end_us > ?"
+            self.cursor.execute(
+                f"DELETE FROM output_cache_chunks WHERE entry_id IN ({stale})",
+                (end, start),
+            )
+            self.cursor.execute(
+                "DELETE FROM output_cache WHERE start_us < ? AND end_us > ?",
+                (end, start),
+            )
+
+    def _current_data_version(self) -> int:
+        """'PRAGMA data_version', which changes when another connection commits."""
+        return self.cursor.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self) -> None:
+        """Drop the 'read' cache if another connection has changed the DB.
+
+        Returns
+        -------
+        None
+
+        """
+        data_version = self._current_data_version()
+        if data_version != self._data_version:
+            self._data_version = data_version
+            if self.read_cache is not None:
+                self.read_cache.clear()
+
+    def iter_read(
+        self,
+        log_date: str,
+        time_interval: Optional[Tuple[str, str]] = None,
+        iso_format: bool = False,
+        batch_size: int = DEFAULT_FETCH_SIZE,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        descending: bool = False,
+    ) -> Iterator[List[Dict[str, Union[datetime, str]]]]:
+        """Read log messages like 'read' does, but in batches fetched from a cursor.
+
+        Only one batch is held in memory at a time. The DB shouldn't be updated
+        until the iterator is exhausted.
+
+        Parameters
+        ----------
+        date : str
+            LOG date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS
+        iso_format : bool
+            Return 'created_at' as 'YYYY-MM-DD HH:MM:SS' string instead of datetime.
+        batch_size : int
+            Number of rows fetched at once.
+        limit : Optional[int]
+            Maximum number of rows.
+        cursor : Optional[str]
+            Return rows after the page of this cursor, see 'read_page'.
+        descending : bool
+            Latest rows first.
+
+        Returns
+        -------
+        Iterator[List[Dict[str, Union[datetime, str]]]]
+            Batches of rows in order of creation time, latest first if
+            'descending'.
+
+        """
+        convert = epoch_us_to_iso if iso_format else from_epoch_us
+        rows_batches = self.iter_rows(
+            log_date, time_interval, batch_size, limit, cursor, descending
+        )
+        for rows in rows_batches:
+            batch = [dict(zip(READ_COLUMNS, row)) for row in rows]
+            for item in batch:
+                item["created_at"] = convert(item["created_at"])
+            yield batch
+
+    @metrics.instrument("db.iter_rows", rows=lambda args, batch: len(batch))
+    def iter_rows(
+        self,
+        log_date: str,
+        time_interval: Optional[Tuple[str, str]] = None,
+        batch_size: int = DEFAULT_FETCH_SIZE,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        descending: bool = False,
+    ) -> Iterator[List[ReadRow]]:
+        """Read raw rows of 'iter_read' with creation time in epoch microseconds.
+
+        Parameters
+        ----------
+        date : str
+            LOG date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS
+        batch_size : int
+            Number of rows fetched at once.
+        limit : Optional[int]
+            Maximum number of rows.
+        cursor : Optional[str]
+            Return rows after the page of this cursor, see 'read_page'.
+        descending : bool
+            Latest rows first.
+
+        Returns
+        -------
+        Iterator[List[ReadRow]]
+            Batches of (created_at, user_id, first_name, second_name, message)
+            tuples in order of creation time, latest first if 'descending'.
+
+        Raises
+        ------
+        ValueError
+            Rised for a non-positive limit or a malformed cursor.
+
+        """
+        start, end = _time_boundaries(log_date, time_interval)
+        if limit is not None or cursor or descending:
+            if limit is not None and limit < 1:
+                raise ValueError(f"limit must be positive, got {limit}")
+            for rows in self._iter_page_rows(
+                start, end, limit, cursor, descending, batch_size
+            ):
+                yield [row[:5] for row in rows]
+            return
+        yield from self._iter_table_rows(start, end, batch_size)
+
+    @metrics.instrument("db.iter_day_rows", rows=lambda args, batch: len(batch))
+    def iter_day_rows(
+        self, log_date: str, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[List[ReadRow]]:
+        """Read raw rows of a whole date, e.g. to archive it.
+
+        Unlike 'iter_rows', a row created exactly at midnight is included, so the
+        rows are the ones 'delete_day' removes.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+        batch_size : int
+            Number of rows fetched at once.
+
+        Returns
+        -------
+        Iterator[List[ReadRow]]
+            Same as 'iter_rows' returns.
+
+        """
+        start = iso_to_epoch_us(log_date)
+        # Timestamps are whole microseconds, the exclusive boundary includes 'start'
+        yield from self._iter_table_rows(start - 1, start + DAY_US, batch_size)
+
+    def _iter_table_rows(
+        self, start: int, end: int, batch_size: int
+    ) -> Iterator[List[ReadRow]]:
+        """Read rows within exclusive time boundaries in order of creation time.
+
+        Parameters
+        ----------
+        start : int
+            Exclusive lower boundary, epoch microseconds.
+        end : int
+            Exclusive upper boundary, epoch microseconds.
+        batch_size : int
+            Number of rows fetched at once.
+
+        Returns
+        -------
+        Iterator[List[ReadRow]]
+            Batches of ReadRow tuples.
+
+        """
+        db_cursor = self.connection.cursor()
+        db_cursor.row_factory = None  # plain tuples are cheaper than sqlite3.Row
+
+        try:
+            # Tables don't overlap in time, so their rows come in order one by one
+            for table in self._message_tables(start, end):
+                db_cursor.execute(READ_QUERY.format(table=table), (start, end))
+                while True:
+                    rows = db_cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+        finally:
+            db_cursor.close()
+
+    def _iter_page_rows(
+        self,
+        start: int,
+        end: int,
+        limit: Optional[int],
+        cursor: Optional[str],
+        descending: bool,
+        batch_size: int,
+    ) -> Iterator[List[Tuple[Any, ...]]]:
+        """Read rows in keyset order within exclusive time boundaries, see 'read_page'.
+
+        Parameters
+        ----------
+        start : int
+            Exclusive lower boundary, epoch microseconds.
+        end : int
+            Exclusive upper boundary, epoch microseconds.
+        limit : Optional[int]
+            Maximum number of rows, None for all of them.
+        cursor : Optional[str]
+            Cursor of the previous page.
+        descending : bool
+            Latest rows first.
+        batch_size : int
+            Number of rows fetched at once.
+
+        Returns
+        -------
+        Iterator[List[Tuple[Any, ...]]]
+            Batches of ReadRow tuples followed by the row ID.
+
+        """
+        if descending:
+            key = (end, "", MIN_EPOCH_US)  # below any row created at 'end'
+        else:
+            key = (start + 1, "", MIN_EPOCH_US)  # below any row created after 'start'
+        if cursor:
+            # The query bounds one side by the key, a cursor of another date or
+            # interval must not move it out of the boundaries
+            decoded = _decode_cursor(cursor)
+            key = min(key, decoded) if descending else max(key, decoded)
+        operators = {
+            "after": "<" if descending else ">",
+            "before": ">" if descending else "<",
+            "order": "DESC" if descending else "ASC",
+        }
+        remaining = -1 if limit is None else limit  # a negative LIMIT is no limit
+        tables = self._message_tables(start, end)
+        db_cursor = self.connection.cursor()
+        db_cursor.row_factory = None
+
+        try:
+            # Tables don't overlap in time, a key of one table bounds the others
+            for table in reversed(tables) if descending else tables:
+                db_cursor.execute(
+                    PAGE_QUERY.format(table=table, **operators),
+                    (*key, start if descending else end, remaining),
+                )
+                while remaining:
+                    rows = db_cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    remaining -= len(rows)
+                    yield rows
+                if not remaining:
+                    break
+        finally:
+            db_cursor.close()
+
+    @db_logging("search LOG data", log_every=100)
+    def search(
+        self,
+        query: str,
+        log_date: Optional[str] = None,
+        time_interval: Optional[Tuple[str, str]] = None,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        offset: int = 0,
+        iso_format: bool = False,
+    ) -> List[Dict[str, Union[datetime, str]]]:
+        """Find messages with the full-text index, best matches first.
+
+        Parameters
+        ----------
+        query : str
+            FTS5 query: words, "quoted phrases", prefixes like 'night*', AND, OR,
+            NOT and parentheses. Words are matched case-insensitively.
+        log_date : Optional[str]
+            Search only this date. Format: YYYY-MM-DD
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries within 'log_date'. Time format: HH:MM:SS
+        limit : int
+            Maximum number of results.
+        offset : int
+            Number of best results to skip, for pagination.
+        iso_format : bool
+            Return 'created_at' as 'YYYY-MM-DD HH:MM:SS' string instead of datetime.
+
+        Returns
+        -------
+        List[Dict[str, Union[datetime, str]]]
+            Same structure as 'read' returns, ordered by bm25 rank. Rows with equal
+            rank are ordered by creation time. With several message tables, e.g.
+            days of 'PartitionedDatabase', each table ranks its rows by the word
+            frequencies of its own index, so ranks of different tables are only
+            roughly comparable.
+
+        Raises
+        ------
+        SearchQueryError
+            Rised for a malformed query.
+
+        """
+        if limit < 0 or offset < 0:
+            raise ValueError("limit and offset must not be negative")
+        if time_interval and not log_date:
+            raise ValueError("time_interval requires log_date")
+        if log_date:
+            start, end = _time_boundaries(log_date, time_interval)
+        else:
+            start, end = MIN_EPOCH_US, MAX_EPOCH_US
+
+        self._check_search_query(query)
+        tables = self._message_tables(start, end)
+        if len(tables) == 1:
+            bounds, skip = (limit, offset), 0
+        else:
+            # Any table may have the best rows of the page
+            bounds, skip = (offset + limit, 0), offset
+        cursors = []
+        try:
+            for table in tables:
+                cursor = self.connection.cursor()
+                cursor.row_factory = None
+                cursors.append(cursor)
+                cursor.execute(
+                    SEARCH_QUERY.format(table=table), (query, start, end, *bounds)
+                )
+            # Rows of the tables are merged lazily, so only 'offset + limit' rows
+            # are fetched in total
+            merged = heapq.merge(*cursors, key=itemgetter(5, 0))
+            found = list(itertools.islice(merged, skip, skip + limit))
+        finally:
+            for cursor in cursors:
+                cursor.close()
+
+        convert = epoch_us_to_iso if iso_format else from_epoch_us
+        batch = [dict(zip(READ_COLUMNS, row)) for row in found]
+        for item in batch:
+            item["created_at"] = convert(item["created_at"])
+        return batch
+
+    def _check_search_query(self, query: str) -> None:
+        """Check an FTS5 query against an empty full-text index.
+
+        Parameters
+        ----------
+        query : str
+            FTS5 query, see 'search'.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        SearchQueryError
+            Rised for a malformed query.
+
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {QUERY_CHECK_TABLE} "
+                "USING fts5 (message);"
+            )
+            try:
+                cursor.execute(
+                    f"SELECT 1 FROM {QUERY_CHECK_TABLE} "
+                    "WHERE search_query_check MATCH ?;",
+                    (query,),
+                )
+            except sqlite3.OperationalError as error:
+                # The query is the only input, e.g. 'no such column' is reported
+                # for 'word:' which FTS5 reads as a column filter
+                raise SearchQueryError(
+                    f"Malformed search query {query!r}: {error}"
+                ) from error
+        finally:
+            cursor.close()
+
+    @db_logging("retrieve LOG statistics", log_every=100)
+    def stats(
+        self,
+        log_date: str,
+        by: str = "hour",
+        time_interval: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Union[str, int]]]:
+        """Message counts and byte totals of a date from the rollups, no messages are read.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+        by : str
+            'minute' or 'hour' for time buckets, 'user' for per-user totals of the
+            date. See ROLLUPS.
+        time_interval : Optional[Tuple[str]]
+            Tuple of desired time boundaries. Time format: HH:MM:SS. Buckets which
+            overlap the interval are returned whole. Not supported for 'user'.
+
+        Returns
+        -------
+        List[Dict[str, Union[str, int]]]
+            Rows with BUCKET_STATS_COLUMNS keys in order of time, 'start' is
+            'YYYY-MM-DD HH:MM:SS'. Rows with USER_STATS_COLUMNS keys for 'user',
+            most active users first. Message sizes are counted in UTF-8 bytes.
+
+        """
+        if by not in ROLLUPS:
+            raise ValueError(
+                f"Unknown stats grouping {by!r}, use one of {list(ROLLUPS)}"
+            )
+        rollup, unit, keys = ROLLUPS[by]
+        start, end = _time_boundaries(log_date, time_interval)
+
+        if by == "user":
+            if time_interval:
+                raise ValueError("Per-user stats are kept for whole dates only")
+            rows = self.cursor.execute(
+                """
+                SELECT rlp.user_id, usr.first_name, usr.second_name, rlp.messages,
+                    rlp.bytes
+                FROM rollup_users rlp
+                    JOIN users usr
+                        ON rlp.user_id = usr.user_id
+                WHERE rlp.day = ?
+                ORDER BY rlp.messages DESC, rlp.user_id;
+                """,
+                (start // DAY_US,),
+            ).fetchall()
+            return [dict(zip(USER_STATS_COLUMNS, row)) for row in rows]
+
+        rows = self.cursor.execute(
+            f"""
+            SELECT {keys[0]}, messages, bytes FROM {rollup}
+            WHERE {keys[0]} >= ? AND {keys[0]} < ?
+            ORDER BY {keys[0]};
+            """,
+            (start // unit, -(-end // unit)),
+        ).fetchall()
+        return [
+            dict(zip(BUCKET_STATS_COLUMNS, (epoch_us_to_iso(bucket * unit), *totals)))
+            for bucket, *totals in rows
+        ]
+
+    @db_logging("check LOG statistics")
+    def check_rollups(self, repair: bool = False) -> List[Dict[str, Any]]:
+        """Rebuild rollups from stored messages and compare them with the kept ones.
+
+        Parameters
+        ----------
+        repair : bool
+            Replace rollups which differ with the rebuilt ones.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            Differences: rollup name, its key columns, 'stored' and 'actual'
+            totals as {'messages': ..., 'bytes': ...} or None for a missing bucket.
+            Empty if the rollups are consistent.
+
+        """
+        differences = []
+        tables = self._message_tables(MIN_EPOCH_US, MAX_EPOCH_US)
+        with self.connection:
+            # Messages and rollups are compared within a single snapshot
+            self.cursor.execute("BEGIN IMMEDIATE" if repair else "BEGIN")
+            for name, (rollup, unit, keys) in ROLLUPS.items():
+                actual: Dict[Tuple[Any, ...], Tuple[int, int]] = {}
+                for table in tables:
+                    for *key, messages, size in self.cursor.execute(
+                        _rollup_select(unit, keys, table), (0,)
+                    ):
+                        previous = actual.get(tuple(key), (0, 0))
+                        actual[tuple(key)] = (
+                            previous[0] + messages,
+                            previous[1] + size,
+                        )
+                stored = {
+                    tuple(key): (messages, size)
+                    for *key, messages, size in self.cursor.execute(
+                        f"SELECT {', '.join(keys)}, messages, bytes FROM {rollup};"
+                    )
+                }
+
+                found = [
+                    {
+                        "rollup": name,
+                        **dict(zip(keys, key)),
+                        "stored": _totals(stored.get(key)),
+                        "actual": _totals(actual.get(key)),
+                    }
+                    for key in sorted(stored.keys() | actual.keys())
+                    if stored.get(key) != actual.get(key)
+                ]
+                if found and repair:
+                    self.cursor.execute(f"DELETE FROM {rollup};")
+                    self.cursor.executemany(
+                        f"INSERT INTO {rollup} VALUES ({', '.join('?' * (len(keys) + 2))});",
+                        [(*key, *totals) for key, totals in actual.items()],
+                    )
+                differences += found
+        return differences
+
+    def _message_tables(self, start: int, end: int) -> List[str]:
+        """Tables which may hold LOG messages created within a time range.
+
+        Parameters
+        ----------
+        start : int
+            Exclusive lower boundary, epoch microseconds.
+        end : int
+            Exclusive upper boundary, epoch microseconds.
+
+        Returns
+        -------
+        List[str]
+            Table names in order of creation time of their messages.
+
+        """
+        return ["log_messages"]
+
+    def flush(self, from_date: Optional[str] = None) -> None:
+        """Remove LOG messages from database. Optionally for a particular date.
+
+        Parameters
+        ----------
+        from_date : Optional[str]
+            From this date and earlier all messages will be erased.
+
+        Returns
+        -------
+        None
+
+        """
+        if from_date:
+            # Start of the next day
+            end = iso_to_epoch_us(from_date) + DAY_US
+            self._delete_messages(None, end)
+            self._delete_rollups(None, end)
+            self.cursor.execute(
+                "DELETE FROM ingest_watermarks WHERE log_date <= ?", (from_date,)
+            )
+            self._invalidate_caches([(MIN_EPOCH_US, end - 1)])
+        else:
+            self._delete_messages(None, None)
+            self._delete_rollups(None, None)
+            self.cursor.execute("DELETE FROM ingest_watermarks;")
+            self._invalidate_caches([(MIN_EPOCH_US, MAX_EPOCH_US)])
+        self.connection.commit()
+        self._release_space()
+
+    def delete_day(self, log_date: str) -> None:
+        """Remove LOG messages of a single date, e.g. after it has been archived.
+
+        Rollups of the date are removed too, 'stats' count only stored messages.
+
+        Parameters
+        ----------
+        log_date : str
+            LOG date. Format: YYYY-MM-DD
+
+        Returns
+        -------
+        None
+
+        """
+        start = iso_to_epoch_us(log_date)
+        self._delete_messages(start, start + DAY_US)
+        self._delete_rollups(start, start + DAY_US)
+        self.cursor.execute(
+            "DELETE FROM ingest_watermarks WHERE log_date = ?", (log_date,)
+        )
+        self._invalidate_caches([(start, start + DAY_US - 1)])
+        self.connection.commit()
+        self._release_space()
+
+    def _delete_messages(self, start: Optional[int], end: Optional[int]) -> None:
+        """Delete LOG messages created within a range, in the current transaction.
+
+        Parameters
+        ----------
+        start : Optional[int]
+            Inclusive lower boundary, epoch microseconds. None means no boundary.
+        end : Optional[int]
+            Exclusive upper boundary, epoch microseconds. None means no boundary.
+
+        Returns
+        -------
+        None
+
+        """
+        if start is None and end is None:
+            self.cursor.execute(
+                "INSERT INTO log_messages_fts (log_messages_fts) VALUES ('delete-all');"
+            )
+            self.cursor.execute("DELETE FROM log_messages;")
+            return
+
+        boundaries = (
+            MIN_EPOCH_US if start is None else start,
+            MAX_EPOCH_US if end is None else end,
+        )
+        # An external content index is told the values which it must forget
+        self.cursor.execute(
+            """
+            INSERT INTO log_messages_fts (log_messages_fts, rowid, message)
+            SELECT 'delete', id, message FROM log_messages
+            WHERE created_at >= ? AND created_at < ?;
+            """,
+            boundaries,
+        )
+        self.cursor.execute(
+            """
+            DELETE FROM log_messages
+            WHERE created_at >= ? AND created_at < ?;
+            """,
+            boundaries,
+        )
+
+    def _delete_rollups(self, start: Optional[int], end: Optional[int]) -> None:
+        """Delete rollup buckets of a range of whole days, in the current transaction.
+
+        Parameters
+        ----------
+        start : Optional[int]
+            Start of the first day in epoch microseconds. None means no boundary.
+        end : Optional[int]
+            Start of the day after the last one in epoch microseconds. None means
+            no boundary.
+
+        Returns
+        -------
+        None
+
+        """
+        for rollup, unit, keys in ROLLUPS.values():
+            # Days start on bucket boundaries, so no bucket is split
+            self.cursor.execute(
+                f"DELETE FROM {rollup} WHERE {keys[0]} >= ? AND {keys[0]} < ?;",
+                (
+                    MIN_EPOCH_US if start is None else start // unit,
+                    MAX_EPOCH_US if end is None else end // unit,
+                ),
+            )
+
+    def _release_space(self) -> None:
+        """Hook called after messages are deleted. Space is reused by SQLite as is.
+
+        Returns
+        -------
+        None
+
+        """
+        pass
+
+
+class PartitionedDatabase(Database):
+    """Database which keeps LOG messages of every day in a table of its own.
+
+    Retention drops whole tables instead of deleting rows one by one, and the file
+    uses incremental auto-vacuum, so freed pages are returned to the file system
+    right after a flush. Reads only touch the tables of the requested days. Users,
+    watermarks and caches are shared with the single-table layout.
+    """
+
+    LAYOUT = PARTITIONED_LAYOUT
+
+    @db_logging("migrate database schema")
+    def _migrate(self) -> None:
+        """Bring the DB schema up to date like 'Database._migrate' does.
+
+        A new DB file is switched to incremental auto-vacuum first, which is only
+        possible before any table is created.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.schema_version == 0:
+            self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        super()._migrate()
+
+    @db_logging("convert database to partitioned layout")
+    def _check_layout(self) -> None:
+        """Convert a single-table DB file to the partitioned layout in place.
+
+        Stored messages are moved to per-day tables. An existing file which is not
+        set up for incremental auto-vacuum yet is rebuilt with VACUUM once.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.layout == PARTITIONED_LAYOUT:
+            return
+
+        with self.connection:
+            days = [
+                day
+                for (day,) in self.cursor.execute(
+                    f"SELECT DISTINCT {_bucket_expression(DAY_US)} FROM log_messages"
+                ).fetchall()
+            ]
+            for day in days:
+                table = self._create_partition(day)
+                last_id = self._last_message_id(table)
+                self.cursor.execute(
+                    f"""
+                    INSERT INTO {table} (created_at, user_id, message)
+                    SELECT created_at, user_id, message
+                    FROM log_messages
+                    WHERE created_at >= ? AND created_at < ?
+                    ORDER BY created_at;
+                    """,
+                    (day * DAY_US, (day + 1) * DAY_US),
+                )
+                self._index_messages(table, last_id)
+            super()._delete_messages(None, None)
+            self.cursor.execute(
+                "UPDATE settings SET value = ? WHERE name = 'layout';",
+                (PARTITIONED_LAYOUT,),
+            )
+
+        # 2 is INCREMENTAL
+        if self.cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.cursor.execute("VACUUM")
+
+    @property
+    def partitions(self) -> List[str]:
+        """Dates of stored partitions in order, format: YYYY-MM-DD."""
+        return [
+            f"{name[-8:-4]}-{name[-4:-2]}-{name[-2:]}"
+            for name in self._partition_tables()
+        ]
+
+    def _insert_messages(self, rows: List[MessageRow]) -> int:
+        """Store rows like 'Database._insert_messages' into tables of their days.
+
+        Parameters
+        ----------
+        rows : List[MessageRow]
+            'log_messages' rows.
+
+        Returns
+        -------
+        int
+            Number of stored rows.
+
+        """
+        # Duplicates have the same creation time, so per-day uniqueness is enough
+        days: Dict[int, List[MessageRow]] = {}
+        for row in rows:
+            days.setdefault(row[0] // DAY_US, []).append(row)
+
+        stored = 0
+        for day, day_rows in days.items():
+            stored += self._insert_into(self._create_partition(day), day_rows)
+        return stored
+
+    def _create_partition(self, day: int) -> str:
+        """Create the table of a day if it doesn't exist.
+
+        Parameters
+        ----------
+        day : int
+            Day number since the epoch.
+
+        Returns
+        -------
+        str
+            Table name.
+
+        """
+        table = _partition_name(day)
+        _create_partition_table(self.cursor, table)
+        _create_message_index(self.cursor, table)
+        return table
+
+    def _partition_tables(
+        self, first_day: Optional[int] = None, last_day: Optional[int] = None
+    ) -> List[str]:
+        """Names of partition tables, optionally within a range of days.
+
+        Parameters
+        ----------
+        first_day : Optional[int]
+            First day number, inclusive.
+        last_day : Optional[int]
+            Last day number, inclusive.
+
+        Returns
+        -------
+        List[str]
+            Table names in order of their days.
+
+        """
+        # Names sort like the dates they contain
+        low = PARTITION_PREFIX if first_day is None else _partition_name(first_day)
+        high = PARTITION_PREFIX + "9" if last_day is None else _partition_name(last_day)
+        return _list_partitions(self.cursor, low, high)
+
+    def _message_tables(self, start: int, end: int) -> List[str]:
+        """Partitions of the days within a time range, see 'Database._message_tables'.
+
+        Parameters
+        ----------
+        start : int
+            Exclusive lower boundary, epoch microseconds.
+        end : int
+            Exclusive upper boundary, epoch microseconds.
+
+        Returns
+        -------
+        List[str]
+            Table names in order of creation time of their messages.
+
+        """
+        return self._partition_tables(
+            None if start <= MIN_EPOCH_US else (start + 1) // DAY_US,
+            None if end >= MAX_EPOCH_US else (end - 1) // DAY_US,
+        )
+
+    def _release_space(self) -> None:
+        """Return pages freed by dropped partitions to the file system.
+
+        Returns
+        -------
+        None
+
+        """
+        # 'execute' steps this PRAGMA only once, which frees a single page
+        self.connection.executescript("PRAGMA incremental_vacuum;")
+
+    def _delete_messages(self, start: Optional[int], end: Optional[int]) -> None:
+        """Drop partitions of the days within a range, see 'Database._delete_messages'.
+
+        Parameters
+        ----------
+        start : Optional[int]
+            Start of the first day in epoch microseconds. None means no boundary.
+        end : Optional[int]
+            Start of the day after the last one in epoch microseconds. None means
+            no boundary.
+
+        Returns
+        -------
+        None
+
+        """
+        first_day = None if start is None else start // DAY_US
+        last_day = None if end is None else end // DAY_US - 1
+        for table in self._partition_tables(first_day, last_day):
+            self.cursor.execute(f"DROP TABLE {table};")
+            self.cursor.execute(f"DROP TABLE {table}_fts;")
+
+
+def open_database(
+    db_uri: str,
+    read_cache: Optional[ReadCache] = None,
+    read_only: bool = False,
+    busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+) -> Union[Database, PartitionedDatabase]:
+    """Open a DB file with the class of its storage layout.
+
+    Parameters
+    ----------
+    db_uri : str
+        *.db file path or ':memory:'. A new DB file has the single-table layout.
+    read_cache : Optional[ReadCache]
+        Cache of 'read' results.
+    read_only : bool
+        Open an existing DB file for queries only, see 'Database'.
+    busy_timeout : float
+        Seconds to wait for a lock held by another connection.
+
+    Returns
+    -------
+    Union[Database, PartitionedDatabase]
+        Database object.
+
+    """
+    connection = _connect(db_uri, read_only, busy_timeout)
+    try:
+        layout = _read_layout(connection.cursor())
+    finally:
+        connection.close()
+    database_class = PartitionedDatabase if layout == PARTITIONED_LAYOUT else Database
+    return database_class(db_uri, read_cache, read_only, busy_timeout)
+
+
+def _connect(db_uri: str, read_only: bool, busy_timeout: float) -> sqlite3.Connection:
+    """Open an SQLite connection, see 'Database'.
+
+    Parameters
+    ----------
+    db_uri : str
+        *.db file path or ':memory:'.
+    read_only : bool
+        Open an existing file in read-only mode.
+    busy_timeout : float
+        Seconds to wait for a lock held by another connection.
+
+    Returns
+    -------
+    sqlite3.Connection
+        New connection.
+
+    Raises
+    ------
+    ValueError
+        Rised for a read-only in-memory DB.
+
+    """
+    if not read_only:
+        return sqlite3.connect(db_uri, timeout=busy_timeout)
+    if db_uri == ":memory:":
+        raise ValueError("An in-memory DB can't be opened read-only")
+    uri = f"file:{urllib.parse.quote(str(db_uri))}?mode=ro"
+    return sqlite3.connect(uri, uri=True, timeout=busy_timeout, check_same_thread=False)
+
+
+def _read_layout(cursor: sqlite3.Cursor) -> str:
+    """Storage layout of a DB file, which may be older than the 'settings' table.
+
+    Parameters
+    ----------
+    cursor : sqlite3.Cursor
+        Cursor of the DB file.
+
+    Returns
+    -------
+    str
+        SINGLE_TABLE_LAYOUT or PARTITIONED_LAYOUT.
+
+    """
+    try:
+        row = cursor.execute(
+            "SELECT value FROM settings WHERE name = 'layout'"
+        ).fetchone()
+    except sqlite3.OperationalError:  # no such table
+        return SINGLE_TABLE_LAYOUT
+    return row[0] if row else SINGLE_TABLE_LAYOUT
+
+
+def _partition_name(day: int) -> str:
+    """Name of the table of a day number since the epoch."""
+    return PARTITION_PREFIX + _day_to_date(day).replace("-", "")
+
+
+def _time_boundaries(
+    log_date: str, time_interval: Optional[Tuple[str, str]] = None
+) -> Tuple[int, int]:
+    """Convert a date and optional time interval to epoch microseconds boundaries.
+
+    Parameters
+    ----------
+    log_date : str
+        LOG date. Format: YYYY-MM-DD
+    time_interval : Optional[Tuple[str]]
+        Tuple of desired time boundaries. Time format: HH:MM:SS
+
+    Returns
+    -------
+    Tuple[int, int]
+        Exclusive lower and upper boundaries.
+
+    """
+    if time_interval:
+        return (
+            iso_to_epoch_us(f"{log_date}T{time_interval[0]}"),
+            iso_to_epoch_us(f"{log_date}T{time_interval[1]}"),
+        )
+
+    start = datetime.fromisoformat(f"{log_date}")
+    return to_epoch_us(start), to_epoch_us(start + timedelta(days=1))
+
+
+def _encode_cursor(created_at: int, user_id: str, row_id: int) -> str:
+    """Opaque page cursor of the sort key of a row, see 'Database.read_page'."""
+    key = json.dumps([created_at, user_id, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> PageKey:
+    """Sort key of a page cursor.
+
+    Parameters
+    ----------
+    cursor : str
+        Cursor made by '_encode_cursor'.
+
+    Returns
+    -------
+    PageKey
+        (created_at, user_id, id) of the last row of the previous page.
+
+    Raises
+    ------
+    ValueError
+        Rised for a malformed cursor.
+
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, user_id, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"Malformed page cursor {cursor!r}") from error
+    if not (
+        type(created_at) is int and isinstance(user_id, str) and type(row_id) is int
+    ):
+        raise ValueError(f"Malformed page cursor {cursor!r}")
+    # SQLite integers are signed 64-bit, larger ones can't be bound to a query
+    if not (
+        MIN_EPOCH_US <= created_at <= MAX_EPOCH_US
+        and MIN_EPOCH_US <= row_id <= MAX_EPOCH_US
+    ):
+        raise ValueError(f"Malformed page cursor {cursor!r}")
+    return created_at, user_id, row_id
+
+
+def row_chunks(
+    message_list: Union[Iterable[LogItem], LogBatch], chunk_size: int
+) -> Iterator[RowChunk]:
+    """Convert LOG records to chunks of DB rows, see 'Database.update_chunks'.
+
+    Parameters
+    ----------
+    message_list : Union[Iterable[LogItem], LogBatch]
+        Source of LOG records, see 'Database.update'.
+    chunk_size : int
+        Maximum number of LOG records in a chunk.
+
+    Returns
+    -------
+    Iterator[RowChunk]
+        Users not given in previous chunks and 'log_messages' rows of every chunk.
+
+    Raises
+    ------
+    ValueError
+        Rised for a chunk size below 1.
+
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+    if isinstance(message_list, LogBatch):
+        return _batch_chunks(message_list, chunk_size)
+    return _item_chunks(message_list, chunk_size)
+
+
+def _item_chunks(message_list: Iterable[LogItem], size: int) -> Iterator[RowChunk]:
+    """Convert 'LogItem' records to DB rows chunk by chunk, deduplicating users.
+
+    Parameters
+    ----------
+    message_list : Iterable[LogItem]
+        Source of LOG records.
+    size : int
+        Maximum number of LOG records in a chunk.
+
+    Returns
+    -------
+    Iterator[RowChunk]
+        Users not seen in previous chunks and 'log_messages' rows of every chunk.
+
+    """
+    seen_users = set()
+    for chunk in _chunked(message_list, size):
+        new_users = []
+        for element in chunk:
+            if element.user_id not in seen_users:
+                seen_users.add(element.user_id)
+                new_users.append(
+                    (element.user_id, element.first_name, element.second_name)
+                )
+        rows = [
+            (to_epoch_us(element.created_at), element.user_id, element.message)
+            for element in chunk
+        ]
+        yield new_users, rows
+
+
+def _batch_chunks(batch: LogBatch, size: int) -> Iterator[RowChunk]:
+    """Same as '_item_chunks' for a 'LogBatch': users come from its dictionary.
+
+    Parameters
+    ----------
+    batch : LogBatch
+        LOG records.
+    size : int
+        Maximum number of LOG records in a chunk.
+
+    Returns
+    -------
+    Iterator[RowChunk]
+        All users with the first chunk, 'log_messages' rows of every chunk.
+
+    """
+    # The first triple of a user_id wins, like in '_item_chunks'
+    new_users = list({user[0]: user for user in reversed(batch.users)}.values())
+    for rows in _chunked(batch.db_rows(), size):
+        yield new_users, rows
+        new_users = []
+
+
+def _totals(totals: Optional[Tuple[int, int]]) -> Optional[Dict[str, int]]:
+    """Rollup totals as a dictionary, None for a missing bucket."""
+    return None if totals is None else dict(zip(("messages", "bytes"), totals))
+
+
+def _day_to_date(day: int) -> str:
+    """Convert a day number since the epoch to 'YYYY-MM-DD'."""
+    return from_epoch_us(day * DAY_US).date().isoformat()
+
+
+def _chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most 'size' elements.
+
+    Parameters
+    ----------
+    iterable : Iterable[Any]
+        Source of LOG records or rows.
+    size : int
+        Maximum chunk length.
+
+    Returns
+    -------
+    Iterator[List[Any]]
+        Consecutive chunks of the source.
+
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,191 @@
+"""
+Incremental JSON parsing of API responses that arrive in chunks.
+
+Only the structure used by the LOG API is supported: a top-level object, one member
+of which is a (potentially huge) array. Elements of that array are decoded and
+handed out one by one, so memory usage does not depend on the array length.
+"""
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Tuple
+
+WHITESPACE = " \t\n\r"
+
+
+class JsonStreamError(ValueError):
+    """Exception for malformed or truncated JSON streams."""
+
+    pass
+
+
+class _ChunkReader:
+    """Character buffer over an iterable of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Read the next chunk into the buffer, dropping consumed characters.
+
+        Returns
+        -------
+        bool
+            False if the stream is exhausted.
+
+        """
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buffer = self._buffer[self._position :] + text
+                self._position = 0
+                return True
+        self._buffer = self._buffer[self._position :] + self._decoder.decode(
+            b"", final=True
+        )
+        self._position = 0
+        self._eof = True
+        return False
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it.
+
+        Returns
+        -------
+        str
+            The character or an empty string at the end of the stream.
+
+        """
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in WHITESPACE
+            ):
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                return ""
+
+    def next_char(self) -> str:
+        """Consume and return the next non-whitespace character.
+
+        Returns
+        -------
+        str
+            The character.
+
+        Raises
+        ------
+        JsonStreamError
+            Rised at the end of the stream.
+
+        """
+        char = self.peek()
+        if not char:
+            raise JsonStreamError("Unexpected end of JSON stream")
+        self._position += 1
+        return char
+
+    def expect(self, expected: str) -> None:
+        """Consume the next non-whitespace character, which must be 'expected'.
+
+        Parameters
+        ----------
+        expected : str
+            Expected character.
+
+        Returns
+        -------
+        None
+
+        """
+        char = self.next_char()
+        if char != expected:
+            raise JsonStreamError(f"Expected {expected!r}, got {char!r}")
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value.
+
+        Returns
+        -------
+        Any
+            Decoded value.
+
+        """
+        if not self.peek():
+            raise JsonStreamError("Unexpected end of JSON stream")
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as error:
+                if not self._fill():
+                    raise JsonStreamError(str(error)) from error
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._position = end
+            return value
+
+
+def iter_members(chunks: Iterable[bytes], array_key: str) -> Iterator[Tuple[str, Any]]:
+    """Iterate over members of a top-level JSON object received in chunks.
+
+    Parameters
+    ----------
+    chunks : Iterable[bytes]
+        UTF-8 encoded JSON document split arbitrarily, e.g. 'Response.iter_content()'.
+    array_key : str
+        Name of the array member whose elements are yielded one at a time.
+
+    Returns
+    -------
+    Iterator[Tuple[str, Any]]
+        (key, value) pairs in document order. For 'array_key' one pair is
+        yielded per array element.
+
+    Raises
+    ------
+    JsonStreamError
+        Rised for malformed or truncated JSON.
+
+    """
+    reader = _ChunkReader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.next_char()
+        return
+
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise JsonStreamError(f"Object key must be a string, got {key!r}")
+        reader.expect(":")
+
+        if key == array_key:
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.next_char()
+            else:
+                while True:
+                    yield key, reader.value()
+                    char = reader.next_char()
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise JsonStreamError(f"Expected ',' or ']', got {char!r}")
+        else:
+            yield key, reader.value()
+
+        char = reader.next_char()
+        if char == "}":
+            return
+        if char != ",":
+            raise JsonStreamError(f"Expected ',' or '}}', got {char!r}")
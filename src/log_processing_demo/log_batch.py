@@ -0,0 +1,325 @@
+"""
+Columnar in-memory representation of LOG records.
+
+A 'LogBatch' keeps creation times as an int64 array of epoch microseconds, users as
+codes into a dictionary of distinct (user_id, first_name, second_name) triples and
+messages as one UTF-8 buffer with (start, end) offsets. It takes a small fraction of the memory
+of a list of 'LogItem' objects and is validated without building a model per row.
+"""
+import itertools
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+from pydantic import PydanticTypeError, PydanticValueError
+from pydantic.datetime_parse import parse_datetime
+from pydantic.validators import str_validator
+
+from log_processing_demo.log_item import LogItem
+from log_processing_demo.timestamps import from_epoch_us, to_epoch_us
+
+User = Tuple[str, str, str]
+
+
+class LogBatchError(ValueError):
+    """Exception for a record which doesn't pass 'LogItem' validation rules."""
+
+    pass
+
+
+class LogRow:
+    """Lightweight read-only view of one record of a 'LogBatch'.
+
+    Has the same attributes as 'LogItem'.
+    """
+
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "LogBatch", index: int) -> None:
+        self._batch = batch
+        self._index = index
+
+    @property
+    def created_at(self) -> datetime:
+        return from_epoch_us(self._batch.created_at[self._index])
+
+    @property
+    def user_id(self) -> str:
+        return self._batch.users[self._batch.user_codes[self._index]][0]
+
+    @property
+    def first_name(self) -> str:
+        return self._batch.users[self._batch.user_codes[self._index]][1]
+
+    @property
+    def second_name(self) -> str:
+        return self._batch.users[self._batch.user_codes[self._index]][2]
+
+    @property
+    def message(self) -> str:
+        return self._batch.message(self._index)
+
+    def dict(self) -> Dict[str, Any]:
+        """Field values, like 'LogItem.dict()' returns them.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Mapping of field names to values.
+
+        """
+        user_id, first_name, second_name = self._batch.users[
+            self._batch.user_codes[self._index]
+        ]
+        return {
+            "user_id": user_id,
+            "created_at": self.created_at,
+            "first_name": first_name,
+            "second_name": second_name,
+            "message": self.message,
+        }
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (LogRow, LogItem)):
+            return self.dict() == other.dict()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LogRow({self.dict()!r})"
+
+
+class LogBatch:
+    """Columnar container of LOG records. See module docstring.
+
+    Attributes
+    ----------
+    created_at : array
+        Creation times, int64 microseconds since the Unix epoch (UTC).
+    user_codes : array
+        Index into 'users' for every record.
+    users : List[Tuple[str, str, str]]
+        Distinct (user_id, first_name, second_name) triples in order of appearance.
+    """
+
+    __slots__ = (
+        "created_at",
+        "user_codes",
+        "users",
+        "_user_index",
+        "_messages",
+        "_message_starts",
+        "_message_ends",
+    )
+
+    def __init__(self) -> None:
+        self.created_at = array("q")
+        self.user_codes = array("I")
+        self.users: List[User] = []
+        self._user_index: Dict[User, int] = {}
+        self._messages = bytearray()
+        # Messages stay where they were appended, reordering only moves the offsets
+        self._message_starts = array("q")
+        self._message_ends = array("q")
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> "LogBatch":
+        """Validate raw API records and store them in a new batch.
+
+        Parameters
+        ----------
+        records : Iterable[Mapping[str, Any]]
+            Records as decoded from API JSON, e.g. a generator over a response.
+
+        Returns
+        -------
+        LogBatch
+            New batch.
+
+        Raises
+        ------
+        LogBatchError
+            Rised for a record with a missing or malformed field.
+
+        """
+        batch = cls()
+        batch.extend(records)
+        return batch
+
+    @classmethod
+    def from_log_items(cls, items: Iterable[LogItem]) -> "LogBatch":
+        """Store already validated 'LogItem' objects in a new batch.
+
+        Parameters
+        ----------
+        items : Iterable[LogItem]
+            LOG records.
+
+        Returns
+        -------
+        LogBatch
+            New batch.
+
+        """
+        batch = cls()
+        batch.extend(item.__dict__ for item in items)
+        return batch
+
+    def extend(self, records: Iterable[Mapping[str, Any]]) -> None:
+        """Validate records and append them to the batch.
+
+        Field rules are the ones of 'LogItem': strings are coerced the way pydantic
+        does it and 'created_at' is parsed as a datetime. Records appended before
+        a malformed one stay in the batch.
+
+        Parameters
+        ----------
+        records : Iterable[Mapping[str, Any]]
+            Records as decoded from API JSON or 'LogItem' field mappings.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        LogBatchError
+            Rised for a record with a missing or malformed field.
+
+        """
+        # Local names keep the per-record overhead down
+        created_at = self.created_at
+        user_codes = self.user_codes
+        users = self.users
+        user_index = self._user_index
+        messages = self._messages
+        starts = self._message_starts
+        ends = self._message_ends
+
+        for number, record in enumerate(records, start=len(created_at)):
+            try:
+                timestamp = _parse_timestamp(record["created_at"])
+                user = (
+                    _parse_str(record["user_id"]),
+                    _parse_str(record["first_name"]),
+                    _parse_str(record["second_name"]),
+                )
+                message = _parse_str(record["message"]).encode("utf-8")
+            except KeyError as error:
+                raise LogBatchError(
+                    f"Record {number}: field {error} is missing"
+                ) from error
+            except (
+                PydanticTypeError,
+                PydanticValueError,
+                TypeError,
+                ValueError,
+            ) as error:
+                raise LogBatchError(f"Record {number}: {error}") from error
+
+            code = user_index.get(user)
+            if code is None:
+                code = user_index[user] = len(users)
+                users.append(user)
+
+            created_at.append(timestamp)
+            user_codes.append(code)
+            starts.append(len(messages))
+            messages += message
+            ends.append(len(messages))
+
+    def __len__(self) -> int:
+        return len(self.created_at)
+
+    def __getitem__(self, index: int) -> LogRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("LogBatch index out of range")
+        return LogRow(self, index)
+
+    def __iter__(self) -> Iterator[LogRow]:
+        return map(LogRow, itertools.repeat(self), range(len(self)))
+
+    def message(self, index: int) -> str:
+        """Message of a record.
+
+        Parameters
+        ----------
+        index : int
+            Record index.
+
+        Returns
+        -------
+        str
+            Decoded message.
+
+        """
+        start = self._message_starts[index]
+        return self._messages[start : self._message_ends[index]].decode("utf-8")
+
+    def db_rows(self) -> Iterator[Tuple[int, str, str]]:
+        """Records in the form stored in the 'log_messages' table.
+
+        Returns
+        -------
+        Iterator[Tuple[int, str, str]]
+            (created_at in epoch microseconds, user_id, message) tuples.
+
+        """
+        users = self.users
+        messages = self._messages
+        for timestamp, code, start, end in zip(
+            self.created_at, self.user_codes, self._message_starts, self._message_ends
+        ):
+            yield timestamp, users[code][0], messages[start:end].decode("utf-8")
+
+    def to_log_items(self) -> List[LogItem]:
+        """Convert the batch to a list of 'LogItem' objects.
+
+        Returns
+        -------
+        List[LogItem]
+            LOG records in batch order.
+
+        """
+        return [LogItem.construct(**row.dict()) for row in self]
+
+    def reorder(self, order: Sequence[int]) -> None:
+        """Permute records in place.
+
+        Parameters
+        ----------
+        order : Sequence[int]
+            New order as a permutation of record indices, e.g. an argsort result.
+
+        Returns
+        -------
+        None
+
+        """
+        if len(order) != len(self):
+            raise ValueError(f"Order has {len(order)} indices, batch has {len(self)}")
+
+        self.created_at = array("q", map(self.created_at.__getitem__, order))
+        self.user_codes = array("I", map(self.user_codes.__getitem__, order))
+        self._message_starts = array("q", map(self._message_starts.__getitem__, order))
+        self._message_ends = array("q", map(self._message_ends.__getitem__, order))
+
+
+def _parse_str(value: Any) -> str:
+    """Validate a string field the way pydantic does for 'LogItem'."""
+    if type(value) is str:
+        return value
+    return str_validator(value)
+
+
+def _parse_timestamp(value: Any) -> int:
+    """Validate a datetime field the way pydantic does and convert it for storage."""
+    if type(value) is str:
+        try:
+            return to_epoch_us(datetime.fromisoformat(value))
+        except ValueError:
+            pass  # e.g. a 'Z' suffix before Python 3.11, left for pydantic
+    elif isinstance(value, datetime):
+        return to_epoch_us(value)
+    return to_epoch_us(parse_datetime(value))
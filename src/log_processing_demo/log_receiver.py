@@ -1,18 +1,48 @@
 """
 Module for receiving LOGs via API.
 """
-from datetime import datetime
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from http import HTTPStatus
 from os import path
-from typing import Dict, List, Optional, Union
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import requests
+from requests.adapters import HTTPAdapter
 
+from log_processing_demo import metrics, sort
+from log_processing_demo.json_stream import iter_members
+from log_processing_demo.log_batch import LogBatch
 from log_processing_demo.log_item import LogItem
-from log_processing_demo.sort import sort
+from log_processing_demo.response_cache import CacheWriter, ResponseCache
+from log_processing_demo.sort import DEFAULT_MAX_ITEMS_IN_MEMORY, external_sort
+from log_processing_demo.timestamps import to_epoch_us
 
 LOG_LIST_NAME = "logs"
 ERROR_NAME = "error"
 
+# Size of a network read in streaming mode
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Number of dates fetched concurrently by 'LogReceiver.fetch_many'
+DEFAULT_WORKERS = 4
+
+DATE_PATH_FORMAT = "%Y%m%d"
+
 
 class RequestError(Exception):
     """Exception for wrapping all possible exceptions of 'requests' module."""
@@ -20,20 +50,43 @@ class RequestError(Exception):
     pass
 
 
+class FetchResult(NamedTuple):
+    """Outcome of fetching a single date with 'LogReceiver.fetch_many'."""
+
+    date_string: str
+    logs: Optional[Union[List[LogItem], LogBatch]]
+    error: Optional[Exception]
+
+
 class LogReceiver:
     """Class for receiving LOGs via API.
     See methods docstrings.
     """
 
-    def __init__(self, base_url: str):
-        """Constructor remembers a base API URL.
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = DEFAULT_WORKERS,
+        cache: Optional[ResponseCache] = None,
+    ):
+        """Constructor remembers a base API URL and opens a keep-alive HTTP session.
 
         Parameters
         ----------
         base_url : str
             Base API URL.
+        pool_size : int
+            Maximum number of connections kept open to the API host.
+        cache : Optional[ResponseCache]
+            Cache of raw responses. Cached days are revalidated with conditional
+            requests, or not requested at all if the cache treats the past as immutable.
         """
         self.base_url: str = base_url
+        self.cache: Optional[ResponseCache] = cache
+        self.session: requests.Session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def __call__(
         self, date_string: str, sort_by_time: Optional[bool] = False
@@ -60,19 +113,469 @@ class LogReceiver:
             Rised when API returns an error message.
 
         """
-        try:
-            response = requests.get(path.join(self.base_url, date_string))
-            response.raise_for_status()
-        except Exception as error:
-            raise RequestError(str(error))
+        if self.cache is None:
+            start = time.perf_counter()
+            try:
+                response = self.session.get(path.join(self.base_url, date_string))
+                response.raise_for_status()
+            except Exception as error:
+                _record_request(start, 0, error=True)
+                raise RequestError(str(error))
+            _record_request(start, len(response.content))
+            data = response.json()
+        else:
+            chunks, writer = self.open_body(date_string, STREAM_CHUNK_SIZE)
+            try:
+                data = json.loads(b"".join(chunks))
+                if not data[ERROR_NAME] and writer:
+                    writer.commit()
+            finally:
+                chunks.close()
+                if writer:
+                    writer.discard()
 
-        data = response.json()
         if data[ERROR_NAME]:
             raise ValueError(data[ERROR_NAME])
 
         log_list = list(map(LogItem.parse_obj, data[LOG_LIST_NAME]))
 
         if sort_by_time:
-            sort(log_list, key=lambda x: x.created_at)
+            sort.sort_by_time(log_list)
 
         return log_list
+
+    def stream(
+        self,
+        date_string: str,
+        sort_by_time: Optional[bool] = False,
+        max_items_in_memory: int = DEFAULT_MAX_ITEMS_IN_MEMORY,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        since: Optional[datetime] = None,
+    ) -> Iterator[LogItem]:
+        """Retreive LOG messages for desired date one by one with bounded memory usage.
+
+        The response body is downloaded and parsed incrementally, so records are
+        yielded before the whole day is received. Suitable as 'Database.update' input.
+
+        Parameters
+        ----------
+        date_string : str
+            Date to get LOG messages for. Format: YYMMDD
+        sort_by_time : Optional[bool]
+            Whether or not the result should be sorted by record creation time.
+            Days larger than 'max_items_in_memory' are sorted externally through
+            temporary files, and nothing is yielded until the whole day is received.
+        max_items_in_memory : int
+            Memory budget of the sort, in records.
+        chunk_size : int
+            Size of a network read in bytes.
+        since : Optional[datetime]
+            Skip records created before this time, naive UTC or aware, without
+            validating them. Records with an unusual time format are kept.
+
+        Returns
+        -------
+        Iterator[LogItem]
+            LOG records, in the order they are sent by API unless sorted.
+
+        Raises
+        ------
+        RequestError
+            Re-rised for any 'requests' module exception.
+        ValueError
+            Rised when API returns an error message, even if it follows the records.
+
+        """
+        raw_records = self._iter_records(date_string, chunk_size)
+        if since is not None:
+            raw_records = _created_since(raw_records, to_epoch_us(since))
+        records = map(LogItem.parse_obj, raw_records)
+        if sort_by_time:
+            yield from external_sort(
+                records,
+                key=lambda x: x.created_at,
+                max_items_in_memory=max_items_in_memory,
+            )
+        else:
+            yield from records
+
+    def batch(
+        self,
+        date_string: str,
+        sort_by_time: Optional[bool] = False,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+    ) -> LogBatch:
+        """Retreive LOG messages for desired date into a compact columnar batch.
+
+        The response is parsed incrementally and records are validated straight into
+        the batch, without 'LogItem' objects. Suitable as 'Database.update' input.
+
+        Parameters
+        ----------
+        date_string : str
+            Date to get LOG messages for. Format: YYMMDD
+        sort_by_time : Optional[bool]
+            Whether or not the result should be sorted by record creation time.
+        chunk_size : int
+            Size of a network read in bytes.
+
+        Returns
+        -------
+        LogBatch
+            LOG records, in the order they are sent by API unless sorted.
+
+        Raises
+        ------
+        RequestError
+            Re-rised for any 'requests' module exception.
+        ValueError
+            Rised when API returns an error message or a malformed record.
+
+        """
+        log_batch = LogBatch.from_records(self._iter_records(date_string, chunk_size))
+        if sort_by_time:
+            sort.sort_by_time(log_batch)
+        return log_batch
+
+    def _iter_records(
+        self, date_string: str, chunk_size: int
+    ) -> Iterator[Dict[str, Any]]:
+        """Download and parse API response incrementally. See 'stream'.
+
+        Parameters
+        ----------
+        date_string : str
+            Date to get LOG messages for. Format: YYMMDD
+        chunk_size : int
+            Size of a network read in bytes.
+
+        Returns
+        -------
+        Iterator[Dict[str, Any]]
+            Raw LOG records in the order they are sent by API.
+
+        """
+        chunks, writer = self.open_body(date_string, chunk_size)
+        try:
+            yield from parse_body(chunks)
+            if writer:
+                for _ in chunks:
+                    pass  # trailing whitespace, the cached payload must be complete
+                writer.commit()
+        finally:
+            chunks.close()
+            if writer:
+                writer.discard()
+
+    def open_body(
+        self, date_string: str, chunk_size: int
+    ) -> Tuple[Generator[bytes, None, None], Optional[CacheWriter]]:
+        """Start reading a response body from the cache or from the API.
+
+        A downloaded body is copied to the cache, where it appears only after the
+        caller commits the returned writer.
+
+        Parameters
+        ----------
+        date_string : str
+            Date to get LOG messages for. Format: YYMMDD
+        chunk_size : int
+            Size of a read in bytes.
+
+        Returns
+        -------
+        Tuple[Generator[bytes, None, None], Optional[CacheWriter]]
+            Body chunks, to be closed by the caller, and the cache writer or None
+            if the body isn't downloaded or isn't cached.
+
+        Raises
+        ------
+        RequestError
+            Re-rised for any 'requests' module exception.
+
+        """
+        url = path.join(self.base_url, date_string)
+        entry = self.cache.get(url) if self.cache else None
+        if entry and self.cache.immutable_past and _is_past_date(date_string):
+            return entry.iter_content(chunk_size), None
+
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, stream=True, headers=headers)
+            response.raise_for_status()
+        except Exception as error:
+            _record_request(start, 0, error=True)
+            raise RequestError(str(error))
+
+        if entry and response.status_code == HTTPStatus.NOT_MODIFIED:
+            response.close()
+            _record_request(start, 0)
+            return entry.iter_content(chunk_size), None
+
+        writer = None
+        if self.cache:
+            writer = self.cache.writer(
+                url, response.headers.get("ETag"), response.headers.get("Last-Modified")
+            )
+        return _read_response(response, chunk_size, writer, start), writer
+
+    def fetch_many(
+        self,
+        date_strings: Iterable[str],
+        workers: int = DEFAULT_WORKERS,
+        sort_by_time: Optional[bool] = False,
+        columnar: bool = False,
+    ) -> Iterator[FetchResult]:
+        """Retreive LOG messages for several dates concurrently over the shared session.
+
+        At most 'workers' dates are in flight, including fetched days not yet consumed
+        by the caller, so memory usage is bounded. A failure of one date is reported
+        in its result and does not affect the others.
+
+        Parameters
+        ----------
+        date_strings : Iterable[str]
+            Dates to get LOG messages for. Format: YYYYMMDD
+        workers : int
+            Number of concurrent requests.
+        sort_by_time : Optional[bool]
+            Whether or not every day should be sorted by record creation time.
+        columnar : bool
+            Return every day as a 'LogBatch' (see 'batch') instead of a list.
+
+        Returns
+        -------
+        Iterator[FetchResult]
+            Results in order of completion.
+
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+
+        fetch = self.batch if columnar else self
+        pending_dates = iter(date_strings)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight: Dict[Future, str] = {}
+
+            def submit_next() -> None:
+                for date_string in pending_dates:
+                    future = executor.submit(fetch, date_string, sort_by_time)
+                    in_flight[future] = date_string
+                    return
+
+            for _ in range(workers):
+                submit_next()
+
+            while in_flight:
+                done: Set[Future]
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    date_string = in_flight.pop(future)
+                    try:
+                        result = FetchResult(date_string, future.result(), None)
+                    except Exception as error:
+                        result = FetchResult(date_string, None, error)
+                    yield result
+                    submit_next()
+
+
+def expand_dates(date_spec: str) -> List[str]:
+    """Expand a date specification into a list of dates.
+
+    Parameters
+    ----------
+    date_spec : str
+        Comma-separated list of dates (YYYYMMDD) and inclusive date ranges
+        (YYYYMMDD-YYYYMMDD), e.g. '20210101-20210131,20210205'.
+
+    Returns
+    -------
+    List[str]
+        Dates in format YYYYMMDD without duplicates, in order of appearance.
+
+    Raises
+    ------
+    ValueError
+        Rised for a malformed date or a range whose end precedes its start.
+
+    """
+    dates: Dict[str, None] = {}
+    for part in filter(None, (part.strip() for part in date_spec.split(","))):
+        first, _, last = part.partition("-")
+        start = datetime.strptime(first, DATE_PATH_FORMAT)
+        end = datetime.strptime(last, DATE_PATH_FORMAT) if last else start
+        if end < start:
+            raise ValueError(f"Date range end precedes its start: {part}")
+        while start <= end:
+            dates[start.strftime(DATE_PATH_FORMAT)] = None
+            start += timedelta(days=1)
+    if not dates:
+        raise ValueError(f"No dates in specification: {date_spec!r}")
+    return list(dates)
+
+
+def _is_past_date(date_string: str) -> bool:
+    """Whether a date is before the current UTC date, i.e. its LOG is complete.
+
+    Parameters
+    ----------
+    date_string : str
+        Date. Format: YYYYMMDD
+
+    Returns
+    -------
+    bool
+        False for today, future dates and malformed dates.
+
+    """
+    try:
+        date = datetime.strptime(date_string, DATE_PATH_FORMAT).date()
+    except ValueError:
+        return False
+    return date < datetime.utcnow().date()
+
+
+def parse_body(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Parse an API response body incrementally.
+
+    Parameters
+    ----------
+    chunks : Iterable[bytes]
+        Body chunks, e.g. returned by 'LogReceiver.open_body'. The ones after the
+        end of the JSON object are left unread.
+
+    Returns
+    -------
+    Iterator[Dict[str, Any]]
+        Raw LOG records in the order they are sent by API.
+
+    Raises
+    ------
+    ValueError
+        Rised when API returns an error message or a malformed body.
+
+    """
+    for key, value in iter_members(chunks, LOG_LIST_NAME):
+        if key == LOG_LIST_NAME:
+            yield value
+        elif key == ERROR_NAME and value:
+            raise ValueError(value)
+
+
+def _created_since(
+    records: Iterable[Dict[str, Any]], since: int
+) -> Iterator[Dict[str, Any]]:
+    """Drop raw records created before a time, leaving the rest to validation.
+
+    Parameters
+    ----------
+    records : Iterable[Dict[str, Any]]
+        Raw LOG records.
+    since : int
+        Time in epoch microseconds.
+
+    Returns
+    -------
+    Iterator[Dict[str, Any]]
+        Records created at or after 'since', and the ones without an ISO 8601
+        creation time.
+
+    """
+    for record in records:
+        try:
+            if to_epoch_us(datetime.fromisoformat(record["created_at"])) < since:
+                continue
+        except (KeyError, TypeError, ValueError):
+            pass
+        yield record
+
+
+def _read_response(
+    response: requests.Response,
+    chunk_size: int,
+    writer: Optional[CacheWriter],
+    start: float,
+) -> Generator[bytes, None, None]:
+    """Read a response body, copying it to the cache writer if any.
+
+    Parameters
+    ----------
+    response : requests.Response
+        Streamed response. It is closed when the generator is closed or exhausted.
+    chunk_size : int
+        Size of a network read in bytes.
+    writer : Optional[CacheWriter]
+        Cache writer.
+    start : float
+        'time.perf_counter' value when the request was sent.
+
+    Returns
+    -------
+    Generator[bytes, None, None]
+        Body chunks.
+
+    """
+    size = 0
+    error = False
+    try:
+        for chunk in _wrap_request_errors(response.iter_content(chunk_size)):
+            size += len(chunk)
+            if writer:
+                writer.write(chunk)
+            yield chunk
+    except Exception:
+        error = True
+        raise
+    finally:
+        response.close()
+        # The request lasts until its body is read, which depends on the consumer
+        _record_request(start, size, error)
+
+
+def _record_request(start: float, nbytes: int, error: bool = False) -> None:
+    """Account an API request as 'http.get' if metrics are enabled.
+
+    Parameters
+    ----------
+    start : float
+        'time.perf_counter' value when the request was sent.
+    nbytes : int
+        Size of the received body.
+    error : bool
+        The request has failed.
+
+    Returns
+    -------
+    None
+
+    """
+    if metrics.registry.enabled:
+        metrics.registry.record(
+            "http.get", time.perf_counter() - start, nbytes=nbytes, error=error
+        )
+
+
+def _wrap_request_errors(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Re-rise 'requests' exceptions that happen while reading a response body.
+
+    Parameters
+    ----------
+    chunks : Iterator[bytes]
+        Body chunks.
+
+    Returns
+    -------
+    Iterator[bytes]
+        The same chunks.
+
+    """
+    try:
+        yield from chunks
+    except requests.RequestException as error:
+        raise RequestError(str(error))
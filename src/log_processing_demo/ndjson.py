@@ -0,0 +1,93 @@
+"""
+Batched NDJSON serialization for the 'show' command.
+"""
+import json
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List
+
+try:
+    import orjson
+except ImportError:  # optional dependency, see 'fast' extra
+    orjson = None
+
+# Same output as 'json.dumps(element, ensure_ascii=False)'
+_default_encoder = json.JSONEncoder(ensure_ascii=False)
+# Compact separators, used for the fast path when orjson is not installed
+_compact_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def batch_encoder(fast: bool) -> Callable[[List[Dict[str, Any]]], bytes]:
+    """Choose a function which serializes a batch of rows into NDJSON lines.
+
+    Parameters
+    ----------
+    fast : bool
+        Use the fastest available encoder. Its output is compact JSON.
+
+    Returns
+    -------
+    Callable[[List[Dict[str, Any]]], bytes]
+        Batch encoder. Every line, including the last one, ends with a newline.
+
+    """
+    if fast and orjson is not None:
+
+        def encode_orjson(batch: List[Dict[str, Any]]) -> bytes:
+            option = orjson.OPT_APPEND_NEWLINE
+            return b"".join([orjson.dumps(item, option=option) for item in batch])
+
+        return encode_orjson
+
+    encode = (_compact_encoder if fast else _default_encoder).encode
+
+    def encode_json(batch: List[Dict[str, Any]]) -> bytes:
+        return "".join([f"{encode(item)}\n" for item in batch]).encode("utf-8")
+
+    return encode_json
+
+
+def encoder_variant(fast: bool) -> str:
+    """Name of the output produced by 'batch_encoder(fast)', e.g. for cache keys.
+
+    Parameters
+    ----------
+    fast : bool
+        See 'batch_encoder'.
+
+    Returns
+    -------
+    str
+        Encoder name.
+
+    """
+    if fast and orjson is not None:
+        return "ndjson-orjson"
+    return "ndjson-compact" if fast else "ndjson"
+
+
+def write_ndjson(
+    batches: Iterable[List[Dict[str, Any]]], stream: BinaryIO, fast: bool = False
+) -> int:
+    """Write batches of rows to a binary stream as NDJSON, one write call per batch.
+
+    Parameters
+    ----------
+    batches : Iterable[List[Dict[str, Any]]]
+        Batches of JSON-serializable rows, e.g. output of 'Database.iter_read'.
+    stream : BinaryIO
+        Destination, e.g. 'sys.stdout.buffer'.
+    fast : bool
+        Use orjson if it is installed. Output is compact JSON in that case.
+
+    Returns
+    -------
+    int
+        Number of lines written.
+
+    """
+    encode = batch_encoder(fast)
+    lines = 0
+    for batch in batches:
+        stream.write(encode(batch))
+        lines += len(batch)
+    stream.flush()
+    return lines
@@ -0,0 +1,564 @@
+"""
+Pipelined ingestion of LOG records: network reads, parsing and DB writes overlap.
+
+Every date in flight has a reader thread, which downloads the response body, and a
+parser thread, which validates records into compact 'LogBatch' chunks. Batches of all
+dates are written by the thread running the pipeline, the only one touching the DB.
+
+Stages are connected by bounded queues. A stage slower than its producer makes the
+producer wait, down to the network reads, so memory usage is bounded by the queue
+sizes whatever the speed of the API and of the disk.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from log_processing_demo import database, log_receiver, metrics, sort
+from log_processing_demo.log_batch import LogBatch
+from log_processing_demo.response_cache import CacheWriter
+
+# Number of items a queue between two stages holds: body chunks or batches
+DEFAULT_QUEUE_SIZE = 8
+
+# Seconds a blocked queue operation waits before checking for cancellation
+POLL_INTERVAL = 0.1
+
+# Stages and queues in order of the data flow
+STAGES = ("read", "parse", "write")
+QUEUES = ("bodies", "batches")
+
+# Marks the end of the items of a date in a queue
+_END = object()
+
+
+class _Cancelled(Exception):
+    """Raised in a stage thread when its date is abandoned."""
+
+    pass
+
+
+class IngestResult(NamedTuple):
+    """Outcome of ingesting a single date with 'Pipeline.run'."""
+
+    date_string: str
+    records: int
+    stored: int
+    error: Optional[Exception]
+
+
+class StageStats:
+    """Work done by a stage over all dates.
+
+    Attributes
+    ----------
+    items : int
+        Number of processed items: bytes for the reader, records for other stages.
+    busy : float
+        Seconds spent working, summed over the threads of the stage. Includes
+        waiting for the CPU and the GIL held by other stages.
+    waiting : float
+        Seconds spent waiting for the neighbouring stages.
+    """
+
+    __slots__ = ("items", "busy", "waiting")
+
+    def __init__(self) -> None:
+        self.items = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items per second of work, the rate the stage could sustain alone."""
+        return self.items / self.busy if self.busy else 0.0
+
+
+class QueueStats:
+    """Occupancy of the queues of a kind, sampled at every put.
+
+    Attributes
+    ----------
+    capacity : int
+        Maximum number of items in a queue.
+    puts : int
+        Number of items put.
+    full : int
+        Number of puts which found the queue full and had to wait.
+    depth_total : int
+        Sum of queue depths after every put.
+    max_depth : int
+        Largest depth seen.
+    """
+
+    __slots__ = ("capacity", "puts", "full", "depth_total", "max_depth")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.puts = 0
+        self.full = 0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    @property
+    def mean_depth(self) -> float:
+        """Average number of items in a queue after a put."""
+        return self.depth_total / self.puts if self.puts else 0.0
+
+
+class PipelineStats:
+    """Per-stage throughput and queue depths of a pipeline, see module docstring.
+
+    Attributes
+    ----------
+    stages : Dict[str, StageStats]
+        Stage name -> its work, see 'STAGES'.
+    queues : Dict[str, QueueStats]
+        Queue kind -> its occupancy, see 'QUEUES'.
+    seconds : float
+        Wall time of the pipeline runs.
+    """
+
+    def __init__(self, queue_size: int) -> None:
+        """Constructor creates empty counters.
+
+        Parameters
+        ----------
+        queue_size : int
+            Capacity of every queue.
+
+        Returns
+        -------
+        None
+
+        """
+        self.stages: Dict[str, StageStats] = {name: StageStats() for name in STAGES}
+        self.queues: Dict[str, QueueStats] = {
+            name: QueueStats(queue_size) for name in QUEUES
+        }
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_stage(
+        self, name: str, items: int, seconds: float, waiting: float, error: bool
+    ) -> None:
+        """Account the work of a stage on a single date.
+
+        The work is also recorded into 'metrics.registry' as 'pipeline.<name>'.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+        items : int
+            Number of processed items.
+        seconds : float
+            Wall time of the stage on the date.
+        waiting : float
+            Part of 'seconds' spent waiting for the neighbouring stages.
+        error : bool
+            The stage has failed on the date.
+
+        Returns
+        -------
+        None
+
+        """
+        with self._lock:
+            stats = self.stages[name]
+            stats.items += items
+            stats.busy += seconds - waiting
+            stats.waiting += waiting
+        if metrics.registry.enabled:
+            if name == "read":
+                metrics.registry.record(
+                    "pipeline.read", seconds - waiting, 0, items, error
+                )
+            else:
+                metrics.registry.record(
+                    f"pipeline.{name}", seconds - waiting, items, 0, error
+                )
+
+    def add_put(self, name: str, depth: int, full: bool) -> None:
+        """Account an item put into a queue.
+
+        Parameters
+        ----------
+        name : str
+            Queue kind.
+        depth : int
+            Number of items in the queue after the put.
+        full : bool
+            The queue was full when the put started.
+
+        Returns
+        -------
+        None
+
+        """
+        with self._lock:
+            stats = self.queues[name]
+            stats.puts += 1
+            stats.full += full
+            stats.depth_total += depth
+            stats.max_depth = max(stats.max_depth, depth)
+
+    def format_report(self) -> str:
+        """Stages and queues as a text table.
+
+        Returns
+        -------
+        str
+            Stage lines with items, busy and waiting seconds and throughput, then
+            queue lines with capacity, puts, mean and max depth and full puts.
+
+        """
+        lines = [
+            f"{'stage':<8} {'items':>12} {'busy s':>9} {'waiting s':>9} "
+            f"{'items/s busy':>14} {'items/s wall':>14}"
+        ]
+        for name, stage in self.stages.items():
+            unit = "bytes" if name == "read" else "records"
+            wall = stage.items / self.seconds if self.seconds else 0.0
+            lines.append(
+                f"{name:<8} {stage.items:>12} {stage.busy:>9.3f} {stage.waiting:>9.3f} "
+                f"{stage.throughput:>14.0f} {wall:>14.0f} ({unit})"
+            )
+        lines.append(
+            f"{'queue':<8} {'capacity':>12} {'puts':>9} {'mean depth':>10} "
+            f"{'max depth':>9} {'full':>9}"
+        )
+        for name, stats in self.queues.items():
+            lines.append(
+                f"{name:<8} {stats.capacity:>12} {stats.puts:>9} "
+                f"{stats.mean_depth:>10.2f} {stats.max_depth:>9} {stats.full:>9}"
+            )
+        lines.append(f"wall time {self.seconds:.3f} s")
+        return "\n".join(lines)
+
+
+class _StageQueue:
+    """Bounded queue between two stages of a date, with cancellable operations."""
+
+    def __init__(
+        self, name: str, stats: PipelineStats, size: int, stop: threading.Event
+    ) -> None:
+        self.name = name
+        self.stats = stats
+        self.stop = stop
+        self.queue: queue.Queue = queue.Queue(maxsize=size)
+
+    def put(self, item: Any) -> float:
+        """Put an item, waiting while the queue is full.
+
+        Returns
+        -------
+        float
+            Seconds spent waiting.
+
+        Raises
+        ------
+        _Cancelled
+            Rised if the date is abandoned while waiting.
+
+        """
+        try:
+            self.queue.put_nowait(item)
+            self.stats.add_put(self.name, self.queue.qsize(), False)
+            return 0.0
+        except queue.Full:
+            pass
+        start = time.perf_counter()
+        while True:
+            if self.stop.is_set():
+                raise _Cancelled()
+            try:
+                self.queue.put(item, timeout=POLL_INTERVAL)
+                break
+            except queue.Full:
+                pass
+        self.stats.add_put(self.name, self.queue.qsize(), True)
+        return time.perf_counter() - start
+
+    def get(self) -> Any:
+        """Get an item, waiting while the queue is empty.
+
+        Items put before the date is abandoned are still delivered.
+
+        Raises
+        ------
+        _Cancelled
+            Rised if the date is abandoned while waiting.
+
+        """
+        while True:
+            try:
+                return self.queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self.stop.is_set():
+                    raise _Cancelled()
+
+
+class _Day:
+    """State of a date in flight, shared by its stage threads."""
+
+    def __init__(self, date_string: str, stats: PipelineStats, queue_size: int) -> None:
+        self.date_string = date_string
+        # Set when the date is written or abandoned, releases blocked stage threads
+        self.stop = threading.Event()
+        self.bodies = _StageQueue("bodies", stats, queue_size, self.stop)
+        self.batches = _StageQueue("batches", stats, queue_size, self.stop)
+        self.threads: List[threading.Thread] = []
+
+
+class Pipeline:
+    """Fetch, parse and store LOG records of several dates, see module docstring.
+
+    Attributes
+    ----------
+    stats : PipelineStats
+        Counters accumulated over all runs.
+    """
+
+    def __init__(
+        self,
+        receiver: log_receiver.LogReceiver,
+        db: database.Database,
+        workers: int = log_receiver.DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        chunk_size: int = database.DEFAULT_CHUNK_SIZE,
+        read_size: int = log_receiver.STREAM_CHUNK_SIZE,
+        sort_by_time: bool = False,
+        incremental: bool = False,
+    ) -> None:
+        """Constructor remembers the source, the destination and the settings.
+
+        Parameters
+        ----------
+        receiver : log_receiver.LogReceiver
+            Source of API responses, its cache is used and updated.
+        db : database.Database
+            Destination DB, written only from the thread calling 'run'.
+        workers : int
+            Number of dates in flight, each with a reader and a parser thread.
+        queue_size : int
+            Capacity of every queue between stages.
+        chunk_size : int
+            Number of records validated and written at once.
+        read_size : int
+            Size of a network read in bytes.
+        sort_by_time : bool
+            Store every day sorted by record creation time. The parser then holds
+            the whole day as a 'LogBatch' before handing it over.
+        incremental : bool
+            See 'Database.update'.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            Rised for a non-positive number of workers, queue size or chunk size.
+
+        """
+        for name, value in (
+            ("workers", workers),
+            ("queue_size", queue_size),
+            ("chunk_size", chunk_size),
+        ):
+            if value < 1:
+                raise ValueError(f"{name} must be positive, got {value}")
+        self.receiver = receiver
+        self.db = db
+        self.workers = workers
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+        self.read_size = read_size
+        self.sort_by_time = sort_by_time
+        self.incremental = incremental
+        self.stats = PipelineStats(queue_size)
+
+    def run(self, date_strings: Iterable[str]) -> Iterator[IngestResult]:
+        """Ingest dates, each in a transaction of its own.
+
+        A failure to fetch or parse a date is reported in its result and leaves
+        nothing of it in the DB. DB errors are re-rised. Dates still in flight
+        when the iteration stops are abandoned.
+
+        Parameters
+        ----------
+        date_strings : Iterable[str]
+            Dates to ingest. Format: YYYYMMDD
+
+        Returns
+        -------
+        Iterator[IngestResult]
+            Results in order of the dates.
+
+        """
+        pending_dates = iter(date_strings)
+        in_flight: Deque[_Day] = deque()
+
+        def start_next() -> None:
+            for date_string in pending_dates:
+                in_flight.append(self._start(date_string))
+                return
+
+        start = time.perf_counter()
+        try:
+            for _ in range(self.workers):
+                start_next()
+            while in_flight:
+                result = self._write(in_flight.popleft())
+                start_next()
+                yield result
+        finally:
+            for day in in_flight:
+                day.stop.set()
+            self.stats.seconds += time.perf_counter() - start
+
+    def _start(self, date_string: str) -> _Day:
+        """Start the reader and the parser threads of a date."""
+        day = _Day(date_string, self.stats, self.queue_size)
+        for stage, target in (("read", self._read), ("parse", self._parse)):
+            thread = threading.Thread(
+                target=target,
+                args=(day,),
+                name=f"pipeline-{stage}-{date_string}",
+                daemon=True,
+            )
+            thread.start()
+            day.threads.append(thread)
+        return day
+
+    def _read(self, day: _Day) -> None:
+        """Reader stage: put the cache writer, then body chunks into 'day.bodies'."""
+        start = time.perf_counter()
+        waiting = 0.0
+        nbytes = 0
+        error = False
+        try:
+            chunks, writer = self.receiver.open_body(day.date_string, self.read_size)
+            try:
+                waiting += day.bodies.put(writer)
+                for chunk in chunks:
+                    nbytes += len(chunk)
+                    waiting += day.bodies.put(chunk)
+            finally:
+                chunks.close()
+            waiting += day.bodies.put(_END)
+        except _Cancelled:
+            pass
+        except Exception as exception:
+            error = True
+            try:
+                day.bodies.put(exception)
+            except _Cancelled:
+                pass
+        finally:
+            seconds = time.perf_counter() - start
+            self.stats.add_stage("read", nbytes, seconds, waiting, error)
+
+    def _parse(self, day: _Day) -> None:
+        """Parser stage: validate records into batches and put them into 'day.batches'.
+
+        The cache writer is committed here once the body is parsed, and discarded
+        only after the reader has stopped writing to it.
+        """
+        start = time.perf_counter()
+        waiting = 0.0
+        records = 0
+        error = False
+        writer: Optional[CacheWriter] = None
+
+        def get() -> Any:
+            nonlocal waiting
+            wait_start = time.perf_counter()
+            item = day.bodies.get()
+            waiting += time.perf_counter() - wait_start
+            if isinstance(item, Exception):
+                raise item
+            return item
+
+        try:
+            writer = get()
+            chunks = iter(get, _END)
+            for batch in self._batches(log_receiver.parse_body(chunks)):
+                records += len(batch)
+                waiting += day.batches.put(batch)
+            if writer:
+                for _ in chunks:
+                    pass  # trailing whitespace, the cached payload must be complete
+                writer.commit()
+            waiting += day.batches.put(_END)
+        except _Cancelled:
+            pass
+        except Exception as exception:
+            error = True
+            try:
+                day.batches.put(exception)
+            except _Cancelled:
+                pass
+        finally:
+            if error:
+                day.stop.set()  # the reader may be blocked on a queue nobody reads
+            if writer:
+                day.threads[0].join()
+                writer.discard()
+            seconds = time.perf_counter() - start
+            self.stats.add_stage("parse", records, seconds, waiting, error)
+
+    def _batches(self, records: Iterator[Dict[str, Any]]) -> Iterator[LogBatch]:
+        """Validate raw records into batches of at most 'chunk_size' records.
+
+        Sorted days come as a single batch.
+        """
+        if self.sort_by_time:
+            batch = LogBatch.from_records(records)
+            sort.sort_by_time(batch)
+            yield batch
+            return
+        while True:
+            batch = LogBatch.from_records(islice(records, self.chunk_size))
+            if not batch:
+                return
+            yield batch
+
+    def _write(self, day: _Day) -> IngestResult:
+        """Writer stage: store the batches of a date in a single transaction."""
+        start = time.perf_counter()
+        waiting = 0.0
+        records = 0
+        failure: Optional[Exception] = None
+
+        def chunks() -> Iterator[database.RowChunk]:
+            nonlocal waiting, records, failure
+            while True:
+                wait_start = time.perf_counter()
+                item = day.batches.get()
+                waiting += time.perf_counter() - wait_start
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    failure = item
+                    raise item
+                records += len(item)
+                yield from database.row_chunks(item, self.chunk_size)
+
+        try:
+            stored = self.db.update_chunks(chunks(), incremental=self.incremental)
+        except Exception as error:
+            if error is not failure:
+                raise
+            return IngestResult(day.date_string, records, 0, error)
+        finally:
+            day.stop.set()
+            seconds = time.perf_counter() - start
+            self.stats.add_stage(
+                "write", records, seconds, waiting, failure is not None
+            )
+        return IngestResult(day.date_string, records, stored, None)
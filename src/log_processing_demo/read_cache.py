@@ -0,0 +1,162 @@
+"""
+In-process LRU cache of 'Database.read' results.
+
+Entries are keyed by the time range of a query, in epoch microseconds, so that
+writes can invalidate exactly the entries whose range they touch.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# Default limits of 'ReadCache'
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_ROWS = 1000000
+
+CacheKey = Tuple[int, int, Hashable]
+
+
+class ReadCache:
+    """LRU cache of query results. See module docstring.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups answered from the cache.
+    misses : int
+        Number of lookups not answered from the cache.
+    invalidations : int
+        Number of entries dropped because of writes.
+    """
+
+    def __init__(
+        self, max_entries: int = DEFAULT_MAX_ENTRIES, max_rows: int = DEFAULT_MAX_ROWS
+    ) -> None:
+        """Constructor sets the cache limits.
+
+        Parameters
+        ----------
+        max_entries : int
+            Maximum number of cached results.
+        max_rows : int
+            Maximum number of rows in all cached results together. Larger results
+            are not cached.
+        """
+        if max_entries < 1 or max_rows < 1:
+            raise ValueError("Cache limits must be positive")
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[CacheKey, List[Any]]" = OrderedDict()
+        self._rows = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> Optional[List[Any]]:
+        """Look a result up and mark it as recently used.
+
+        Parameters
+        ----------
+        key : CacheKey
+            (start, end, variant): exclusive time range boundaries in epoch
+            microseconds and anything else that affects the result.
+
+        Returns
+        -------
+        Optional[List[Any]]
+            Cached rows or None.
+
+        """
+        rows = self._entries.get(key)
+        if rows is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return rows
+
+    def put(self, key: CacheKey, rows: List[Any]) -> None:
+        """Store a result, evicting least recently used ones to fit the limits.
+
+        Parameters
+        ----------
+        key : CacheKey
+            See 'get'.
+        rows : List[Any]
+            Result rows. They must not be modified afterwards.
+
+        Returns
+        -------
+        None
+
+        """
+        if len(rows) > self.max_rows:
+            return
+        self._drop(key)
+        self._entries[key] = rows
+        self._rows += len(rows)
+        while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+            _, evicted = self._entries.popitem(last=False)
+            self._rows -= len(evicted)
+
+    def invalidate(self, start: int, end: int) -> int:
+        """Drop results which may contain rows created within [start, end].
+
+        Parameters
+        ----------
+        start : int
+            Earliest creation time of changed rows, epoch microseconds.
+        end : int
+            Latest creation time of changed rows, epoch microseconds.
+
+        Returns
+        -------
+        int
+            Number of dropped entries.
+
+        """
+        stale = [
+            key
+            for key in self._entries
+            # Query ranges are exclusive: rows with start_key < created_at < end_key
+            if key[0] < end and key[1] > start
+        ]
+        for key in stale:
+            self._drop(key)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop all results. Counters are kept.
+
+        Returns
+        -------
+        None
+
+        """
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._rows = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Cache counters.
+
+        Returns
+        -------
+        Dict[str, int]
+            Hits, misses, invalidations and current size.
+
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "rows": self._rows,
+        }
+
+    def _drop(self, key: CacheKey) -> None:
+        rows = self._entries.pop(key, None)
+        if rows is not None:
+            self._rows -= len(rows)
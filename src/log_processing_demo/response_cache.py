@@ -0,0 +1,273 @@
+"""
+On-disk cache of raw API responses for 'LogReceiver'.
+
+Every cached URL has a gzip-compressed payload file and a small JSON metadata file
+with the validators (ETag, Last-Modified) used for conditional requests. The cache
+is bounded in size: least recently used entries are evicted first, the use time
+being the modification time of the metadata file.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, Union
+
+# Default size limit of the cache directory
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# LOG JSON is very repetitive, the fastest level already compresses it several times
+COMPRESS_LEVEL = 1
+
+PAYLOAD_SUFFIX = ".json.gz"
+META_SUFFIX = ".meta"
+
+
+class CacheEntry(NamedTuple):
+    """Cached response of a URL."""
+
+    url: str
+    payload_path: Path
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        """Read the decompressed payload in chunks, like 'Response.iter_content()'.
+
+        Parameters
+        ----------
+        chunk_size : int
+            Size of a chunk in bytes.
+
+        Returns
+        -------
+        Iterator[bytes]
+            Payload chunks.
+
+        """
+        with gzip.open(self.payload_path, "rb") as payload:
+            while True:
+                chunk = payload.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+class CacheWriter:
+    """Payload being downloaded into the cache. Nothing is visible until 'commit'."""
+
+    def __init__(
+        self,
+        cache: "ResponseCache",
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+    ) -> None:
+        self._cache = cache
+        self._url = url
+        self._meta = {"url": url, "etag": etag, "last_modified": last_modified}
+        handle, self._tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        self._raw_file = os.fdopen(handle, "wb")
+        self._file = gzip.GzipFile(
+            fileobj=self._raw_file, mode="wb", compresslevel=COMPRESS_LEVEL
+        )
+        self._done = False
+
+    def write(self, chunk: bytes) -> None:
+        """Append a chunk of the payload.
+
+        Parameters
+        ----------
+        chunk : bytes
+            Payload chunk.
+
+        Returns
+        -------
+        None
+
+        """
+        self._file.write(chunk)
+
+    def commit(self) -> None:
+        """Make the complete payload available in the cache, replacing an older one.
+
+        Returns
+        -------
+        None
+
+        """
+        if self._done:
+            return
+        self._close()
+        key_path = self._cache.key_path(self._url)
+        os.replace(self._tmp_path, f"{key_path}{PAYLOAD_SUFFIX}")
+        handle, meta_tmp_path = tempfile.mkstemp(
+            dir=self._cache.directory, suffix=".tmp"
+        )
+        with os.fdopen(handle, "w", encoding="utf-8") as meta_file:
+            json.dump(self._meta, meta_file)
+        os.replace(meta_tmp_path, f"{key_path}{META_SUFFIX}")
+        self._done = True
+        self._cache.prune()
+
+    def discard(self) -> None:
+        """Drop the payload, e.g. after a failed download. No-op after 'commit'.
+
+        Returns
+        -------
+        None
+
+        """
+        if self._done:
+            return
+        self._close()
+        os.remove(self._tmp_path)
+        self._done = True
+
+    def _close(self) -> None:
+        self._file.close()  # doesn't close a file object passed to it
+        self._raw_file.close()
+
+
+class ResponseCache:
+    """Size-bounded on-disk cache of API responses keyed by URL. See module docstring."""
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        immutable_past: bool = False,
+    ) -> None:
+        """Constructor creates the cache directory if needed.
+
+        Parameters
+        ----------
+        directory : Union[str, Path]
+            Cache directory.
+        max_bytes : int
+            Size limit of cached payloads and metadata together.
+        immutable_past : bool
+            Treat responses for past dates as final: 'LogReceiver' serves them from
+            the cache without contacting the API at all.
+        """
+        if max_bytes < 0:
+            raise ValueError(f"max_bytes must not be negative, got {max_bytes}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.immutable_past = immutable_past
+
+    def key_path(self, url: str) -> Path:
+        """Path of cache files of a URL, without suffix.
+
+        Parameters
+        ----------
+        url : str
+            Response URL.
+
+        Returns
+        -------
+        Path
+            Common path of the payload and metadata files.
+
+        """
+        return self.directory / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Look a URL up and mark it as recently used.
+
+        Parameters
+        ----------
+        url : str
+            Response URL.
+
+        Returns
+        -------
+        Optional[CacheEntry]
+            Cached response or None.
+
+        """
+        key_path = self.key_path(url)
+        meta_path = Path(f"{key_path}{META_SUFFIX}")
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        payload_path = Path(f"{key_path}{PAYLOAD_SUFFIX}")
+        if meta.get("url") != url or not payload_path.exists():
+            return None
+        return CacheEntry(url, payload_path, meta["etag"], meta["last_modified"])
+
+    def writer(
+        self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> CacheWriter:
+        """Start storing a response.
+
+        Parameters
+        ----------
+        url : str
+            Response URL.
+        etag : Optional[str]
+            'ETag' header of the response.
+        last_modified : Optional[str]
+            'Last-Modified' header of the response.
+
+        Returns
+        -------
+        CacheWriter
+            Writer of the payload.
+
+        """
+        return CacheWriter(self, url, etag, last_modified)
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """Evict least recently used entries until the cache fits the size limit.
+
+        Parameters
+        ----------
+        max_bytes : Optional[int]
+            Size limit. Default is the one given to the constructor.
+
+        Returns
+        -------
+        int
+            Number of evicted entries.
+
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        total = 0
+        for meta_path in self.directory.glob(f"*{META_SUFFIX}"):
+            payload_path = meta_path.with_suffix(PAYLOAD_SUFFIX)
+            try:
+                meta_stat = meta_path.stat()
+                size = meta_stat.st_size + payload_path.stat().st_size
+            except OSError:
+                continue
+            entries.append((meta_stat.st_mtime, size, meta_path, payload_path))
+            total += size
+
+        evicted = 0
+        for _, size, meta_path, payload_path in sorted(entries):
+            if total <= limit:
+                break
+            for path in (meta_path, payload_path):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        """Remove all entries.
+
+        Returns
+        -------
+        None
+
+        """
+        self.prune(0)
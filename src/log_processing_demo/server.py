@@ -0,0 +1,380 @@
+"""
+Local HTTP service for read queries which doesn't block on ingestion.
+
+The DB file runs in WAL mode: readers see the last committed state while a writer
+appends to the log, so a 'fetch' or 'import' in another process, or the optional
+watcher of the service itself, never stalls a query. Requests are served by threads,
+each borrowing a read-only connection from a pool, so concurrent queries don't share
+a cursor. The watcher is the only writer connection of the service.
+
+Endpoints answer NDJSON like the commands of the same names do:
+    GET /logs/YYYY-MM-DD[?interval=HH:MM:SS-HH:MM:SS][&limit=N][&cursor=...][&desc=1]
+    GET /search?q=QUERY[&date=YYYY-MM-DD][&interval=...][&limit=N][&page=N]
+    GET /stats/YYYY-MM-DD[?by=minute|hour|user][&interval=...]
+Pages of '/logs' carry the cursor of the next one in the X-Next-Cursor header.
+Errors are answered with a JSON object with an 'error' member, like the LOG API does.
+"""
+import contextlib
+import itertools
+import json
+import logging
+import queue
+import signal
+import sqlite3
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from log_processing_demo import database, ndjson, watch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# Number of read-only connections, i.e. queries served at the same time
+DEFAULT_POOL_SIZE = 4
+
+# Bytes of a response buffered before they are sent
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+class ReadPool:
+    """Fixed set of read-only connections to a DB file, borrowed one at a time."""
+
+    def __init__(
+        self,
+        db_uri: str,
+        size: int = DEFAULT_POOL_SIZE,
+        busy_timeout: float = database.DEFAULT_BUSY_TIMEOUT,
+    ) -> None:
+        """Constructor opens all connections.
+
+        Parameters
+        ----------
+        db_uri : str
+            *.db file path. The file must exist and have an up to date schema.
+        size : int
+            Number of connections.
+        busy_timeout : float
+            Seconds a query waits for a lock held by another connection.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            Rised for a non-positive size.
+
+        """
+        if size < 1:
+            raise ValueError(f"size must be positive, got {size}")
+        self.size = size
+        self._idle: "queue.Queue[database.Database]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(
+                database.open_database(
+                    db_uri, read_only=True, busy_timeout=busy_timeout
+                )
+            )
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[database.Database]:
+        """Context manager that borrows a connection, waiting for a free one.
+
+        Returns
+        -------
+        Iterator[database.Database]
+            Read-only DB object, not to be used after the context is left.
+
+        Raises
+        ------
+        RuntimeError
+            Rised if the pool is closed.
+
+        """
+        if self._closed:
+            raise RuntimeError("The connection pool is closed")
+        db = self._idle.get()
+        try:
+            yield db
+        finally:
+            with self._lock:
+                if self._closed:
+                    db.connection.close()
+                else:
+                    self._idle.put(db)
+
+    def close(self) -> None:
+        """Close idle connections, borrowed ones are closed when they are returned.
+
+        Returns
+        -------
+        None
+
+        """
+        with self._lock:
+            self._closed = True
+            while not self._idle.empty():
+                self._idle.get_nowait().connection.close()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Request handler of 'QueryServer', see module docstring for the endpoints."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and small bodies go out in a single packet, see 'handle_one_request'
+    wbufsize = WRITE_BUFFER_SIZE
+    disable_nagle_algorithm = True
+    server: "QueryServer"
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        params = {
+            name: values[-1]
+            for name, values in urllib.parse.parse_qs(url.query).items()
+        }
+        route, _, argument = url.path.strip("/").partition("/")
+        self._streaming = False
+        try:
+            with self.server.pool.connection() as db:
+                if route == "logs" and argument:
+                    self._send_logs(db, argument, params)
+                elif route == "search" and not argument:
+                    self._send_batches([self._search(db, params)])
+                elif route == "stats" and argument:
+                    stats = db.stats(
+                        argument, params.get("by", "hour"), _interval(params)
+                    )
+                    self._send_batches([stats])
+                else:
+                    self._send_error(404, f"Unknown path {url.path!r}")
+        except ValueError as error:
+            self._send_error(400, str(error))
+        except ConnectionError:
+            self.close_connection = True  # the client has gone
+        except sqlite3.OperationalError as error:
+            if "locked" not in str(error):
+                logger.exception(error)
+                self._send_error(500, str(error))
+                return
+            # A writer outside of WAL mode held the lock longer than the busy timeout
+            logger.warning("%s - %s", url.path, error)
+            self._send_error(503, str(error))
+        except Exception as error:
+            logger.exception(error)
+            self._send_error(500, str(error))
+
+    def _send_logs(
+        self, db: database.Database, log_date: str, params: Dict[str, str]
+    ) -> None:
+        """Answer a 'logs' request, a page of it if a limit is given.
+
+        The cursor of the next page is sent in the X-Next-Cursor header.
+        """
+        options = {
+            "cursor": params.get("cursor"),
+            "descending": params.get("desc", "").lower() in ("1", "true", "yes"),
+        }
+        if not params.get("limit"):
+            batches = db.iter_read(
+                log_date, _interval(params), iso_format=True, **options
+            )
+            self._send_batches(batches)
+            return
+        page = db.read_page(
+            log_date,
+            _interval(params),
+            limit=int(params["limit"]),
+            iso_format=True,
+            **options,
+        )
+        headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else {}
+        self._send_batches([page.rows], headers)
+
+    def _search(
+        self, db: database.Database, params: Dict[str, str]
+    ) -> List[Dict[str, Any]]:
+        """Results of a 'search' request, pages are numbered from 1 like in the CLI."""
+        if not params.get("q"):
+            raise ValueError("Missing query parameter 'q'")
+        limit = int(params.get("limit", database.DEFAULT_SEARCH_LIMIT))
+        page = int(params.get("page", 1))
+        if limit < 1 or page < 1:
+            raise ValueError("limit and page must be positive")
+        return db.search(
+            params["q"],
+            params.get("date"),
+            _interval(params),
+            limit=limit,
+            offset=(page - 1) * limit,
+            iso_format=True,
+        )
+
+    def _send_batches(
+        self,
+        batches: Iterable[List[Dict[str, Any]]],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Stream batches of rows as NDJSON with chunked transfer encoding.
+
+        Errors of the query are rised before the response is started.
+        """
+        batches = iter(batches)
+        encode = ndjson.batch_encoder(fast=True)
+        try:
+            first = next(batches, [])
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self._streaming = True
+            for batch in itertools.chain([first], batches):
+                if batch:
+                    payload = encode(batch)
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.write(b"0\r\n\r\n")
+        finally:
+            # Close the DB cursor before the connection goes back to the pool
+            close = getattr(batches, "close", None)
+            if close:
+                close()
+
+    def _send_error(self, status: int, message: str) -> None:
+        """Answer with a JSON error, or drop the connection if the answer has started."""
+        if self._streaming:
+            self.close_connection = True
+            return
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class QueryServer(ThreadingHTTPServer):
+    """HTTP server of read queries over a pool of read-only connections."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        db_uri: str,
+        address: Tuple[str, int] = (DEFAULT_HOST, DEFAULT_PORT),
+        pool_size: int = DEFAULT_POOL_SIZE,
+        busy_timeout: float = database.DEFAULT_BUSY_TIMEOUT,
+        wal: bool = True,
+    ) -> None:
+        """Constructor prepares the DB file, opens the connections and binds the socket.
+
+        Parameters
+        ----------
+        db_uri : str
+            *.db file path. A missing file is created, an outdated schema is upgraded.
+        address : Tuple[str, int]
+            Host and port to listen on, port 0 picks a free one.
+        pool_size : int
+            Number of read-only connections, i.e. queries served at the same time.
+        busy_timeout : float
+            Seconds a query waits for a lock held by another connection.
+        wal : bool
+            Switch the DB file to WAL mode. Without it readers wait for writers.
+
+        Returns
+        -------
+        None
+
+        """
+        # Readers can't upgrade the schema, a writable connection does it first
+        writer = database.open_database(db_uri, busy_timeout=busy_timeout)
+        try:
+            if wal:
+                writer.enable_wal()
+        finally:
+            writer.connection.close()
+        self.pool = ReadPool(db_uri, pool_size, busy_timeout)
+        try:
+            super().__init__(address, QueryHandler)
+        except OSError:
+            self.pool.close()
+            raise
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.close()
+
+
+def serve(
+    query_server: QueryServer,
+    watcher: Optional[watch.Watcher] = None,
+    signals: Sequence[signal.Signals] = watch.STOP_SIGNALS,
+) -> Iterator[watch.PollResult]:
+    """Serve requests in a background thread until one of the signals is received.
+
+    Must be used in the main thread. Previous signal handlers are restored and the
+    server is shut down, but not closed, when the iteration ends.
+
+    Parameters
+    ----------
+    query_server : QueryServer
+        Server to run.
+    watcher : Optional[watch.Watcher]
+        Watcher which ingests the current day in this thread meanwhile.
+    signals : Sequence[signal.Signals]
+        Signals which stop serving, after the poll in progress.
+
+    Returns
+    -------
+    Iterator[watch.PollResult]
+        Results of every poll of the watcher.
+
+    """
+    stopped = threading.Event()
+
+    def stop(*args: Any) -> None:
+        stopped.set()
+        if watcher:
+            watcher.stop()
+
+    previous = {signum: signal.signal(signum, stop) for signum in signals}
+    thread = threading.Thread(
+        target=query_server.serve_forever, name="serve", daemon=True
+    )
+    thread.start()
+    try:
+        if watcher:
+            yield from watcher.run()
+        else:
+            stopped.wait()
+    finally:
+        query_server.shutdown()
+        thread.join()
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+def _interval(params: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """Time interval of a request, format: HH:MM:SS-HH:MM:SS."""
+    if not params.get("interval"):
+        return None
+    start, separator, end = params["interval"].partition("-")
+    if not separator:
+        raise ValueError("interval must be formatted as HH:MM:SS-HH:MM:SS")
+    return start, end
@@ -1,17 +1,67 @@
 """
-Simple in-place Mergesort implementation for training purposes.
+In-place natural Mergesort implementation for training purposes.
 Added 'key' function just like in Python STL 'sorted()' to sort arbitrary objects.
+
+Keys are computed once. The list is split into already sorted runs (LOG feeds are
+usually nearly sorted), short runs are extended with binary insertion sort, and the
+runs are merged bottom-up through a single reusable scratch buffer. The sort is stable.
+
+'external_sort' handles data which doesn't fit in memory: sorted chunks are spilled
+to temporary files and merged lazily. 'parallel_sort' spreads the work over processes.
+'sort_by_time' is a vectorised path for datetime keys, used when NumPy is installed.
 """
-from typing import Any, Callable, List, Optional
+import heapq
+import itertools
+import operator
+import os
+import pickle
+import tempfile
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import IO, Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from log_processing_demo import metrics
+from log_processing_demo.log_batch import LogBatch
+from log_processing_demo.timestamps import to_epoch_us
+
+try:
+    import numpy
+except ImportError:  # optional dependency, see 'fast' extra
+    numpy = None
+
+# Runs shorter than that are extended with insertion sort before merging
+MIN_RUN = 32
+
+# Default number of items 'external_sort' keeps in memory
+DEFAULT_MAX_ITEMS_IN_MEMORY = 100000
 
+# Maximum number of spilled runs merged at once by 'external_sort'
+MAX_MERGE_FAN_IN = 64
 
-def sort(input_list: List[Any], key: Optional[Callable[[Any], Any]] = None) -> None:
+# Below this list length 'parallel_sort' falls back to the serial 'sort'
+PARALLEL_THRESHOLD = 100000
+
+
+def _input_length(args: Tuple[Any, ...], result: None) -> int:
+    """Row count of an in-place sort for 'metrics.instrument'."""
+    return len(args[0])
+
+
+@metrics.instrument("sort.sort", rows=_input_length)
+def sort(
+    input_list: Union[List[Any], LogBatch],
+    key: Optional[Callable[[Any], Any]] = None,
+) -> None:
     """Main wrapper function of the module.
 
+    A 'LogBatch' is sorted by permuting its columns, its records can't be compared
+    to each other, so it is ordered by creation time unless 'key' is given.
+
     Parameters
     ----------
-    input_list : List[Any]
-        List to be sorted.
+    input_list : Union[List[Any], LogBatch]
+        List or batch to be sorted.
     key : Optional[Callable[[Any], Any]]
         A function (or other callable) to be called on each list element prior to making comparisons.
 
@@ -20,100 +70,516 @@ def sort(input_list: List[Any], key: Optional[Callable[[Any], Any]] = None) -> N
     None
 
     """
-    if not input_list:
+    _sort(input_list, key)
+
+
+def _sort(
+    input_list: Union[List[Any], LogBatch], key: Optional[Callable[[Any], Any]]
+) -> None:
+    """Body of 'sort', called directly where a sort is a part of another one."""
+    length = len(input_list)
+    if length < 2:
         return
 
-    _merge_sort(input_list, 0, len(input_list) - 1, key if key else lambda x: x)
+    if isinstance(input_list, LogBatch):
+        batch = input_list
+        order = list(range(length))
+        if key is None:
+            _sort(order, key=batch.created_at.__getitem__)
+        else:
+            _sort(order, key=lambda index: key(batch[index]))
+        batch.reorder(order)
+        return
+
+    keys: List[Any] = list(map(key, input_list)) if key else list(input_list)
+
+    bounds: List[int] = []
+    start = 0
+    while start < length:
+        end = _find_run(keys, input_list, start, length)
+        if end - start < MIN_RUN:
+            forced_end = min(start + MIN_RUN, length)
+            _insertion_sort(keys, input_list, start, end, forced_end)
+            end = forced_end
+        bounds.append(start)
+        start = end
+    bounds.append(length)
+
+    scratch_keys: List[Any] = [None] * length
+    scratch_items: List[Any] = [None] * length
+
+    # Bottom-up merging of adjacent runs until one is left
+    while len(bounds) > 2:
+        merged = [0]
+        for index in range(0, len(bounds) - 2, 2):
+            _merge(
+                keys,
+                input_list,
+                bounds[index],
+                bounds[index + 1],
+                bounds[index + 2],
+                scratch_keys,
+                scratch_items,
+            )
+            merged.append(bounds[index + 2])
+        if merged[-1] != length:
+            # Odd number of runs, the last one waits for the next pass
+            merged.append(length)
+        bounds = merged
 
 
-def _merge_sort(
+@metrics.instrument("sort.sort_by_time", rows=_input_length)
+def sort_by_time(
+    input_list: Union[List[Any], LogBatch],
+    key: Callable[[Any], datetime] = operator.attrgetter("created_at"),
+) -> None:
+    """Stable in-place sort by a datetime key, e.g. of 'LogItem' records by creation time.
+
+    With NumPy installed the keys are converted to an int64 array of epoch
+    microseconds, ordered with a stable 'argsort' and the list is permuted in one
+    pass, so no Python-level comparisons are made. Otherwise 'parallel_sort' is
+    used on the epoch microseconds, which is serial on one CPU or for short lists.
+    A 'LogBatch' is sorted by its 'created_at' column, which needs no conversion.
+
+    Parameters
+    ----------
+    input_list : Union[List[Any], LogBatch]
+        List or batch to be sorted.
+    key : Callable[[Any], datetime]
+        A function returning a naive (UTC) or aware datetime of a list element.
+        Default is the 'created_at' attribute. Ignored for a 'LogBatch'.
+
+    Returns
+    -------
+    None
+
+    """
+    length = len(input_list)
+    if length < 2:
+        return
+
+    if isinstance(input_list, LogBatch):
+        if numpy is None:
+            sort(input_list)
+            return
+        stamps = numpy.frombuffer(input_list.created_at, dtype=numpy.int64)
+        input_list.reorder(numpy.argsort(stamps, kind="stable").tolist())
+        return
+
+    if numpy is None:
+        parallel_sort(input_list, key=lambda item: to_epoch_us(key(item)))
+        return
+
+    stamps = numpy.fromiter(
+        map(to_epoch_us, map(key, input_list)), dtype=numpy.int64, count=length
+    )
+    order = numpy.argsort(stamps, kind="stable")
+    input_list[:] = [input_list[index] for index in order.tolist()]
+
+
+@metrics.instrument("sort.parallel_sort", rows=_input_length)
+def parallel_sort(
     input_list: List[Any],
-    left_index: int,
-    right_index: int,
-    key: Callable[[Any], Any],
+    key: Optional[Callable[[Any], Any]] = None,
+    workers: Optional[int] = None,
+    threshold: int = PARALLEL_THRESHOLD,
 ) -> None:
-    """Merge Sort Recursive Function.
+    """Stable in-place sort using a pool of processes.
+
+    Keys are extracted in the calling process, so 'key' may be any callable, but the
+    keys themselves must be picklable. Workers receive the key list once, at start
+    (for free with the 'fork' start method), and return the sorted order of their
+    contiguous partition. The partitions are then combined with a k-way merge.
 
     Parameters
     ----------
     input_list : List[Any]
-        List that is being sorted.
-    left_index : int
-        Left margin of a processing segment.
-    right_index : int
-        Right margin of a segment.
-    key : Callable[[Any], Any]
-        Key callable.
+        List to be sorted.
+    key : Optional[Callable[[Any], Any]]
+        A function (or other callable) to be called on each list element prior to making comparisons.
+    workers : Optional[int]
+        Number of processes. Default is the number of CPUs.
+    threshold : int
+        Lists shorter than that are sorted serially.
 
     Returns
     -------
     None
 
     """
-    if left_index >= right_index:
+    length = len(input_list)
+    workers = min(workers or os.cpu_count() or 1, length)
+    if workers < 2 or length < threshold:
+        _sort(input_list, key)
         return
 
-    middle: int = (left_index + right_index) // 2
+    keys: List[Any] = list(map(key, input_list)) if key else list(input_list)
+    bounds = [length * number // workers for number in range(workers + 1)]
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_set_worker_keys, initargs=(keys,)
+    ) as executor:
+        orders = list(executor.map(_sorted_order, bounds, bounds[1:]))
+
+    # 'heapq.merge' takes equal keys from earlier partitions first, which keeps
+    # the merge stable since partitions are contiguous
+    merged = heapq.merge(*orders, key=keys.__getitem__)
+    input_list[:] = [input_list[index] for index in merged]
+
+
+# Keys of the list being sorted by 'parallel_sort', set in every worker process
+_worker_keys: List[Any] = []
+
+
+def _set_worker_keys(keys: List[Any]) -> None:
+    """Worker process initializer of 'parallel_sort'.
+
+    Parameters
+    ----------
+    keys : List[Any]
+        Keys of the whole list.
+
+    Returns
+    -------
+    None
+
+    """
+    global _worker_keys
+    _worker_keys = keys
+
+
+def _sorted_order(start: int, end: int) -> List[int]:
+    """Stable argsort of a partition, executed in a worker process.
+
+    Parameters
+    ----------
+    start : int
+        First index of the partition.
+    end : int
+        Index following the last element of the partition.
+
+    Returns
+    -------
+    List[int]
+        Indices of the whole list that belong to the partition, in sorted order.
+
+    """
+    order = list(range(start, end))
+    _sort(order, key=_worker_keys.__getitem__)
+    return order
+
+
+@metrics.instrument("sort.external_sort")
+def external_sort(
+    items: Iterable[Any],
+    key: Optional[Callable[[Any], Any]] = None,
+    max_items_in_memory: int = DEFAULT_MAX_ITEMS_IN_MEMORY,
+    tmp_dir: Optional[str] = None,
+) -> Iterator[Any]:
+    """Stable out-of-core sort of an arbitrarily large iterable.
+
+    Items are read in chunks of 'max_items_in_memory', every chunk is sorted with
+    'sort' and spilled to a temporary file as a run of pickled items. The runs are
+    then lazily merged with a heap. If the input fits in one chunk, nothing is spilled.
+
+    At most 'MAX_MERGE_FAN_IN' runs are merged at once: runs are kept in levels and
+    every full level is merged into a single run of the next one, so an item is
+    rewritten once per level, i.e. a logarithmic number of times.
+
+    Parameters
+    ----------
+    items : Iterable[Any]
+        Picklable items to be sorted, e.g. a generator.
+    key : Optional[Callable[[Any], Any]]
+        A function (or other callable) to be called on each item prior to making comparisons.
+    max_items_in_memory : int
+        Maximum number of items held in memory while chunks are sorted.
+    tmp_dir : Optional[str]
+        Directory for temporary files. Default is the system one.
+
+    Returns
+    -------
+    Iterator[Any]
+        Sorted items.
+
+    """
+    if max_items_in_memory < 1:
+        raise ValueError(
+            f"max_items_in_memory must be positive, got {max_items_in_memory}"
+        )
+
+    iterator = iter(items)
+    # Runs of level N are merged from MAX_MERGE_FAN_IN runs of level N - 1. Runs of
+    # higher levels hold earlier input, which keeps the merge stable.
+    levels: List[List[IO[bytes]]] = [[]]
+    try:
+        while True:
+            chunk = list(itertools.islice(iterator, max_items_in_memory))
+            exhausted = len(chunk) < max_items_in_memory
+            sort(chunk, key)
+            if len(levels) == 1 and not levels[0] and exhausted:
+                yield from chunk
+                return
+            if chunk:
+                levels[0].append(_write_run(chunk, tmp_dir))
+            del chunk
+            level = 0
+            while len(levels[level]) >= MAX_MERGE_FAN_IN:
+                _merge_level(levels, level, key, tmp_dir)
+                level += 1
+            if exhausted:
+                break
+
+        # Keep the number of simultaneously open runs bounded
+        level = 0
+        while sum(map(len, levels)) > MAX_MERGE_FAN_IN:
+            _merge_level(levels, level, key, tmp_dir)
+            level += 1
+        runs = [run for runs in reversed(levels) for run in runs]
+        yield from _merge_runs(runs, key)
+    finally:
+        for runs in levels:
+            for run in runs:
+                run.close()
+
+
+def _merge_level(
+    levels: List[List[IO[bytes]]],
+    level: int,
+    key: Optional[Callable[[Any], Any]],
+    tmp_dir: Optional[str],
+) -> None:
+    """Merge all runs of a level of 'external_sort' into one run of the next level.
+
+    Parameters
+    ----------
+    levels : List[List[IO[bytes]]]
+        Run files by level, each level in input order. Modified in place.
+    level : int
+        Index of the level to merge.
+    key : Optional[Callable[[Any], Any]]
+        Key callable.
+    tmp_dir : Optional[str]
+        Directory for the merged run.
+
+    Returns
+    -------
+    None
+
+    """
+    if level + 1 == len(levels):
+        levels.append([])
+    runs = levels[level]
+    if runs:
+        levels[level + 1].append(_write_run(_merge_runs(runs, key), tmp_dir))
+    for run in runs:
+        run.close()
+    levels[level] = []
+
+
+def _write_run(items: Iterable[Any], tmp_dir: Optional[str]) -> IO[bytes]:
+    """Spill sorted items to a temporary file.
+
+    Parameters
+    ----------
+    items : Iterable[Any]
+        Sorted picklable items.
+    tmp_dir : Optional[str]
+        Directory for the file.
+
+    Returns
+    -------
+    IO[bytes]
+        File positioned at its end. It is deleted when closed.
+
+    """
+    run = tempfile.TemporaryFile(dir=tmp_dir)
+    for item in items:
+        pickle.dump(item, run, protocol=pickle.HIGHEST_PROTOCOL)
+    return run
+
+
+def _read_run(run: IO[bytes]) -> Iterator[Any]:
+    """Read items of a run spilled by '_write_run' from the beginning.
+
+    Parameters
+    ----------
+    run : IO[bytes]
+        Run file.
+
+    Returns
+    -------
+    Iterator[Any]
+        Items in stored order.
+
+    """
+    run.seek(0)
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
+
+
+def _merge_runs(
+    runs: List[IO[bytes]], key: Optional[Callable[[Any], Any]]
+) -> Iterator[Any]:
+    """Lazily merge spilled runs. Ties are resolved in favour of earlier runs.
+
+    Parameters
+    ----------
+    runs : List[IO[bytes]]
+        Run files in input order.
+    key : Optional[Callable[[Any], Any]]
+        Key callable.
+
+    Returns
+    -------
+    Iterator[Any]
+        Sorted items.
+
+    """
+    return heapq.merge(*map(_read_run, runs), key=key)
+
+
+def _find_run(keys: List[Any], items: List[Any], start: int, length: int) -> int:
+    """Find the end of a sorted run starting at 'start'.
 
-    _merge_sort(input_list, left_index, middle, key)
-    _merge_sort(input_list, middle + 1, right_index, key)
+    A non-descending run is taken as is, a strictly descending one is reversed
+    in place (strictness keeps the sort stable).
 
-    _merge(input_list, left_index, right_index, middle, key)
+    Parameters
+    ----------
+    keys : List[Any]
+        Precomputed keys.
+    items : List[Any]
+        List that is being sorted.
+    start : int
+        First index of the run.
+    length : int
+        Length of the list.
+
+    Returns
+    -------
+    int
+        Index following the last element of the run.
+
+    """
+    end = start + 1
+    if end == length:
+        return end
+
+    if keys[end] < keys[start]:
+        while end + 1 < length and keys[end + 1] < keys[end]:
+            end += 1
+        end += 1
+        keys[start:end] = keys[start:end][::-1]
+        items[start:end] = items[start:end][::-1]
+    else:
+        while end + 1 < length and not keys[end + 1] < keys[end]:
+            end += 1
+        end += 1
+
+    return end
+
+
+def _insertion_sort(
+    keys: List[Any], items: List[Any], start: int, sorted_end: int, end: int
+) -> None:
+    """Binary insertion sort of a segment whose beginning is already sorted.
+
+    Parameters
+    ----------
+    keys : List[Any]
+        Precomputed keys.
+    items : List[Any]
+        List that is being sorted.
+    start : int
+        Left margin of a processing segment.
+    sorted_end : int
+        Elements from 'start' up to this index are already sorted.
+    end : int
+        Right margin of a segment (exclusive).
+
+    Returns
+    -------
+    None
+
+    """
+    for index in range(sorted_end, end):
+        current_key = keys[index]
+        # 'bisect_right' places equal keys after existing ones, preserving stability
+        position = bisect_right(keys, current_key, start, index)
+        if position == index:
+            continue
+        current_item = items[index]
+        keys[position + 1 : index + 1] = keys[position:index]
+        items[position + 1 : index + 1] = items[position:index]
+        keys[position] = current_key
+        items[position] = current_item
 
 
 def _merge(
-    input_list: List[Any],
+    keys: List[Any],
+    items: List[Any],
     left_index: int,
-    right_index: int,
     middle: int,
-    key: Callable[[Any], Any],
+    right_index: int,
+    scratch_keys: List[Any],
+    scratch_items: List[Any],
 ) -> None:
-    """List merging routine.
+    """Merge two adjacent sorted segments using the scratch buffers.
 
     Parameters
     ----------
-    input_list : List[Any]
+    keys : List[Any]
+        Precomputed keys.
+    items : List[Any]
         List that is being sorted.
     left_index : int
-        Left margin of a processing segment.
-    right_index : int
-        Right margin of a segment.
+        Left margin of the first segment.
     middle : int
-        Middle point of a segment.
-    key : Callable[[Any], Any]
-        Key callable.
+        Left margin of the second segment.
+    right_index : int
+        Right margin of the second segment (exclusive).
+    scratch_keys : List[Any]
+        Reusable buffer for keys of the first segment.
+    scratch_items : List[Any]
+        Reusable buffer for items of the first segment.
 
     Returns
     -------
     None
 
     """
-    left_copy: List = input_list[left_index : middle + 1]
-    right_copy: List = input_list[middle + 1 : right_index + 1]
+    # Segments are already in order, which is common for nearly sorted input
+    if not keys[middle] < keys[middle - 1]:
+        return
+
+    left_length = middle - left_index
+    scratch_keys[:left_length] = keys[left_index:middle]
+    scratch_items[:left_length] = items[left_index:middle]
 
-    left_copy_index: int = 0
-    right_copy_index: int = 0
-    sorted_index: int = left_index
+    left_copy_index = 0
+    right_copy_index = middle
+    sorted_index = left_index
 
     # Merging until one of the halves is exhausted
 
-    while left_copy_index < len(left_copy) and right_copy_index < len(right_copy):
-        if key(left_copy[left_copy_index]) <= key(right_copy[right_copy_index]):
-            input_list[sorted_index] = left_copy[left_copy_index]
-            left_copy_index += 1
-        else:
-            input_list[sorted_index] = right_copy[right_copy_index]
+    while left_copy_index < left_length and right_copy_index < right_index:
+        # Strict comparison takes equal keys from the left half first (stability)
+        if keys[right_copy_index] < scratch_keys[left_copy_index]:
+            keys[sorted_index] = keys[right_copy_index]
+            items[sorted_index] = items[right_copy_index]
             right_copy_index += 1
+        else:
+            keys[sorted_index] = scratch_keys[left_copy_index]
+            items[sorted_index] = scratch_items[left_copy_index]
+            left_copy_index += 1
         sorted_index += 1
 
-    # Adding the rest
-
-    if left_copy_index < len(left_copy):
-        input_list[
-            sorted_index : sorted_index + len(left_copy) - left_copy_index
-        ] = left_copy[left_copy_index:]
+    # Adding the rest of the left half, the rest of the right one is already in place
 
-    if right_copy_index < len(right_copy):
-        input_list[
-            sorted_index : sorted_index + len(right_copy) - right_copy_index
-        ] = right_copy[right_copy_index:]
+    if left_copy_index < left_length:
+        keys[sorted_index:right_index] = scratch_keys[left_copy_index:left_length]
+        items[sorted_index:right_index] = scratch_items[left_copy_index:left_length]
@@ -0,0 +1,122 @@
+"""
+Conversion between 'datetime' and integer epoch microseconds used for storage.
+
+Naive datetimes are treated as UTC, aware ones are converted to UTC. Conversion back
+always gives naive UTC datetimes.
+"""
+import functools
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value: datetime) -> int:
+    """Convert datetime to integer microseconds since the Unix epoch.
+
+    Parameters
+    ----------
+    value : datetime
+        Naive (UTC) or aware datetime.
+
+    Returns
+    -------
+    int
+        Microseconds since 1970-01-01T00:00:00 UTC.
+
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(value: int) -> datetime:
+    """Convert integer microseconds since the Unix epoch to naive UTC datetime.
+
+    Parameters
+    ----------
+    value : int
+        Microseconds since 1970-01-01T00:00:00 UTC.
+
+    Returns
+    -------
+    datetime
+        Naive datetime in UTC.
+
+    """
+    return EPOCH + timedelta(microseconds=value)
+
+
+def iso_to_epoch_us(value: str) -> int:
+    """Convert an ISO 8601 date/time string to integer epoch microseconds.
+
+    Parameters
+    ----------
+    value : str
+        Date or date/time, e.g. '2021-01-23' or '2021-01-23 00:48:18'.
+
+    Returns
+    -------
+    int
+        Microseconds since 1970-01-01T00:00:00 UTC.
+
+    """
+    return to_epoch_us(datetime.fromisoformat(value))
+
+
+def epoch_us_to_iso(value: int) -> str:
+    """Format integer epoch microseconds the way 'str(datetime)' does.
+
+    No datetime objects are built: the 'YYYY-MM-DD HH:MM:' prefix is computed with
+    integer arithmetic once per minute and cached, since LOG records are dense in time.
+
+    Parameters
+    ----------
+    value : int
+        Microseconds since 1970-01-01T00:00:00 UTC.
+
+    Returns
+    -------
+    str
+        'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD HH:MM:SS.ffffff'.
+
+    """
+    seconds, microseconds = divmod(value, 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    if microseconds:
+        return f"{_minute_prefix(minutes)}{seconds:02d}.{microseconds:06d}"
+    return f"{_minute_prefix(minutes)}{seconds:02d}"
+
+
+@functools.lru_cache(maxsize=4096)
+def _minute_prefix(minutes: int) -> str:
+    """'YYYY-MM-DD HH:MM:' for minutes since the epoch (proleptic Gregorian calendar).
+
+    Parameters
+    ----------
+    minutes : int
+        Minutes since 1970-01-01T00:00 UTC.
+
+    Returns
+    -------
+    str
+        Date and time prefix.
+
+    """
+    days, minute_of_day = divmod(minutes, 1440)
+    # Days to civil date, see http://howardhinnant.github.io/date_algorithms.html
+    days += 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (
+        day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096
+    ) // 365
+    day_of_year = day_of_era - (
+        365 * year_of_era + year_of_era // 4 - year_of_era // 100
+    )
+    shifted_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = shifted_month + 3 if shifted_month < 10 else shifted_month - 9
+    year = year_of_era + era * 400 + (month <= 2)
+    hour, minute = divmod(minute_of_day, 60)
+    return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:"
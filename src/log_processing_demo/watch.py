@@ -0,0 +1,188 @@
+"""
+Resident ingestion of the current day: the API is polled on an interval over a
+keep-alive session and new records are written to an open DB connection.
+
+Polls are incremental: records older than the watermark of their date are skipped
+before validation, see 'LogReceiver.stream', and the rest are deduplicated as usual.
+At midnight (UTC) the previous day is polled once more, until successfully, so that
+its last records are not lost.
+"""
+import contextlib
+import logging
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence
+
+from log_processing_demo import database
+from log_processing_demo.log_receiver import DATE_PATH_FORMAT, LogReceiver, RequestError
+
+logger = logging.getLogger(__name__)
+
+# Seconds between the starts of two polls
+DEFAULT_INTERVAL = 60.0
+
+# Signals which stop 'Watcher.run' after the poll in progress
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class PollResult(NamedTuple):
+    """Outcome of polling a single date with 'Watcher.poll'."""
+
+    date_string: str
+    stored: int
+    error: Optional[Exception]
+
+
+def utc_now() -> datetime:
+    """Current time in UTC, the time zone of dates in API paths."""
+    return datetime.now(timezone.utc)
+
+
+class Watcher:
+    """Poll the current day of the LOG API and store new records, see module docstring."""
+
+    def __init__(
+        self,
+        receiver: LogReceiver,
+        db: database.Database,
+        interval: float = DEFAULT_INTERVAL,
+        chunk_size: int = database.DEFAULT_CHUNK_SIZE,
+        clock: Callable[[], datetime] = utc_now,
+    ) -> None:
+        """Constructor remembers the source, the destination and the schedule.
+
+        Parameters
+        ----------
+        receiver : LogReceiver
+            Source of LOG records, its session is kept open between polls.
+        db : database.Database
+            Destination DB, kept open between polls.
+        interval : float
+            Seconds between the starts of two polls.
+        chunk_size : int
+            Number of records written to the DB at once.
+        clock : Callable[[], datetime]
+            Source of the current time, which decides the date to poll.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            Rised for a negative interval.
+
+        """
+        if interval < 0:
+            raise ValueError(f"interval must not be negative, got {interval}")
+        self.receiver = receiver
+        self.db = db
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self._stop = threading.Event()
+        # Date of the previous poll, and a past date not yet polled after midnight
+        self._current_date: Optional[str] = None
+        self._closing_date: Optional[str] = None
+
+    def poll(self) -> List[PollResult]:
+        """Store new records of the current date, after finishing the previous one.
+
+        A date which can't be fetched is reported in its result and left to the
+        next poll. DB errors are re-rised.
+
+        Returns
+        -------
+        List[PollResult]
+            Results of the dates polled, the previous date first after midnight.
+
+        """
+        today = self.clock().strftime(DATE_PATH_FORMAT)
+        if self._current_date and self._current_date != today:
+            self._closing_date = self._current_date
+        self._current_date = today
+
+        results = []
+        if self._closing_date:
+            results.append(self._poll_date(self._closing_date))
+            if not results[-1].error:
+                self._closing_date = None
+        results.append(self._poll_date(today))
+        return results
+
+    def run(self) -> Iterator[PollResult]:
+        """Poll on the interval until 'stop' is called.
+
+        A poll in progress, including its DB transaction, is completed before the
+        iteration ends.
+
+        Returns
+        -------
+        Iterator[PollResult]
+            Results of every poll.
+
+        """
+        while not self._stop.is_set():
+            start = time.monotonic()
+            yield from self.poll()
+            self._stop.wait(max(0.0, start + self.interval - time.monotonic()))
+
+    def stop(self) -> None:
+        """Make 'run' end after the poll in progress. Safe to call from signal handlers.
+
+        Returns
+        -------
+        None
+
+        """
+        self._stop.set()
+
+    def _poll_date(self, date_string: str) -> PollResult:
+        """Store the records of a date newer than its watermark."""
+        log_date = datetime.strptime(date_string, DATE_PATH_FORMAT).date().isoformat()
+        try:
+            since = self.db.watermark(log_date)
+            stored = self.db.update(
+                self.receiver.stream(date_string, since=since),
+                chunk_size=self.chunk_size,
+                incremental=True,
+            )
+        except (RequestError, ValueError) as error:
+            logger.error("%s - poll failed: %s", date_string, error)
+            return PollResult(date_string, 0, error)
+        logger.info("%s - poll stored %d new records.", date_string, stored)
+        return PollResult(date_string, stored, None)
+
+
+@contextlib.contextmanager
+def stop_on_signals(
+    watcher: Watcher, signals: Sequence[signal.Signals] = STOP_SIGNALS
+) -> Iterator[Watcher]:
+    """Context manager that makes signals stop a watcher gracefully.
+
+    Previous handlers are restored on exit. Must be used in the main thread.
+
+    Parameters
+    ----------
+    watcher : Watcher
+        Watcher to stop.
+    signals : Sequence[signal.Signals]
+        Signals to handle.
+
+    Returns
+    -------
+    Iterator[Watcher]
+        The watcher itself.
+
+    """
+    previous = {}
+    for signum in signals:
+        previous[signum] = signal.signal(signum, lambda *args: watcher.stop())
+    try:
+        yield watcher
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
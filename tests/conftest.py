@@ -1,3 +1,8 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 
 from log_processing_demo.log_item import LogItem
@@ -168,14 +173,14 @@ def fake_api_error_dict():
 
 @pytest.fixture
 def mock_requests_get(mocker, fake_api_response_dict):
-    mock = mocker.patch("requests.get")
+    mock = mocker.patch("requests.Session.get")
     mock.return_value.json.return_value = fake_api_response_dict
     return mock
 
 
 @pytest.fixture
 def mock_requests_get_incorrect_date(mocker, fake_api_error_dict):
-    mock = mocker.patch("requests.get")
+    mock = mocker.patch("requests.Session.get")
     mock.return_value.json.return_value = fake_api_error_dict
     return mock
 
@@ -185,11 +190,126 @@ def mock_requests_get_error(mocker):
     def error_function():
         raise ValueError("Test error message.")
 
-    mock = mocker.patch("requests.get")
+    mock = mocker.patch("requests.Session.get")
     mock.return_value.raise_for_status = error_function
     return mock
 
 
+def _chunked_body(data, size=7):
+    """Serialize data and cut it into chunks which split multibyte characters."""
+    body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def iter_content(chunk_size=1):
+        return (body[i : i + size] for i in range(0, len(body), size))
+
+    return iter_content
+
+
+@pytest.fixture
+def mock_requests_get_stream(mocker, fake_api_response_dict):
+    mock = mocker.patch("requests.Session.get")
+    mock.return_value.iter_content.side_effect = _chunked_body(fake_api_response_dict)
+    return mock
+
+
+@pytest.fixture
+def mock_requests_get_stream_incorrect_date(mocker, fake_api_error_dict):
+    mock = mocker.patch("requests.Session.get")
+    mock.return_value.iter_content.side_effect = _chunked_body(fake_api_error_dict)
+    return mock
+
+
+@pytest.fixture
+def mock_requests_get_stream_trailing_error(mocker, fake_api_response_dict):
+    mock = mocker.patch("requests.Session.get")
+    data = {"logs": fake_api_response_dict["logs"], "error": "Internal error."}
+    mock.return_value.iter_content.side_effect = _chunked_body(data)
+    return mock
+
+
+################################################################################
+# Local API stand-in
+################################################################################
+
+
+class FakeLogApi:
+    """Local HTTP server which imitates LOG API and counts requests.
+
+    Responses carry an ETag, conditional requests are answered with 304 Not Modified.
+    """
+
+    def __init__(self, days, failing_days=()):
+        self.days = days
+        self.failing_days = set(failing_days)
+        self.hits = []
+        self.not_modified = []
+        self.connections = set()
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                date_string = self.path.rstrip("/").rsplit("/", 1)[-1]
+                api.hits.append(date_string)
+                api.connections.add(self.client_address)
+                if date_string in api.failing_days:
+                    self.send_error(500)
+                    return
+                if date_string in api.days:
+                    data = {"error": "", "logs": api.days[date_string]}
+                else:
+                    data = {"error": f"created_day: no data for {date_string}"}
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    api.not_modified.append(date_string)
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True  # don't wait for idle keep-alive clients
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/logs/"
+
+    def __enter__(self):
+        threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        ).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_log_api(fake_api_response_dict):
+    days = {
+        "20210123": fake_api_response_dict["logs"],
+        "20210124": [
+            {**record, "created_at": record["created_at"].replace("-23T", "-24T")}
+            for record in fake_api_response_dict["logs"]
+        ],
+        "20210126": [],
+    }
+    with FakeLogApi(days, failing_days=["20210125"]) as api:
+        yield api
+
+
 ################################################################################
 # DB fixtures
 ################################################################################
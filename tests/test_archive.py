@@ -0,0 +1,152 @@
+import pytest
+
+from log_processing_demo import archive, database
+from log_processing_demo.database import DAY_US
+from log_processing_demo.log_item import LogItem
+
+
+@pytest.fixture
+def archived_day(tmp_db_path, tmp_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted)
+    store = archive.Archive(tmp_path / "archive")
+    rows = (row for batch in db.iter_day_rows("2021-01-23") for row in batch)
+    assert store.write_day("2021-01-23", rows) == len(fake_log_list_sorted)
+    return db, store
+
+
+def test_archived_day_reads_like_db(archived_day, fake_log_list_sorted):
+    db, store = archived_day
+
+    assert store.days == ["2021-01-23"]
+    assert store.read("2021-01-23") == fake_log_list_sorted
+    assert store.read("2021-01-23", iso_format=True) == db.read(
+        "2021-01-23", iso_format=True
+    )
+    assert store.read("2021-01-24") == []
+
+
+@pytest.mark.parametrize(
+    "interval",
+    [("00:00:00", "14:00:00"), ("10:00:00", "11:00:00"), ("00:48:18", "23:59:59")],
+)
+def test_interval_reads(archived_day, interval):
+    db, store = archived_day
+
+    assert store.read("2021-01-23", interval) == db.read("2021-01-23", interval)
+
+
+def test_segment_row_range(archived_day, fake_log_list_sorted):
+    _, store = archived_day
+    with archive.Segment(store.segment_path("2021-01-23")) as segment:
+        assert len(segment) == len(fake_log_list_sorted)
+        start = segment.created_at[1]
+        assert segment.row_range(start, start + 1) == (2, 2)
+        assert segment.row_range(start - 1, start + 1) == (1, 2)
+        assert segment.row_range(start + 1, start - 1) == (2, 2)
+
+
+def test_update_merges_into_segments(tmp_path, fake_log_for_two_dates):
+    store = archive.Archive(tmp_path / "archive")
+
+    assert store.update(fake_log_for_two_dates[:1]) == 1
+    assert store.update(fake_log_for_two_dates) == 1
+    assert store.days == ["2021-01-23", "2021-01-24"]
+    assert store.read("2021-01-24") == fake_log_for_two_dates[1:]
+
+    store.flush("2021-01-23")
+    assert store.days == ["2021-01-24"]
+    store.flush()
+    assert store.days == []
+
+
+def test_write_day_rejects_unsorted_rows(tmp_path, fake_log_list_sorted):
+    store = archive.Archive(tmp_path / "archive")
+    rows = [
+        (1611360000000000 + second * 1000000, "1", "Имя", "Фамилия", "text")
+        for second in (2, 1)
+    ]
+
+    with pytest.raises(archive.ArchiveError):
+        store.write_day("2021-01-23", rows)
+    with pytest.raises(archive.ArchiveError):
+        store.write_day("2021-01-24", rows[:1])
+    assert store.days == []
+
+
+def test_malformed_segment(tmp_path):
+    path = tmp_path / "2021-01-23.logseg"
+    for content in (b"", b"not a segment" * 10):
+        path.write_bytes(content)
+        with pytest.raises(archive.ArchiveError):
+            archive.Segment(path)
+
+    archive.write_segment(path, 0, [(1, "1", "Имя", "Фамилия", "text")])
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(archive.ArchiveError):
+        archive.Segment(path)
+
+
+def test_archived_day_can_be_removed_from_db(archived_day, fake_log_for_two_dates):
+    db, store = archived_day
+    db.update(fake_log_for_two_dates)
+
+    db.delete_day("2021-01-23")
+    assert db.read("2021-01-23") == []
+    assert db.read("2021-01-24") == fake_log_for_two_dates[1:]
+    assert store.read("2021-01-23")
+
+
+@pytest.mark.parametrize("interval", [None, ("00:00:00", "14:00:00")])
+def test_archived_day_reads_records_fetched_later(
+    archived_day, fake_log_list_sorted, interval
+):
+    db, store = archived_day
+    fetched_later = [
+        item.copy(update={"message": f"{item.message} (edited)"})
+        for item in fake_log_list_sorted
+    ]
+    assert db.update(fake_log_list_sorted + fetched_later) == len(fetched_later)
+
+    stored = db.iter_rows("2021-01-23", interval)
+    assert store.read("2021-01-23", interval, stored=stored) == db.read(
+        "2021-01-23", interval
+    )
+    assert store.read("2021-01-23", interval) == db.read("2021-01-23", interval)[::2]
+
+
+@pytest.mark.parametrize("db_class", [database.Database, database.PartitionedDatabase])
+def test_archived_day_includes_midnight(tmp_db_path, tmp_path, db_class):
+    db = db_class(tmp_db_path)
+    db.update(
+        [
+            LogItem.parse_obj(
+                {
+                    "created_at": created_at,
+                    "first_name": "Имя",
+                    "second_name": "Фамилия",
+                    "user_id": "1",
+                    "message": message,
+                }
+            )
+            for created_at, message in (
+                ("2021-01-23T00:00:00", "midnight"),
+                ("2021-01-23T10:00:00", "later"),
+                ("2021-01-24T00:00:00", "next day"),
+            )
+        ]
+    )
+    store = archive.Archive(tmp_path / "archive")
+
+    rows = (row for batch in db.iter_day_rows("2021-01-23") for row in batch)
+    assert store.write_day("2021-01-23", rows) == 2
+    db.delete_day("2021-01-23")
+    with archive.Segment(store.segment_path("2021-01-23")) as segment:
+        start = segment.day_start - 1
+        rows = [
+            row for batch in segment.iter_rows(start, start + DAY_US) for row in batch
+        ]
+    assert [row[4] for row in rows] == ["midnight", "later"]
+    assert [row[4] for batch in db.iter_day_rows("2021-01-24") for row in batch] == [
+        "next day"
+    ]
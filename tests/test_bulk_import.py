@@ -0,0 +1,128 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from log_processing_demo import bulk_import, database, ndjson
+from log_processing_demo.log_batch import LogBatchError
+
+
+@pytest.fixture
+def source_db(tmp_path, fake_log_list):
+    db = database.Database((tmp_path / "source.db").as_posix())
+    db.update(fake_log_list)
+    return db
+
+
+def show_output(db, date, fast=False):
+    stream = io.BytesIO()
+    ndjson.write_ndjson(db.iter_read(date, iso_format=True), stream, fast=fast)
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_import_round_trips_show_output(tmp_path, tmp_db_path, source_db, workers):
+    plain = tmp_path / "day.ndjson"
+    plain.write_bytes(show_output(source_db, "2021-01-23"))
+    packed = tmp_path / "day.ndjson.gz"
+    packed.write_bytes(gzip.compress(show_output(source_db, "2021-01-23", fast=True)))
+
+    db = database.Database(tmp_db_path)
+    results = list(
+        bulk_import.import_files(db, [plain, packed], workers=workers, block_size=100)
+    )
+
+    records = len(source_db.read("2021-01-23"))
+    assert results == [
+        bulk_import.ImportResult(plain, records, records, None),
+        bulk_import.ImportResult(packed, records, 0, None),
+    ]
+    assert db.read("2021-01-23") == source_db.read("2021-01-23")
+    assert db.check_rollups() == []
+
+
+def test_import_api_responses(tmp_path, tmp_db_path, fake_api_response_dict):
+    pretty = tmp_path / "20210123.json"
+    pretty.write_text(json.dumps(fake_api_response_dict, indent=4, ensure_ascii=False))
+    packed = tmp_path / "20210123.gz"
+    packed.write_bytes(gzip.compress(json.dumps(fake_api_response_dict).encode()))
+    assert (
+        bulk_import.detect_format(pretty) == bulk_import.detect_format(packed) == "json"
+    )
+
+    db = database.Database(tmp_db_path)
+    results = list(bulk_import.import_files(db, [pretty, packed], workers=0))
+
+    logs = fake_api_response_dict["logs"]
+    assert [(result.records, result.stored) for result in results] == [
+        (len(logs), len(logs)),
+        (len(logs), 0),
+    ]
+    assert len(db.read("2021-01-23")) == len(logs)
+
+
+def test_import_reports_malformed_files(
+    tmp_path, tmp_db_path, source_db, fake_api_error_dict
+):
+    lines = show_output(source_db, "2021-01-23").splitlines(keepends=True)
+    broken_json = tmp_path / "broken.ndjson"
+    broken_json.write_bytes(b"".join(lines[:2]) + b"{not json\n" + b"".join(lines[2:]))
+    invalid_record = tmp_path / "invalid.ndjson"
+    record = json.loads(lines[1])
+    record["created_at"] = "yesterday"
+    invalid_record.write_bytes(lines[0] + json.dumps(record).encode() + b"\n")
+    api_error = tmp_path / "error.json"
+    api_error.write_text(json.dumps(fake_api_error_dict))
+    good = tmp_path / "good.ndjson"
+    good.write_bytes(b"".join(lines))
+
+    db = database.Database(tmp_db_path)
+    results = list(
+        bulk_import.import_files(
+            db, [broken_json, invalid_record, api_error, good], workers=2, block_size=1
+        )
+    )
+
+    for result in results[:3]:
+        assert isinstance(result.error, bulk_import.ImportFormatError)
+        assert result.stored == 0
+    assert f"byte {len(lines[0]) + len(lines[1])}" in str(results[0].error)
+    assert f"byte {len(lines[0])}" in str(results[1].error)
+    assert "API error" in str(results[2].error)
+    # Malformed files leave nothing behind, the rest are imported
+    assert results[3] == bulk_import.ImportResult(good, len(lines), len(lines), None)
+    assert len(db.read("2021-01-23")) == len(lines)
+
+
+def test_format_errors_keep_their_cause(tmp_path, fake_api_response_dict):
+    record = dict(fake_api_response_dict["logs"][0], created_at="yesterday")
+    response = tmp_path / "response.json"
+    broken = tmp_path / "broken.json"
+    response.write_text(json.dumps(dict(fake_api_response_dict, logs=[record])))
+    broken.write_text("{not json")
+
+    for parse, cause in (
+        (lambda: bulk_import.parse_lines(b"{not json\n", "broken.ndjson"), ValueError),
+        (
+            lambda: bulk_import.parse_lines(json.dumps(record).encode(), "x.ndjson"),
+            LogBatchError,
+        ),
+        (lambda: bulk_import.parse_response(str(broken)), ValueError),
+        (lambda: bulk_import.parse_response(str(response)), LogBatchError),
+    ):
+        with pytest.raises(bulk_import.ImportFormatError) as error:
+            parse()
+        assert isinstance(error.value.__cause__, cause)
+
+
+def test_import_rejects_bad_settings(tmp_path, tmp_db_path):
+    db = database.Database(tmp_db_path)
+    with pytest.raises(ValueError):
+        list(bulk_import.import_files(db, [], file_format="csv"))
+    with pytest.raises(ValueError):
+        list(bulk_import.import_files(db, [], block_size=0))
+
+    missing = tmp_path / "missing.ndjson"
+    (result,) = bulk_import.import_files(db, [missing], workers=0)
+    assert isinstance(result.error, FileNotFoundError)
@@ -1,4 +1,7 @@
-import pytest  # noqa 401
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
 
 from log_processing_demo import database
 
@@ -32,9 +35,394 @@ def test_flush_current_date(tmp_db_path, fake_log_list_sorted):
     assert db.read("2021-01-23") == []
 
 
+def test_flush_keeps_later_dates(tmp_db_path, fake_log_for_two_dates):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_for_two_dates)
+
+    db.flush(from_date="2021-01-23")
+    assert db.read("2021-01-23") == []
+    assert db.read("2021-01-24") == fake_log_for_two_dates[1:]
+
+
 def test_flush_everything(tmp_db_path, fake_log_for_two_dates):
     db = database.Database(tmp_db_path)
     db.update(fake_log_for_two_dates)
 
     db.flush()
     assert db.read("2021-01-23") == [] and db.read("2021-01-24") == []
+
+
+def test_update_from_generator_in_chunks(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.update((item for item in fake_log_list_sorted), chunk_size=3)
+
+    assert db.read("2021-01-23") == fake_log_list_sorted
+
+
+def test_update_deduplicates_users(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted + fake_log_list_sorted, chunk_size=2)
+
+    users_count = db.cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    assert users_count == len(fake_log_list_sorted)
+    assert len(db.read("2021-01-23")) == len(fake_log_list_sorted)
+
+
+def test_bulk_load_restores_pragmas(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    before = db.cursor.execute("PRAGMA synchronous").fetchone()[0]
+
+    with db.bulk_load(synchronous="OFF", cache_size=-1024):
+        assert db.cursor.execute("PRAGMA synchronous").fetchone()[0] == 0
+        db.update(fake_log_list_sorted)
+
+    assert db.cursor.execute("PRAGMA synchronous").fetchone()[0] == before
+    assert db.read("2021-01-23") == fake_log_list_sorted
+
+
+def test_bulk_load_rejects_unknown_pragma(tmp_db_path):
+    db = database.Database(tmp_db_path)
+    with pytest.raises(ValueError):
+        with db.bulk_load(foreign_keys="ON"):
+            pass
+
+
+def test_schema_created_at_connect(tmp_db_path):
+    db = database.Database(tmp_db_path)
+
+    assert db.schema_version == database.SCHEMA_VERSION
+    assert db.read("2021-01-23") == []
+
+
+def test_upgrade_unversioned_db_in_place(tmp_db_path, fake_log_list_sorted):
+    connection = sqlite3.connect(tmp_db_path)
+    database._create_tables(connection.cursor())
+    for item in fake_log_list_sorted:
+        connection.execute(
+            "INSERT INTO users VALUES (?, ?, ?)",
+            (item.user_id, item.first_name, item.second_name),
+        )
+        connection.execute(
+            "INSERT INTO log_messages (created_at, user_id, message) VALUES (?, ?, ?)",
+            (item.created_at, item.user_id, item.message),
+        )
+    connection.commit()
+    connection.close()
+
+    db = database.Database(tmp_db_path)
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    indexes = [
+        row["name"]
+        for row in db.cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='index'"
+        )
+    ]
+    assert db.schema_version == database.SCHEMA_VERSION
+    assert "idx_log_messages_created_at_user_id" in indexes
+
+
+def test_newer_schema_is_rejected(tmp_db_path):
+    connection = sqlite3.connect(tmp_db_path)
+    connection.execute(f"PRAGMA user_version = {database.SCHEMA_VERSION + 1}")
+    connection.close()
+
+    with pytest.raises(database.SchemaVersionError):
+        database.Database(tmp_db_path)
+
+
+def test_read_uses_time_index(tmp_db_path):
+    db = database.Database(tmp_db_path)
+    plan = " ".join(
+        row["detail"]
+        for row in db.cursor.execute(
+            "EXPLAIN QUERY PLAN " + database.READ_QUERY.format(table="log_messages"),
+            (0, 1),
+        )
+    )
+
+    assert "idx_log_messages_created_at_user_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_read_iso_format(tmp_db_path, fake_log_list_sorted):
+    item = fake_log_list_sorted[0].copy(
+        update={"created_at": datetime(2021, 1, 23, 9, 0, 0, 1500)}
+    )
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted + [item])
+
+    rows = db.read("2021-01-23", iso_format=True)
+    assert [row["created_at"] for row in rows] == sorted(
+        str(element.created_at) for element in fake_log_list_sorted + [item]
+    )
+
+
+def test_timestamps_stored_as_integers(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted)
+
+    types = db.cursor.execute("SELECT DISTINCT typeof(created_at) FROM log_messages")
+    assert [row[0] for row in types] == ["integer"]
+
+
+def test_iter_read_in_batches(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted)
+
+    batches = list(db.iter_read("2021-01-23", batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert [item for batch in batches for item in batch] == fake_log_list_sorted
+
+
+def test_repeated_update_is_idempotent(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+
+    assert db.update(fake_log_list_sorted[:2]) == 2
+    assert db.update(fake_log_list_sorted) == len(fake_log_list_sorted) - 2
+    assert db.update(fake_log_list_sorted) == 0
+    assert db.read("2021-01-23") == fake_log_list_sorted
+
+
+def test_incremental_update_skips_records_below_watermark(
+    mocker, tmp_db_path, fake_log_list_sorted
+):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted[:2])
+    watermark = db.cursor.execute(
+        "SELECT created_at FROM ingest_watermarks WHERE log_date = '2021-01-23'"
+    ).fetchone()[0]
+    assert watermark == database.to_epoch_us(fake_log_list_sorted[1].created_at)
+    assert db.watermark("2021-01-23") == fake_log_list_sorted[1].created_at
+    assert db.watermark("2021-01-24") is None
+
+    insert_messages = mocker.spy(db, "_insert_messages")
+    assert db.update(fake_log_list_sorted, incremental=True) == 2
+
+    # The record at the watermark itself goes through deduplication
+    inserted = sum(len(call.args[0]) for call in insert_messages.call_args_list)
+    assert inserted == len(fake_log_list_sorted) - 1
+    assert db.read("2021-01-23") == fake_log_list_sorted
+
+
+def test_update_keeps_records_differing_in_one_field(tmp_db_path, fake_log_list):
+    item = fake_log_list[0]
+    items = [
+        item,
+        item.copy(update={"created_at": item.created_at + timedelta(microseconds=1)}),
+        # Fields joined with a separator would be equal
+        item.copy(update={"user_id": "1\x1f2", "message": "3"}),
+        item.copy(update={"user_id": "1", "message": "2\x1f3"}),
+    ]
+    db = database.Database(tmp_db_path)
+
+    assert db.update(items) == 4
+    assert db.update(items) == 0
+
+
+def test_upgrade_drops_content_hash(tmp_db_path, fake_log_list_sorted):
+    connection = sqlite3.connect(tmp_db_path)
+    for migration in database.MIGRATIONS[:6]:
+        migration(connection.cursor())
+    connection.execute("PRAGMA user_version = 6")
+    for item in fake_log_list_sorted:
+        connection.execute(
+            "INSERT OR IGNORE INTO users VALUES (?, ?, ?)",
+            (item.user_id, item.first_name, item.second_name),
+        )
+        row = (database.to_epoch_us(item.created_at), item.user_id, item.message)
+        connection.execute(
+            """
+            INSERT INTO log_messages (created_at, user_id, message, content_hash)
+            VALUES (?, ?, ?, ?)
+            """,
+            (*row, database._content_hash(*row)),
+        )
+    connection.commit()
+    connection.close()
+
+    db = database.Database(tmp_db_path)
+    columns = [row[1] for row in db.cursor.execute("PRAGMA table_info(log_messages)")]
+    assert columns == ["id", "created_at", "user_id", "message"]
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    assert db.update(fake_log_list_sorted) == 0
+    # Row IDs are kept, the search index built before the rebuild still matches
+    message = fake_log_list_sorted[0].message
+    assert message in [row["message"] for row in db.search(message.split()[0])]
+
+
+def test_flush_resets_watermarks(tmp_db_path, fake_log_for_two_dates):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_for_two_dates)
+    db.flush()
+
+    assert db.cursor.execute("SELECT * FROM ingest_watermarks").fetchall() == []
+    assert db.update(fake_log_for_two_dates, incremental=True) == 2
+
+
+def test_upgrade_removes_stored_duplicates(tmp_db_path, fake_log_list_sorted):
+    connection = sqlite3.connect(tmp_db_path)
+    for migration in database.MIGRATIONS[:3]:
+        migration(connection.cursor())
+    connection.execute("PRAGMA user_version = 3")
+    for item in fake_log_list_sorted * 2:
+        connection.execute(
+            "INSERT OR IGNORE INTO users VALUES (?, ?, ?)",
+            (item.user_id, item.first_name, item.second_name),
+        )
+        connection.execute(
+            "INSERT INTO log_messages (created_at, user_id, message) VALUES (?, ?, ?)",
+            (database.to_epoch_us(item.created_at), item.user_id, item.message),
+        )
+    connection.commit()
+    connection.close()
+
+    db = database.Database(tmp_db_path)
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    assert db.update(fake_log_list_sorted, incremental=True) == 0
+
+
+def test_bulk_load_keeps_wal_mode(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.enable_wal()
+
+    with db.bulk_load():
+        assert db.journal_mode == "wal"
+        db.update(fake_log_list_sorted)
+    assert db.journal_mode == "wal"
+
+    with pytest.raises(ValueError):
+        database.Database(":memory:").enable_wal()
+
+
+def test_read_only_connection(tmp_db_path, fake_log_list_sorted):
+    database.Database(tmp_db_path).update(fake_log_list_sorted)
+    db = database.open_database(tmp_db_path, read_only=True)
+
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    with pytest.raises(sqlite3.OperationalError):
+        db.update(fake_log_list_sorted[:1])
+    with pytest.raises(database.StorageLayoutError):
+        database.PartitionedDatabase(tmp_db_path, read_only=True)
+
+
+def test_read_only_connection_requires_current_schema(tmp_db_path):
+    connection = sqlite3.connect(tmp_db_path)
+    database._create_tables(connection.cursor())
+    connection.close()
+
+    with pytest.raises(database.SchemaVersionError):
+        database.Database(tmp_db_path, read_only=True)
+    with pytest.raises(ValueError):
+        database.Database(":memory:", read_only=True)
+
+
+@pytest.fixture
+def tied_log_list(fake_log_list_sorted):
+    # Records created at the same time are ordered by user and insertion
+    same_time = fake_log_list_sorted[1].created_at
+    return sorted(
+        [
+            item.copy(
+                update={"created_at": same_time, "message": f"{item.message} {n}"}
+            )
+            for item in fake_log_list_sorted
+            for n in range(2)
+        ],
+        key=lambda item: item.user_id,
+    )
+
+
+def test_read_page_walks_a_day_by_cursor(tmp_db_path, tied_log_list):
+    db = database.Database(tmp_db_path)
+    db.update(tied_log_list)
+
+    for descending in (False, True):
+        rows, cursor = [], None
+        while True:
+            page = db.read_page(
+                "2021-01-23", limit=3, cursor=cursor, descending=descending
+            )
+            rows += page.rows
+            cursor = page.next_cursor
+            if not cursor:
+                break
+            assert len(page.rows) == 3
+        expected = db.read("2021-01-23")
+        assert rows == (expected[::-1] if descending else expected)
+        assert len(rows) == len(tied_log_list)
+
+
+def test_read_page_is_stable_under_inserts(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted[1:])
+    first = db.read_page("2021-01-23", limit=2)
+
+    db.update(fake_log_list_sorted[:1])
+    second = db.read_page("2021-01-23", limit=2, cursor=first.next_cursor)
+    assert first.rows + second.rows == fake_log_list_sorted[1:]
+    assert second.next_cursor is None
+
+    assert db.read("2021-01-23", limit=2, descending=True) == [
+        fake_log_list_sorted[-1],
+        fake_log_list_sorted[-2],
+    ]
+    assert db.read("2021-01-23", cursor=first.next_cursor) == second.rows
+    assert db.read_page(
+        "2021-01-23", ("00:00:00", "14:00:00"), limit=10, descending=True
+    ).rows == list(reversed(fake_log_list_sorted[:-1]))
+
+
+@pytest.mark.parametrize("db_class", [database.Database, database.PartitionedDatabase])
+def test_read_page_keeps_to_boundaries_with_foreign_cursor(
+    tmp_db_path, db_class, fake_log_list_sorted, fake_log_for_two_dates
+):
+    db = db_class(tmp_db_path)
+    db.update(fake_log_list_sorted + fake_log_for_two_dates[1:])
+    first = db.read_page("2021-01-23", limit=1).next_cursor
+    latest = db.read_page("2021-01-23", limit=1, descending=True).next_cursor
+
+    assert db.read_page("2021-01-24", cursor=first).rows == db.read("2021-01-24")
+    assert db.read_page("2021-01-22", cursor=first).rows == []
+    morning = ("00:00:00", "10:00:00")
+    assert db.read_page(
+        "2021-01-23", morning, cursor=latest, descending=True
+    ).rows == db.read("2021-01-23", morning, descending=True)
+    noon = ("10:00:00", "14:00:00")
+    assert db.read_page("2021-01-23", noon, cursor=first).rows == db.read(
+        "2021-01-23", noon
+    )
+
+
+def test_read_page_uses_time_index(tmp_db_path):
+    db = database.Database(tmp_db_path)
+    for after, before, order in ((">", "<", "ASC"), ("<", ">", "DESC")):
+        query = database.PAGE_QUERY.format(
+            table="log_messages", after=after, before=before, order=order
+        )
+        plan = " ".join(
+            row["detail"]
+            for row in db.cursor.execute(
+                "EXPLAIN QUERY PLAN " + query, (0, "", 0, 1, 10)
+            )
+        )
+        assert "idx_log_messages_created_at_user_id" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "garbage",
+        "WzEsMl0",
+        "WyIxIiwiMiIsM10",
+        # Integers out of the signed 64-bit range of SQLite
+        "WzkyMjMzNzIwMzY4NTQ3NzU4MDgsICIxIiwgMV0",
+        "WzEsICIxIiwgLTkyMjMzNzIwMzY4NTQ3NzU4MDld",
+    ],
+)
+def test_read_page_rejects_bad_arguments(tmp_db_path, cursor):
+    db = database.Database(tmp_db_path)
+    with pytest.raises(ValueError):
+        db.read_page("2021-01-23", cursor=cursor)
+    with pytest.raises(ValueError):
+        db.read_page("2021-01-23", limit=0)
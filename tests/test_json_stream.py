@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from log_processing_demo import json_stream
+
+
+def _chunks(text, size):
+    body = text.encode("utf-8")
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 1024])
+def test_iter_members_any_chunk_size(fake_api_response_dict, size):
+    text = json.dumps(fake_api_response_dict, ensure_ascii=False, indent=4)
+    members = list(json_stream.iter_members(_chunks(text, size), "logs"))
+
+    assert members[0] == ("error", "")
+    assert [value for key, value in members[1:]] == fake_api_response_dict["logs"]
+
+
+def test_iter_members_scalars_and_empty_array():
+    text = '{"count": 12345, "logs": [], "ok": true}'
+    members = list(json_stream.iter_members(_chunks(text, 2), "logs"))
+    assert members == [("count", 12345), ("ok", True)]
+
+
+@pytest.mark.parametrize("text", ['{"logs": [{"a": 1}', '{"logs": [1 2]}', "[]"])
+def test_iter_members_malformed(text):
+    with pytest.raises(json_stream.JsonStreamError):
+        list(json_stream.iter_members(_chunks(text, 4), "logs"))
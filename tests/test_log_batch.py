@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from log_processing_demo import database, log_receiver, sort
+from log_processing_demo.log_batch import LogBatch, LogBatchError
+
+
+def test_batch_from_records_matches_log_items(fake_api_response_dict, fake_log_list):
+    batch = LogBatch.from_records(fake_api_response_dict["logs"])
+
+    assert len(batch) == len(fake_log_list)
+    assert list(batch) == fake_log_list
+    assert batch.to_log_items() == fake_log_list
+    assert batch[-1].message == fake_log_list[-1].message
+    with pytest.raises(IndexError):
+        batch[len(fake_log_list)]
+
+
+def test_batch_dictionary_encodes_users(fake_api_response_dict):
+    records = fake_api_response_dict["logs"] * 3
+    batch = LogBatch.from_records(records)
+
+    assert len(batch) == len(records)
+    assert len(batch.users) == len(fake_api_response_dict["logs"])
+    assert batch[5].first_name == records[5]["first_name"]
+
+
+def test_batch_validates_like_log_item(fake_api_response_dict):
+    record = dict(fake_api_response_dict["logs"][0])
+    batch = LogBatch.from_records(
+        [
+            dict(record, user_id=315195),
+            dict(record, created_at="2021-01-23T03:48:18+03:00"),
+            dict(record, created_at=datetime(2021, 1, 23, tzinfo=timezone.utc)),
+        ]
+    )
+    assert batch[0].user_id == "315195"
+    assert batch[1].created_at == datetime(2021, 1, 23, 0, 48, 18)
+    assert batch[2].created_at == datetime(2021, 1, 23)
+
+    for malformed in (
+        dict(record, created_at="yesterday"),
+        dict(record, message=None),
+        {key: value for key, value in record.items() if key != "user_id"},
+    ):
+        with pytest.raises(LogBatchError) as error:
+            LogBatch.from_records([record, malformed])
+        assert error.value.__cause__ is not None
+
+
+@pytest.mark.parametrize("with_numpy", [True, False])
+def test_sort_batch_by_time(
+    mocker, with_numpy, fake_api_response_dict, fake_log_list_sorted
+):
+    if with_numpy:
+        pytest.importorskip("numpy")
+    else:
+        mocker.patch.object(sort, "numpy", None)
+    batch = LogBatch.from_records(fake_api_response_dict["logs"])
+
+    sort.sort_by_time(batch)
+
+    assert list(batch) == fake_log_list_sorted
+
+
+def test_sort_batch(fake_api_response_dict, fake_log_list_sorted):
+    batch = LogBatch.from_records(fake_api_response_dict["logs"])
+
+    sort.sort(batch)
+    assert list(batch) == fake_log_list_sorted
+
+    sort.sort(batch, key=lambda row: (row.user_id, row.created_at))
+    assert list(batch) == sorted(
+        fake_log_list_sorted, key=lambda item: (item.user_id, item.created_at)
+    )
+
+
+def test_update_from_batch(tmp_db_path, fake_log_list, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    db.update(LogBatch.from_log_items(fake_log_list), chunk_size=3)
+
+    assert db.read("2021-01-23") == fake_log_list_sorted
+
+
+def test_receive_batch(mock_requests_get_stream, fake_log_list_sorted):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    batch = receiver.batch("20210123", sort_by_time=True)
+
+    assert isinstance(batch, LogBatch)
+    assert list(batch) == fake_log_list_sorted
+
+
+def test_fetch_many_columnar(fake_log_api, fake_log_list):
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url)
+    results = {
+        result.date_string: result
+        for result in receiver.fetch_many(["20210123", "20210125"], columnar=True)
+    }
+
+    assert list(results["20210123"].logs) == fake_log_list
+    assert isinstance(results["20210125"].error, log_receiver.RequestError)
@@ -30,3 +30,82 @@ def test_requests_error_handling(mock_requests_get_error):
     with pytest.raises(log_receiver.RequestError) as error:
         receiver("2021")
     assert "Test error message." in str(error.value)
+
+
+def test_stream_log_list(mock_requests_get_stream, fake_log_list):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    assert list(receiver.stream("20210123")) == fake_log_list
+    assert mock_requests_get_stream.call_args.kwargs["stream"] is True
+
+
+def test_stream_response_for_incorrect_date(mock_requests_get_stream_incorrect_date):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    with pytest.raises(ValueError) as error:
+        list(receiver.stream("2021"))
+    assert "created_day: does not match format" in str(error.value)
+
+
+def test_stream_error_after_logs(mock_requests_get_stream_trailing_error):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    with pytest.raises(ValueError) as error:
+        list(receiver.stream("20210123"))
+    assert "Internal error." in str(error.value)
+
+
+def test_stream_requests_error_handling(mock_requests_get_error):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    with pytest.raises(log_receiver.RequestError):
+        list(receiver.stream("2021"))
+
+
+def test_expand_dates():
+    assert log_receiver.expand_dates("20210130-20210202,20210101,20210131") == [
+        "20210130",
+        "20210131",
+        "20210201",
+        "20210202",
+        "20210101",
+    ]
+    with pytest.raises(ValueError):
+        log_receiver.expand_dates("20210102-20210101")
+    with pytest.raises(ValueError):
+        log_receiver.expand_dates("2021")
+
+
+def test_fetch_many_reports_failures_per_date(fake_log_api, fake_log_list):
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url)
+    dates = ["20210123", "20210124", "20210125", "20210126", "20210127"]
+    results = {
+        result.date_string: result for result in receiver.fetch_many(dates, workers=2)
+    }
+
+    assert sorted(results) == dates
+    assert results["20210123"].logs == fake_log_list and not results["20210123"].error
+    assert len(results["20210124"].logs) == len(fake_log_list)
+    assert results["20210126"].logs == []
+    assert isinstance(results["20210125"].error, log_receiver.RequestError)
+    assert isinstance(results["20210127"].error, ValueError)
+
+
+def test_fetch_many_reuses_connections(fake_log_api):
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url, pool_size=2)
+    dates = log_receiver.expand_dates("20210123-20210124,20210126") * 4
+    results = list(receiver.fetch_many(dates, workers=2))
+
+    assert len(fake_log_api.hits) == len(dates)
+    assert not any(result.error for result in results)
+    assert len(fake_log_api.connections) <= 2
+
+
+def test_stream_sorted_externally(mock_requests_get_stream, fake_log_list_sorted):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    records = receiver.stream("20210123", sort_by_time=True, max_items_in_memory=2)
+    assert list(records) == fake_log_list_sorted
+
+
+def test_stream_since(mock_requests_get_stream, fake_log_list):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    since = sorted(item.created_at for item in fake_log_list)[2]
+    assert list(receiver.stream("20210123", since=since)) == [
+        item for item in fake_log_list if item.created_at >= since
+    ]
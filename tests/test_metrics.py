@@ -0,0 +1,143 @@
+import logging
+from pathlib import Path
+
+import pytest
+
+from log_processing_demo import database, log_receiver, metrics, sort
+from log_processing_demo.log_batch import LogBatch
+
+
+@pytest.fixture
+def registry():
+    metrics.registry.reset()
+    metrics.registry.enabled = True
+    yield metrics.registry
+    metrics.registry.enabled = False
+    metrics.registry.reset()
+
+
+class Unprintable:
+    def __repr__(self):
+        raise AssertionError("must not be converted to a string")
+
+    __str__ = __repr__
+
+
+def test_nothing_is_recorded_when_disabled(tmp_db_path, fake_log_list):
+    metrics.registry.reset()
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list)
+    sort.sort(list(fake_log_list), key=lambda x: x.created_at)
+
+    assert metrics.registry.snapshot() == {}
+
+
+def test_instrumented_calls(registry):
+    @metrics.instrument("test.call")
+    def call(value):
+        if value is None:
+            raise ValueError
+        return value
+
+    @metrics.instrument("test.generator", rows=lambda args, item: len(item))
+    def generator(count):
+        for _ in range(count):
+            yield [1, 2]
+
+    assert call([1, 2, 3]) == [1, 2, 3]
+    call(5)
+    with pytest.raises(ValueError):
+        call(None)
+    assert list(generator(3)) == [[1, 2]] * 3
+
+    summary = registry.snapshot()
+    assert summary["test.call"]["calls"] == 3
+    assert summary["test.call"]["errors"] == 1
+    assert summary["test.call"]["rows"] == 8
+    assert summary["test.generator"]["calls"] == 1
+    assert summary["test.generator"]["rows"] == 6
+    assert 0 < summary["test.call"]["p50"] <= summary["test.call"]["p99"]
+    assert "test.generator" in registry.format_summary()
+
+
+def test_histogram_percentiles():
+    stats = metrics.OperationStats()
+    for seconds in [0.001] * 90 + [0.1] * 10:
+        stats.add(seconds, 0, 0, False)
+
+    # Upper bounds of power-of-two microsecond buckets
+    assert stats.percentile(0.5) == 1024 / 1000000
+    assert stats.percentile(0.9) == 1024 / 1000000
+    assert stats.percentile(0.95) == 131072 / 1000000
+
+
+def test_db_operations_and_sorts_are_recorded(
+    registry, tmp_db_path, fake_log_list, fake_log_for_two_dates
+):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list)
+    db.read("2021-01-23")
+    list(db.iter_read("2021-01-23", batch_size=3))
+    sort.sort(list(fake_log_list), key=lambda x: x.created_at)
+    list(sort.external_sort(fake_log_list, key=lambda x: x.created_at))
+
+    summary = registry.snapshot()
+    assert summary["db.update"]["rows"] == 4
+    assert summary["db.read"]["rows"] == 4
+    assert summary["db.iter_rows"]["calls"] == 2
+    assert summary["db.iter_rows"]["rows"] == 8
+    assert summary["sort.sort"]["rows"] >= 4
+    assert summary["sort.external_sort"]["rows"] == 4
+
+
+def test_rows_of_keyword_arguments(registry, fake_log_list):
+    sort.sort(input_list=list(fake_log_list), key=lambda x: x.created_at)
+    assert registry.snapshot()["sort.sort"]["rows"] == 4
+
+    sort.sort_by_time(input_list=list(fake_log_list))
+    assert registry.snapshot()["sort.sort_by_time"]["rows"] == 4
+
+
+def test_batch_sort_is_recorded_once(registry, fake_log_list):
+    sort.sort(LogBatch.from_log_items(fake_log_list))
+
+    assert registry.snapshot()["sort.sort"]["calls"] == 1
+    assert registry.snapshot()["sort.sort"]["rows"] == 4
+
+
+def test_http_requests_are_recorded(registry, fake_log_api, fake_log_list):
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url)
+    assert list(receiver.stream("20210123")) == fake_log_list
+    assert receiver("20210124")
+    with pytest.raises(log_receiver.RequestError):
+        receiver("20210125")
+
+    requests = registry.snapshot()["http.get"]
+    assert requests["calls"] == 3
+    assert requests["errors"] == 1
+    assert requests["bytes"] > 1000
+
+
+def test_log_lines_describe_arguments_cheaply(tmp_db_path, fake_log_list, caplog):
+    db = database.Database(tmp_db_path)
+    caplog.set_level(logging.INFO, logger=database.logger.name)
+    db.update(fake_log_list * 1000)
+
+    line = caplog.records[-1].getMessage()
+    assert "update - success" in line
+    assert "<Database>, <list of 4000>" in line
+    assert str(metrics.LazyArguments((Path("a.db"), [Unprintable()]), {"x": 1})) == (
+        "'a.db', <list of 1>, x=1"
+    )
+    assert str(metrics.LazyArguments(("x" * 100,), {})).endswith("'...")
+
+
+def test_frequent_operations_are_sampled(tmp_db_path, caplog):
+    db = database.Database(tmp_db_path)
+    caplog.set_level(logging.INFO, logger=database.logger.name)
+    for _ in range(250):
+        db.read("2021-01-23")
+
+    # The call counter is shared by all instances, so earlier reads shift it
+    logged = [r for r in caplog.records if r.getMessage().startswith("read")]
+    assert len(logged) in (2, 3)
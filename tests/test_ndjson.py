@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+from log_processing_demo import ndjson
+
+
+@pytest.fixture
+def rows(fake_api_response_dict):
+    return fake_api_response_dict["logs"]
+
+
+def test_write_ndjson_matches_json_dumps(rows):
+    stream = io.BytesIO()
+    lines = ndjson.write_ndjson([rows[:3], rows[3:]], stream)
+
+    expected = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    assert lines == len(rows)
+    assert stream.getvalue().decode("utf-8") == expected
+
+
+@pytest.mark.parametrize("orjson_installed", [True, False])
+def test_write_ndjson_fast(monkeypatch, rows, orjson_installed):
+    if orjson_installed:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(ndjson, "orjson", None)
+    stream = io.BytesIO()
+    ndjson.write_ndjson([rows], stream, fast=True)
+
+    output = stream.getvalue().decode("utf-8").splitlines()
+    assert [json.loads(line) for line in output] == rows
+    assert ", " not in output[0].replace(rows[0]["message"], "")
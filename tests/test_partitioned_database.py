@@ -0,0 +1,164 @@
+import sqlite3
+
+import pytest
+
+from log_processing_demo import database
+from log_processing_demo.read_cache import ReadCache
+
+
+def test_update_and_read_by_day(tmp_db_path, fake_log_for_two_dates):
+    db = database.PartitionedDatabase(tmp_db_path)
+    assert db.update(fake_log_for_two_dates) == 2
+    assert db.update(fake_log_for_two_dates) == 0
+
+    assert db.partitions == ["2021-01-23", "2021-01-24"]
+    assert db.read("2021-01-23") == fake_log_for_two_dates[:1]
+    assert db.read("2021-01-24") == fake_log_for_two_dates[1:]
+    assert db.read("2021-01-25") == []
+    assert db.cursor.execute("SELECT COUNT(*) FROM log_messages").fetchone()[0] == 0
+
+
+def test_read_for_an_interval(tmp_db_path, fake_log_list_sorted):
+    db = database.PartitionedDatabase(tmp_db_path)
+    db.update(reversed(fake_log_list_sorted), chunk_size=2)
+
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    assert db.read("2021-01-23", ("00:00:00", "14:00:00")) == fake_log_list_sorted[:-1]
+
+
+def test_read_touches_only_partitions_of_the_range(tmp_db_path):
+    db = database.PartitionedDatabase(tmp_db_path)
+    for day in range(18650, 18655):
+        db._create_partition(day)
+    start, end = database._time_boundaries("2021-01-23")
+
+    assert db._message_tables(start, end) == ["log_messages_20210123"]
+    plan = " ".join(
+        row["detail"]
+        for row in db.cursor.execute(
+            "EXPLAIN QUERY PLAN "
+            + database.READ_QUERY.format(table="log_messages_20210123"),
+            (start, end),
+        )
+    )
+    assert "idx_log_messages_20210123_created_at_user_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_flush_drops_partitions(tmp_db_path, fake_log_for_two_dates):
+    db = database.PartitionedDatabase(tmp_db_path, read_cache=ReadCache())
+    db.update(fake_log_for_two_dates)
+    assert len(db.read("2021-01-23")) == 1
+
+    db.flush(from_date="2021-01-23")
+    assert db.partitions == ["2021-01-24"]
+    assert db.read("2021-01-23") == []
+    assert db.read("2021-01-24") == fake_log_for_two_dates[1:]
+    assert db.update(fake_log_for_two_dates, incremental=True) == 1
+
+    db.flush()
+    assert db.partitions == []
+    assert db.cursor.execute("SELECT * FROM ingest_watermarks").fetchall() == []
+
+
+def test_delete_day_drops_its_partition(tmp_db_path, fake_log_for_two_dates):
+    db = database.PartitionedDatabase(tmp_db_path)
+    db.update(fake_log_for_two_dates)
+
+    db.delete_day("2021-01-24")
+    assert db.partitions == ["2021-01-23"]
+    assert db.read("2021-01-23") == fake_log_for_two_dates[:1]
+
+
+def test_flush_returns_pages_to_file_system(tmp_db_path, fake_log_list_sorted):
+    db = database.PartitionedDatabase(tmp_db_path)
+    items = [
+        item.copy(update={"message": f"{item.message} {number}" * 50})
+        for number in range(200)
+        for item in fake_log_list_sorted
+    ]
+    db.update(items)
+    full_size = db.cursor.execute("PRAGMA page_count").fetchone()[0]
+
+    db.flush()
+    assert db.cursor.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert db.cursor.execute("PRAGMA page_count").fetchone()[0] < full_size / 10
+
+
+def test_single_table_db_is_converted(tmp_db_path, fake_log_for_two_dates):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_for_two_dates)
+    db.connection.close()
+
+    db = database.PartitionedDatabase(tmp_db_path)
+    assert db.partitions == ["2021-01-23", "2021-01-24"]
+    assert db.read("2021-01-24") == fake_log_for_two_dates[1:]
+    assert db.cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    db.connection.close()
+
+    assert isinstance(database.open_database(tmp_db_path), database.PartitionedDatabase)
+    with pytest.raises(database.StorageLayoutError):
+        database.Database(tmp_db_path)
+
+
+def test_converted_db_keeps_messages_before_1970(tmp_db_path, fake_log_list_sorted):
+    items = [
+        item.copy(update={"created_at": item.created_at.replace(year=1969, day=31)})
+        for item in fake_log_list_sorted
+    ]
+    database.Database(tmp_db_path).update(items)
+
+    db = database.PartitionedDatabase(tmp_db_path)
+    assert db.partitions == ["1969-01-31"]
+    assert db.read("1969-01-31") == items
+    assert db.check_rollups() == []
+
+
+def test_open_database_of_older_schema(tmp_db_path):
+    connection = sqlite3.connect(tmp_db_path)
+    for migration in database.MIGRATIONS[:3]:
+        migration(connection.cursor())
+    connection.execute("PRAGMA user_version = 3")
+    connection.commit()
+    connection.close()
+
+    db = database.open_database(tmp_db_path)
+    assert type(db) is database.Database
+    assert db.layout == database.SINGLE_TABLE_LAYOUT
+
+
+def test_upgrade_drops_content_hash_of_partitions(tmp_db_path, fake_log_list_sorted):
+    db = database.PartitionedDatabase(tmp_db_path)
+    db.update(fake_log_list_sorted)
+    # Partitions of schema version 8 had a unique content hash
+    db.cursor.executescript(
+        """
+        ALTER TABLE log_messages_20210123 ADD COLUMN content_hash INTEGER;
+        UPDATE log_messages_20210123 SET content_hash = id;
+        CREATE UNIQUE INDEX idx_log_messages_20210123_content_hash
+        ON log_messages_20210123 (content_hash);
+        PRAGMA user_version = 8;
+        """
+    )
+    db.connection.close()
+
+    db = database.PartitionedDatabase(tmp_db_path)
+    indexes = [
+        row[1] for row in db.cursor.execute("PRAGMA index_list(log_messages_20210123)")
+    ]
+    assert sorted(indexes) == [
+        "idx_log_messages_20210123_created_at_user_id",
+        "idx_log_messages_20210123_unique_key",
+    ]
+    assert db.update(fake_log_list_sorted) == 0
+    assert db.read("2021-01-23") == fake_log_list_sorted
+
+
+def test_read_page(tmp_db_path, fake_log_list_sorted, fake_log_for_two_dates):
+    db = database.PartitionedDatabase(tmp_db_path)
+    db.update(fake_log_list_sorted + fake_log_for_two_dates[1:])
+
+    page = db.read_page("2021-01-23", limit=3, descending=True)
+    assert page.rows == fake_log_list_sorted[:-4:-1]
+    page = db.read_page("2021-01-23", limit=3, cursor=page.next_cursor, descending=True)
+    assert page == database.Page(fake_log_list_sorted[:1], None)
@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+
+import pytest
+
+from log_processing_demo import database, log_receiver, pipeline
+from log_processing_demo.response_cache import ResponseCache
+
+
+def pipeline_threads():
+    return [
+        thread
+        for thread in threading.enumerate()
+        if thread.name.startswith("pipeline-")
+    ]
+
+
+def test_pipeline_stores_dates_like_serial_fetch(
+    tmp_path, tmp_db_path, fake_log_api, fake_log_list
+):
+    dates = ["20210123", "20210124", "20210126"]
+    db = database.Database(tmp_db_path)
+    ingest = pipeline.Pipeline(
+        log_receiver.LogReceiver(fake_log_api.base_url),
+        db,
+        workers=2,
+        chunk_size=2,
+        read_size=16,
+    )
+    results = list(ingest.run(dates))
+
+    assert [result.date_string for result in results] == dates
+    assert [(result.records, result.stored) for result in results] == [
+        (len(fake_log_list), len(fake_log_list)),
+        (len(fake_log_list), len(fake_log_list)),
+        (0, 0),
+    ]
+    assert not any(result.error for result in results)
+
+    serial_db = database.Database((tmp_path / "serial.db").as_posix())
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url)
+    for date_string in dates:
+        serial_db.update(receiver.stream(date_string))
+    for day in ("2021-01-23", "2021-01-24"):
+        assert db.read(day) == serial_db.read(day)
+    assert db.check_rollups() == []
+
+    # Idempotent like 'Database.update'
+    assert [result.stored for result in ingest.run(dates)] == [0, 0, 0]
+
+
+def test_pipeline_reports_failures_per_date(tmp_db_path, fake_log_api, fake_log_list):
+    db = database.Database(tmp_db_path)
+    ingest = pipeline.Pipeline(
+        log_receiver.LogReceiver(fake_log_api.base_url), db, chunk_size=1
+    )
+    results = {
+        result.date_string: result
+        for result in ingest.run(["20210125", "20210127", "20210123"])
+    }
+
+    assert isinstance(results["20210125"].error, log_receiver.RequestError)
+    assert isinstance(results["20210127"].error, ValueError)
+    assert results["20210123"].stored == len(fake_log_list)
+    assert results["20210127"].stored == results["20210125"].stored == 0
+    assert db.read("2021-01-24") == []
+    assert len(db.read("2021-01-23")) == len(fake_log_list)
+    for thread in pipeline_threads():
+        thread.join(timeout=5)
+    assert not pipeline_threads()
+
+
+def test_pipeline_stats_and_bounded_queues(tmp_db_path, fake_log_api, fake_log_list):
+    ingest = pipeline.Pipeline(
+        log_receiver.LogReceiver(fake_log_api.base_url),
+        database.Database(tmp_db_path),
+        queue_size=1,
+        chunk_size=1,
+        read_size=8,
+    )
+    list(ingest.run(["20210123", "20210124"]))
+    stats = ingest.stats
+
+    assert stats.stages["read"].items > 0
+    assert stats.stages["parse"].items == stats.stages["write"].items
+    assert stats.stages["write"].items == 2 * len(fake_log_list)
+    for queue_stats in stats.queues.values():
+        assert queue_stats.puts > 0
+        assert queue_stats.max_depth == 1
+    # One batch per record and the end of every date
+    assert stats.queues["batches"].puts == 2 * len(fake_log_list) + 2
+    assert stats.seconds > 0
+    report = stats.format_report()
+    assert all(name in report for name in pipeline.STAGES + pipeline.QUEUES)
+
+
+def test_pipeline_sorts_days(tmp_db_path, fake_log_api, fake_log_list_sorted):
+    db = database.Database(tmp_db_path)
+    ingest = pipeline.Pipeline(
+        log_receiver.LogReceiver(fake_log_api.base_url), db, sort_by_time=True
+    )
+    list(ingest.run(["20210123"]))
+
+    stored = db.cursor.execute("SELECT created_at FROM log_messages ORDER BY id")
+    created_at = [row[0] for row in stored]
+    assert created_at == sorted(created_at)
+    assert len(created_at) == len(fake_log_list_sorted)
+
+
+def test_pipeline_updates_response_cache(tmp_path, tmp_db_path, fake_log_api):
+    cache = ResponseCache(tmp_path / "cache", immutable_past=True)
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url, cache=cache)
+    for _ in range(2):
+        ingest = pipeline.Pipeline(receiver, database.Database(tmp_db_path))
+        list(ingest.run(["20210123", "20210127"]))
+
+    # The day with an API error isn't cached
+    assert sorted(fake_log_api.hits) == ["20210123", "20210127", "20210127"]
+
+
+def test_pipeline_stops_threads_on_db_error(tmp_db_path, fake_log_api):
+    db = database.Database(tmp_db_path)
+    ingest = pipeline.Pipeline(
+        log_receiver.LogReceiver(fake_log_api.base_url),
+        db,
+        workers=3,
+        queue_size=1,
+        chunk_size=1,
+        read_size=8,
+    )
+    db.connection.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        list(ingest.run(["20210123", "20210124", "20210126"]))
+
+    for thread in pipeline_threads():
+        thread.join(timeout=5)
+    assert not pipeline_threads()
+
+
+def test_pipeline_rejects_bad_settings(tmp_db_path):
+    receiver = log_receiver.LogReceiver("http://www.dsdev.tech/logs/")
+    db = database.Database(tmp_db_path)
+    for setting in ("workers", "queue_size", "chunk_size"):
+        with pytest.raises(ValueError):
+            pipeline.Pipeline(receiver, db, **{setting: 0})
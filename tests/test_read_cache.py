@@ -0,0 +1,166 @@
+import sqlite3
+import time
+
+import pytest
+
+from log_processing_demo import database, ndjson
+from log_processing_demo.log_item import LogItem
+from log_processing_demo.read_cache import ReadCache
+
+
+def _item(created_at, message="New message"):
+    return LogItem.parse_obj(
+        {
+            "created_at": created_at,
+            "first_name": "Малика",
+            "message": message,
+            "second_name": "Одинцова",
+            "user_id": "315195",
+        }
+    )
+
+
+def test_repeated_read_is_served_from_cache(tmp_db_path, fake_log_list_sorted):
+    cache = ReadCache()
+    db = database.Database(tmp_db_path, read_cache=cache)
+    db.update(fake_log_list_sorted)
+
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_returned_rows_do_not_alias_cache(tmp_db_path, fake_log_list_sorted):
+    db = database.Database(tmp_db_path, read_cache=ReadCache())
+    db.update(fake_log_list_sorted)
+
+    db.read("2021-01-23")[0]["message"] = "changed"
+    assert db.read("2021-01-23") == fake_log_list_sorted
+
+
+def test_update_invalidates_overlapping_ranges(tmp_db_path, fake_log_list_sorted):
+    cache = ReadCache()
+    db = database.Database(tmp_db_path, read_cache=cache)
+    db.update(fake_log_list_sorted)
+    morning = ("00:00:00", "12:00:00")
+    db.read("2021-01-23")
+    db.read("2021-01-23", morning)
+    db.read("2021-01-24")
+
+    new_item = _item("2021-01-23T20:00:00")
+    db.update([new_item])
+
+    assert db.read("2021-01-23") == [*fake_log_list_sorted, new_item]
+    # Neither the morning nor the next day contain the new record
+    assert db.read("2021-01-23", morning) == [
+        x for x in fake_log_list_sorted if x.created_at.hour < 12
+    ]
+    assert db.read("2021-01-24") == []
+    assert cache.invalidations == 1
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_duplicate_update_keeps_cache(tmp_db_path, fake_log_list_sorted):
+    cache = ReadCache()
+    db = database.Database(tmp_db_path, read_cache=cache)
+    db.update(fake_log_list_sorted)
+    db.read("2021-01-23")
+
+    assert db.update(fake_log_list_sorted) == 0
+    assert db.read("2021-01-23") == fake_log_list_sorted
+    assert cache.invalidations == 0
+
+
+@pytest.mark.parametrize("from_date", ["2021-01-23", None])
+def test_flush_invalidates_cache(tmp_db_path, fake_log_for_two_dates, from_date):
+    db = database.Database(tmp_db_path, read_cache=ReadCache())
+    db.update(fake_log_for_two_dates)
+    assert len(db.read("2021-01-23")) == 1
+
+    db.flush(from_date)
+    assert db.read("2021-01-23") == []
+
+
+def test_writes_of_other_connections_clear_cache(tmp_db_path, fake_log_list_sorted):
+    cache = ReadCache()
+    reader = database.Database(tmp_db_path, read_cache=cache)
+    writer = database.Database(tmp_db_path)
+    writer.update(fake_log_list_sorted[:2])
+    assert reader.read("2021-01-23") == fake_log_list_sorted[:2]
+
+    writer.update(fake_log_list_sorted[2:])
+    assert reader.read("2021-01-23") == fake_log_list_sorted
+    assert cache.hits == 0
+
+
+def test_cache_limits():
+    cache = ReadCache(max_entries=2, max_rows=3)
+    cache.put((0, 1, False), [1])
+    cache.put((1, 2, False), [1])
+    cache.get((0, 1, False))
+    cache.put((2, 3, False), [1])
+    assert cache.get((1, 2, False)) is None  # least recently used
+
+    cache.put((3, 4, False), [1, 2, 3, 4])
+    assert cache.get((3, 4, False)) is None  # too large
+    assert cache.stats()["entries"] == 2
+
+    with pytest.raises(ValueError):
+        ReadCache(max_entries=0)
+
+
+def test_output_cache_is_shared_and_invalidated(tmp_db_path, fake_log_list_sorted):
+    encode = ndjson.batch_encoder(False)
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted)
+    expected = encode(db.read("2021-01-23", iso_format=True))
+
+    assert b"".join(db.iter_output("2021-01-23", None, "ndjson", encode)) == expected
+    other = database.Database(tmp_db_path)
+    # Served from the DB without encoding
+    assert b"".join(other.iter_output("2021-01-23", None, "ndjson", None)) == expected
+
+    new_item = _item("2021-01-23T20:00:00")
+    other.update([new_item])
+    output = b"".join(db.iter_output("2021-01-23", None, "ndjson", encode))
+    assert output.count(b"\n") == len(fake_log_list_sorted) + 1
+
+
+def test_output_cache_size_limit(tmp_db_path, fake_log_list_sorted):
+    encode = ndjson.batch_encoder(False)
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list_sorted)
+
+    list(db.iter_output("2021-01-23", None, "ndjson", encode, max_bytes=10))
+    assert db.cursor.execute("SELECT COUNT(*) FROM output_cache").fetchone()[0] == 0
+
+    day_size = len(encode(db.read("2021-01-23", iso_format=True)))
+    list(db.iter_output("2021-01-23", ("00:00:00", "12:00:00"), "ndjson", encode))
+    list(db.iter_output("2021-01-23", None, "ndjson", encode, max_bytes=day_size))
+    # The whole day doesn't fit together with the morning, which was evicted
+    sizes = db.cursor.execute("SELECT size FROM output_cache").fetchall()
+    assert [size for (size,) in sizes] == [day_size]
+
+
+def test_output_cache_doesnt_wait_for_writer(tmp_db_path, fake_log_list_sorted):
+    encode = ndjson.batch_encoder(False)
+    database.Database(tmp_db_path).update(fake_log_list_sorted)
+    db = database.Database(tmp_db_path, busy_timeout=10)
+    writer = sqlite3.connect(tmp_db_path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        output = b"".join(db.iter_output("2021-01-23", None, "ndjson", encode))
+        elapsed = time.monotonic() - start
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+    assert output == encode(db.read("2021-01-23", iso_format=True))
+    assert elapsed < 5
+    assert db.cursor.execute("SELECT COUNT(*) FROM output_cache").fetchone()[0] == 0
+    assert db.cursor.execute("PRAGMA busy_timeout").fetchone()[0] == 10000
+
+    read_only = database.Database(tmp_db_path, read_only=True)
+    assert b"".join(read_only.iter_output("2021-01-23", None, "ndjson", encode))
+    assert db.cursor.execute("SELECT COUNT(*) FROM output_cache").fetchone()[0] == 0
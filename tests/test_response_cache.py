@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from log_processing_demo import log_receiver
+from log_processing_demo.response_cache import ResponseCache
+
+
+def test_cached_day_is_revalidated(tmp_path, fake_log_api, fake_log_list):
+    cache = ResponseCache(tmp_path / "cache")
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url, cache=cache)
+
+    assert receiver("20210123") == fake_log_list
+    assert list(receiver.stream("20210123")) == fake_log_list
+    assert list(receiver.batch("20210123")) == fake_log_list
+
+    assert fake_log_api.hits == ["20210123"] * 3
+    assert fake_log_api.not_modified == ["20210123"] * 2
+
+
+def test_changed_day_replaces_cached_payload(tmp_path, fake_log_api, fake_log_list):
+    cache = ResponseCache(tmp_path / "cache")
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url, cache=cache)
+    receiver("20210123")
+
+    fake_log_api.days["20210123"] = fake_log_api.days["20210123"][:2]
+    assert receiver("20210123") == fake_log_list[:2]
+    assert list(receiver.stream("20210123")) == fake_log_list[:2]
+    assert fake_log_api.not_modified == ["20210123"]
+
+
+def test_immutable_past_skips_network(tmp_path, fake_log_api, fake_log_list):
+    cache = ResponseCache(tmp_path / "cache", immutable_past=True)
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url, cache=cache)
+
+    for _ in range(3):
+        assert list(receiver.stream("20210123")) == fake_log_list
+    assert fake_log_api.hits == ["20210123"]
+
+
+def test_errors_are_not_cached(tmp_path, fake_log_api):
+    cache = ResponseCache(tmp_path / "cache", immutable_past=True)
+    receiver = log_receiver.LogReceiver(fake_log_api.base_url, cache=cache)
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            list(receiver.stream("20210127"))
+        with pytest.raises(log_receiver.RequestError):
+            receiver("20210125")
+
+    assert fake_log_api.hits == ["20210127", "20210125"] * 2
+    assert not list(cache.directory.iterdir())
+
+
+def test_past_dates():
+    assert log_receiver._is_past_date("20210123")
+    assert not log_receiver._is_past_date("29991231")
+    assert not log_receiver._is_past_date("latest")
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path / "cache")
+    urls = [f"http://api/logs/2021012{day}" for day in range(3)]
+    for number, url in enumerate(urls):
+        writer = cache.writer(url, etag=f'"{url}"')
+        writer.write(b'{"error": "", "logs": []}' * 100)
+        writer.commit()
+        os.utime(f"{cache.key_path(url)}.meta", (1000 + number, 1000 + number))
+
+    # Reading refreshes the use time, so the oldest entry is not evicted
+    assert cache.get(urls[0]).etag == f'"{urls[0]}"'
+    entry_size = sum(path.stat().st_size for path in cache.directory.iterdir()) // 3
+
+    assert cache.prune(2 * entry_size) == 1
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[0]) is not None and cache.get(urls[2]) is not None
@@ -0,0 +1,214 @@
+import sqlite3
+
+import pytest
+
+from log_processing_demo import database
+from log_processing_demo.log_item import LogItem
+
+
+@pytest.fixture(params=[database.Database, database.PartitionedDatabase])
+def db_class(request):
+    return request.param
+
+
+@pytest.fixture
+def day_of_logs():
+    records = [
+        ("2021-01-23T10:00:05", "1", "Привет"),
+        ("2021-01-23T10:00:40", "2", "hello"),
+        ("2021-01-23T10:59:59", "1", "ok"),
+        ("2021-01-23T11:30:00", "1", ""),
+        ("2021-01-24T00:00:01", "2", "next day"),
+    ]
+    return [
+        LogItem.parse_obj(
+            {
+                "created_at": created_at,
+                "first_name": f"Имя {user_id}",
+                "second_name": f"Фамилия {user_id}",
+                "user_id": user_id,
+                "message": message,
+            }
+        )
+        for created_at, user_id, message in records
+    ]
+
+
+def test_stats_by_minute_hour_and_user(tmp_db_path, db_class, day_of_logs):
+    db = db_class(tmp_db_path)
+    db.update(day_of_logs)
+
+    assert db.stats("2021-01-23", by="minute") == [
+        {"start": "2021-01-23 10:00:00", "messages": 2, "bytes": 17},
+        {"start": "2021-01-23 10:59:00", "messages": 1, "bytes": 2},
+        {"start": "2021-01-23 11:30:00", "messages": 1, "bytes": 0},
+    ]
+    assert db.stats("2021-01-23") == [
+        {"start": "2021-01-23 10:00:00", "messages": 3, "bytes": 19},
+        {"start": "2021-01-23 11:00:00", "messages": 1, "bytes": 0},
+    ]
+    assert db.stats("2021-01-23", by="user") == [
+        {
+            "user_id": "1",
+            "first_name": "Имя 1",
+            "second_name": "Фамилия 1",
+            "messages": 3,
+            "bytes": 14,
+        },
+        {
+            "user_id": "2",
+            "first_name": "Имя 2",
+            "second_name": "Фамилия 2",
+            "messages": 1,
+            "bytes": 5,
+        },
+    ]
+    assert db.stats("2021-01-25") == []
+
+
+def test_stats_within_interval(tmp_db_path, day_of_logs):
+    db = database.Database(tmp_db_path)
+    db.update(day_of_logs)
+
+    # Overlapping buckets are returned whole
+    assert db.stats("2021-01-23", "minute", ("10:00:30", "10:59:01")) == [
+        {"start": "2021-01-23 10:00:00", "messages": 2, "bytes": 17},
+        {"start": "2021-01-23 10:59:00", "messages": 1, "bytes": 2},
+    ]
+    assert len(db.stats("2021-01-23", "hour", ("11:00:00", "12:00:00"))) == 1
+    with pytest.raises(ValueError):
+        db.stats("2021-01-23", "user", ("10:00:00", "11:00:00"))
+    with pytest.raises(ValueError):
+        db.stats("2021-01-23", "second")
+
+
+def test_rollups_skip_duplicates(tmp_db_path, db_class, day_of_logs):
+    db = db_class(tmp_db_path)
+    db.update(day_of_logs[:2])
+    db.update(day_of_logs, chunk_size=2)
+
+    assert sum(row["messages"] for row in db.stats("2021-01-23")) == 4
+    assert db.check_rollups() == []
+
+
+def test_rollups_follow_deletes(tmp_db_path, db_class, day_of_logs):
+    db = db_class(tmp_db_path)
+    db.update(day_of_logs)
+
+    db.delete_day("2021-01-24")
+    assert db.stats("2021-01-24", by="user") == []
+    assert len(db.stats("2021-01-23", by="user")) == 2
+
+    db.update(day_of_logs)
+    db.flush("2021-01-23")
+    assert db.stats("2021-01-23") == []
+    assert db.stats("2021-01-24") == [
+        {"start": "2021-01-24 00:00:00", "messages": 1, "bytes": 8}
+    ]
+    assert db.check_rollups() == []
+
+    db.flush()
+    assert db.stats("2021-01-24") == []
+    assert db.check_rollups() == []
+
+
+def test_check_finds_and_repairs_differences(tmp_db_path, db_class, day_of_logs):
+    db = db_class(tmp_db_path)
+    db.update(day_of_logs)
+    hour = db.cursor.execute("SELECT MIN(hour) FROM rollup_hours").fetchone()[0]
+    db.cursor.execute("UPDATE rollup_hours SET messages = 10 WHERE hour = ?", (hour,))
+    db.cursor.execute("DELETE FROM rollup_users WHERE user_id = '2'")
+    db.connection.commit()
+
+    differences = db.check_rollups()
+    assert {"rollup": "hour", "hour": hour} in [
+        {"rollup": item["rollup"], "hour": item.get("hour")} for item in differences
+    ]
+    assert [item["stored"] for item in differences if item["rollup"] == "user"] == [
+        None,
+        None,
+    ]
+    assert db.check_rollups(repair=True) == differences
+    assert db.check_rollups() == []
+    assert db.stats("2021-01-23")[0]["messages"] == 3
+
+
+def test_converted_db_keeps_rollups(tmp_db_path, day_of_logs):
+    database.Database(tmp_db_path).update(day_of_logs)
+
+    db = database.PartitionedDatabase(tmp_db_path)
+    assert len(db.stats("2021-01-23", by="user")) == 2
+    assert db.check_rollups() == []
+
+
+def test_upgrade_rolls_up_stored_messages(tmp_db_path):
+    connection = sqlite3.connect(tmp_db_path)
+    for migration in database.MIGRATIONS[:7]:
+        migration(connection.cursor())
+    connection.execute("PRAGMA user_version = 7")
+    connection.execute("INSERT INTO users VALUES (?, ?, ?)", ("1", "Имя", "Фамилия"))
+    connection.execute(
+        """
+        INSERT INTO log_messages (created_at, user_id, message, content_hash)
+        VALUES (1611360000000001, '1', 'They will be here by nightfall', 1)
+        """
+    )
+    connection.commit()
+    connection.close()
+
+    db = database.Database(tmp_db_path)
+    assert db.stats("2021-01-23") == [
+        {"start": "2021-01-23 00:00:00", "messages": 1, "bytes": 30}
+    ]
+    assert db.check_rollups() == []
+
+
+def test_buckets_before_1970(tmp_db_path, db_class):
+    items = [
+        LogItem.parse_obj(
+            {
+                "created_at": created_at,
+                "first_name": "Имя",
+                "second_name": "Фамилия",
+                "user_id": "1",
+                "message": "ok",
+            }
+        )
+        for created_at in ("1969-12-31T23:59:30", "1970-01-01T00:00:10")
+    ]
+    db = db_class(tmp_db_path)
+    db.update(items)
+
+    for by, start in (("minute", "23:59:00"), ("hour", "23:00:00")):
+        assert db.stats("1969-12-31", by=by) == [
+            {"start": f"1969-12-31 {start}", "messages": 1, "bytes": 2}
+        ]
+        assert db.stats("1970-01-01", by=by) == [
+            {"start": "1970-01-01 00:00:00", "messages": 1, "bytes": 2}
+        ]
+    assert len(db.stats("1969-12-31", by="user")) == 1
+    assert db.check_rollups() == []
+
+
+def test_upgrade_rounds_down_buckets_before_1970(tmp_db_path):
+    connection = sqlite3.connect(tmp_db_path)
+    for migration in database.MIGRATIONS[:9]:
+        migration(connection.cursor())
+    connection.execute("PRAGMA user_version = 9")
+    connection.execute("INSERT INTO users VALUES (?, ?, ?)", ("1", "Имя", "Фамилия"))
+    connection.execute(
+        "INSERT INTO log_messages (created_at, user_id, message) VALUES (-1, '1', 'ok')"
+    )
+    # Version 8 truncated the bucket numbers towards zero
+    for rollup, _, keys in database.ROLLUPS.values():
+        values = ", ".join(["0"] + ["'1'"] * (len(keys) - 1) + ["1", "2"])
+        connection.execute(f"INSERT INTO {rollup} VALUES ({values})")
+    connection.commit()
+    connection.close()
+
+    db = database.Database(tmp_db_path)
+    assert db.stats("1969-12-31", by="minute") == [
+        {"start": "1969-12-31 23:59:00", "messages": 1, "bytes": 2}
+    ]
+    assert db.stats("1970-01-01", by="minute") == []
+    assert db.check_rollups() == []
@@ -0,0 +1,156 @@
+import sqlite3
+
+import pytest
+
+from log_processing_demo import database
+
+
+@pytest.fixture(params=[database.Database, database.PartitionedDatabase])
+def db_class(request):
+    return request.param
+
+
+def _messages(results):
+    return [item["message"] for item in results]
+
+
+def _check_index(db, table="log_messages"):
+    # Compares the index with the content of its table
+    db.cursor.execute(
+        f"INSERT INTO {table}_fts ({table}_fts, rank) VALUES ('integrity-check', 1)"
+    )
+
+
+def test_search_words_phrases_and_prefixes(tmp_db_path, db_class, fake_log_list):
+    db = db_class(tmp_db_path)
+    db.update(fake_log_list)
+
+    assert _messages(db.search("nightfall")) == [fake_log_list[0].message]
+    assert _messages(db.search("NIGHTFALL")) == [fake_log_list[0].message]
+    assert _messages(db.search('"never come back"')) == [fake_log_list[1].message]
+    assert _messages(db.search('"come never"')) == []
+    assert _messages(db.search("lemb*")) == [fake_log_list[2].message]
+    assert len(db.search("they OR shall")) == 3
+    assert db.search("nightfall", iso_format=True)[0] == {
+        **fake_log_list[0].dict(),
+        "created_at": "2021-01-23 00:48:18",
+    }
+
+
+def test_search_ranks_best_matches_first(tmp_db_path, fake_log_list):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list)
+
+    results = db.search("you")
+    # Same frequency of 'you' in a shorter message ranks higher, one use ranks lowest
+    assert _messages(results) == [fake_log_list[i].message for i in (2, 3, 0)]
+
+
+def test_search_within_date_and_interval(
+    tmp_db_path, db_class, fake_log_list, fake_log_for_two_dates
+):
+    db = db_class(tmp_db_path)
+    db.update(fake_log_list + fake_log_for_two_dates[1:])
+
+    assert len(db.search("you")) == 4
+    assert len(db.search("you", "2021-01-23")) == 3
+    assert len(db.search("you", "2021-01-24")) == 1
+    assert len(db.search("you", "2021-01-23", ("08:00:00", "14:00:00"))) == 2
+    assert db.search("you", "2021-01-25") == []
+    with pytest.raises(ValueError):
+        db.search("you", time_interval=("10:00:00", "14:00:00"))
+
+
+def test_search_pagination(
+    tmp_db_path, db_class, fake_log_list, fake_log_for_two_dates
+):
+    db = db_class(tmp_db_path)
+    db.update(fake_log_list + fake_log_for_two_dates[1:])
+
+    everything = db.search("you OR the", limit=10)
+    pages = [db.search("you OR the", limit=2, offset=offset) for offset in (0, 2, 4)]
+    assert [item for page in pages for item in page] == everything
+    assert len(everything) == 5
+    assert db.search("you OR the", limit=2, offset=4) == everything[4:]
+    assert db.search("you OR the", limit=2, offset=5) == []
+
+
+def test_index_follows_updates_and_deletes(tmp_db_path, fake_log_for_two_dates):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_for_two_dates)
+    db.update(fake_log_for_two_dates)
+    assert len(db.search("the")) == 2
+    _check_index(db)
+
+    db.delete_day("2021-01-24")
+    assert len(db.search("the")) == 1
+    _check_index(db)
+
+    db.flush()
+    assert db.search("the") == []
+    _check_index(db)
+
+
+def test_partitioned_index_is_dropped_with_partition(
+    tmp_db_path, fake_log_for_two_dates
+):
+    db = database.PartitionedDatabase(tmp_db_path)
+    db.update(fake_log_for_two_dates)
+
+    db.flush("2021-01-23")
+    assert len(db.search("the")) == 1
+    tables = [
+        name
+        for (name,) in db.cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name GLOB 'log_messages_2021*'"
+        )
+    ]
+    assert tables and all(name.startswith("log_messages_20210124") for name in tables)
+
+
+def test_converted_db_is_searchable(tmp_db_path, fake_log_for_two_dates):
+    database.Database(tmp_db_path).update(fake_log_for_two_dates)
+
+    db = database.PartitionedDatabase(tmp_db_path)
+    assert len(db.search("the")) == 2
+    _check_index(db)
+    _check_index(db, "log_messages_20210123")
+
+
+def test_upgrade_indexes_stored_messages(tmp_db_path, fake_log_list_sorted):
+    connection = sqlite3.connect(tmp_db_path)
+    for migration in database.MIGRATIONS[:6]:
+        migration(connection.cursor())
+    connection.execute("PRAGMA user_version = 6")
+    connection.execute("INSERT INTO users VALUES (?, ?, ?)", ("1", "Имя", "Фамилия"))
+    connection.execute(
+        """
+        INSERT INTO log_messages (created_at, user_id, message, content_hash)
+        VALUES (1611360000000001, '1', 'They will be here by nightfall', 1)
+        """
+    )
+    connection.commit()
+    connection.close()
+
+    db = database.Database(tmp_db_path)
+    assert _messages(db.search("nightfall")) == ["They will be here by nightfall"]
+
+
+@pytest.mark.parametrize("query", ['"unterminated', "AND", "", "word:", "cold."])
+def test_malformed_query(tmp_db_path, db_class, fake_log_list, query):
+    db = db_class(tmp_db_path)
+    with pytest.raises(database.SearchQueryError):
+        db.search(query)
+
+    db.update(fake_log_list)
+    with pytest.raises(database.SearchQueryError):
+        db.search(query)
+
+
+def test_only_query_errors_are_search_query_errors(tmp_db_path, fake_log_list):
+    db = database.Database(tmp_db_path)
+    db.update(fake_log_list)
+    db.cursor.execute("DROP TABLE log_messages_fts")
+
+    with pytest.raises(sqlite3.OperationalError):
+        db.search("nightfall")
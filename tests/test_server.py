@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import signal
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+from log_processing_demo import database, log_receiver, ndjson, server, watch
+
+
+def ndjson_lines(response):
+    return [json.loads(line) for line in response.iter_lines() if line]
+
+
+@pytest.fixture
+def stored_db_path(tmp_db_path, fake_log_list):
+    database.Database(tmp_db_path).update(fake_log_list)
+    return tmp_db_path
+
+
+@pytest.fixture
+def query_server(request, stored_db_path):
+    options = getattr(request, "param", {})
+    query_server = server.QueryServer(
+        stored_db_path, ("127.0.0.1", 0), pool_size=2, **options
+    )
+    thread = threading.Thread(
+        target=query_server.serve_forever, args=(0.01,), daemon=True
+    )
+    thread.start()
+    yield query_server
+    query_server.shutdown()
+    query_server.server_close()
+    thread.join()
+
+
+def test_server_answers_queries_like_commands(query_server, stored_db_path):
+    db = database.Database(stored_db_path)
+    session = requests.Session()
+
+    response = session.get(f"{query_server.url}/logs/2021-01-23")
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    stream = io.BytesIO()
+    ndjson.write_ndjson(db.iter_read("2021-01-23", iso_format=True), stream)
+    expected = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert ndjson_lines(response) == expected
+
+    response = session.get(
+        f"{query_server.url}/logs/2021-01-23", params={"interval": "08:00:00-14:00:00"}
+    )
+    assert ndjson_lines(response) == db.read(
+        "2021-01-23", ("08:00:00", "14:00:00"), iso_format=True
+    )
+    response = session.get(f"{query_server.url}/search", params={"q": "precious"})
+    assert ndjson_lines(response) == db.search("precious", iso_format=True)
+    response = session.get(
+        f"{query_server.url}/stats/2021-01-23", params={"by": "user"}
+    )
+    assert ndjson_lines(response) == db.stats("2021-01-23", "user")
+
+
+def test_server_pages_logs(query_server, stored_db_path):
+    db = database.Database(stored_db_path)
+    url = f"{query_server.url}/logs/2021-01-23"
+
+    rows, cursor = [], None
+    while True:
+        response = requests.get(url, params={"limit": 2, "desc": 1, "cursor": cursor})
+        rows += ndjson_lines(response)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert rows == db.read("2021-01-23", iso_format=True)[::-1]
+
+
+@pytest.mark.parametrize(
+    "path, status",
+    [
+        ("/logs/2021-01-23?cursor=garbage", 400),
+        ("/logs/2021-01-23?cursor=WzkyMjMzNzIwMzY4NTQ3NzU4MDgsICIxIiwgMV0", 400),
+        ("/logs/2021-01-23?limit=0", 400),
+        ("/logs/yesterday", 400),
+        ("/logs/2021-01-23?interval=08:00", 400),
+        ("/search?q=%22unterminated", 400),
+        ("/search", 400),
+        ("/stats/2021-01-23?by=week", 400),
+        ("/messages", 404),
+    ],
+)
+def test_server_reports_bad_requests(query_server, path, status):
+    response = requests.get(f"{query_server.url}{path}")
+
+    assert response.status_code == status
+    assert response.json()["error"]
+
+
+@pytest.mark.parametrize(
+    "query_server, status",
+    [({"busy_timeout": 0.1}, 200), ({"busy_timeout": 0.1, "wal": False}, 503)],
+    indirect=["query_server"],
+)
+def test_readers_dont_wait_for_writer_in_wal_mode(
+    query_server, stored_db_path, fake_log_list, status
+):
+    writer = sqlite3.connect(stored_db_path, isolation_level=None)
+    writer.execute("BEGIN EXCLUSIVE")
+    writer.execute("DELETE FROM log_messages")
+    try:
+        response = requests.get(f"{query_server.url}/logs/2021-01-23")
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+    assert response.status_code == status
+    if status == 200:
+        # The last committed state is read
+        assert len(ndjson_lines(response)) == len(fake_log_list)
+
+
+def test_serve_with_watcher_stops_on_sigterm(stored_db_path, fake_log_api):
+    query_server = server.QueryServer(stored_db_path, ("127.0.0.1", 0))
+    watcher = watch.Watcher(
+        log_receiver.LogReceiver(fake_log_api.base_url),
+        database.open_database(stored_db_path),
+        interval=0,
+        clock=lambda: datetime(2021, 1, 24, tzinfo=timezone.utc),
+    )
+    previous = signal.getsignal(signal.SIGTERM)
+    results = []
+    for result in server.serve(query_server, watcher):
+        results.append(result)
+        response = requests.get(f"{query_server.url}/logs/2021-01-24")
+        os.kill(os.getpid(), signal.SIGTERM)
+    query_server.server_close()
+
+    assert results == [watch.PollResult("20210124", len(ndjson_lines(response)), None)]
+    assert results[0].stored > 0
+    assert signal.getsignal(signal.SIGTERM) is previous
@@ -1,3 +1,7 @@
+import random
+
+import pytest
+
 from log_processing_demo import sort
 
 
@@ -30,3 +34,145 @@ def test_sort_real_data(fake_log_list, fake_log_list_sorted):
     my_list = fake_log_list
     sort.sort(my_list, key=lambda x: x.created_at)
     assert my_list == fake_log_list_sorted
+
+
+def test_sort_matches_sorted_on_patterns() -> None:
+    rng = random.Random(0)
+    random_list = [rng.randrange(1000) for _ in range(5000)]
+    nearly_sorted = sorted(random_list)
+    for _ in range(50):
+        index = rng.randrange(len(nearly_sorted) - 1)
+        nearly_sorted[index], nearly_sorted[index + 1] = (
+            nearly_sorted[index + 1],
+            nearly_sorted[index],
+        )
+    patterns = [
+        random_list,
+        sorted(random_list),
+        sorted(random_list, reverse=True),
+        nearly_sorted,
+        [5] * 100,
+        list(range(100)) + list(range(50)),
+    ]
+
+    for pattern in patterns:
+        my_list = list(pattern)
+        sort.sort(my_list)
+        assert my_list == sorted(pattern)
+
+
+def test_sort_is_stable() -> None:
+    rng = random.Random(1)
+    pairs = [(rng.randrange(20), index) for index in range(3000)]
+    descending = [(key, index) for index, key in enumerate([3, 2, 2, 1] * 20)]
+
+    for pattern in (pairs, descending, sorted(pairs, key=lambda x: -x[0])):
+        my_list = list(pattern)
+        sort.sort(my_list, key=lambda x: x[0])
+        assert my_list == sorted(pattern, key=lambda x: x[0])
+
+
+def test_sort_calls_key_once_per_element() -> None:
+    calls = []
+
+    def key(x):
+        calls.append(x)
+        return x
+
+    my_list = list(range(1000, 0, -1))
+    sort.sort(my_list, key=key)
+    assert len(calls) == 1000
+
+
+def test_external_sort_larger_than_memory(tmp_path, monkeypatch) -> None:
+    rng = random.Random(2)
+    pairs = [(rng.randrange(50), index) for index in range(2000)]
+    monkeypatch.setattr(sort, "MAX_MERGE_FAN_IN", 4)
+
+    result = sort.external_sort(
+        iter(pairs), key=lambda x: x[0], max_items_in_memory=150, tmp_dir=tmp_path
+    )
+
+    assert list(result) == sorted(pairs, key=lambda x: x[0])
+
+
+def test_external_sort_merges_runs_level_by_level(tmp_path, monkeypatch) -> None:
+    rng = random.Random(4)
+    items = [rng.randrange(1000) for _ in range(2000)]
+    monkeypatch.setattr(sort, "MAX_MERGE_FAN_IN", 4)
+    written = []
+    write_run = sort._write_run
+
+    def counting_write_run(run_items, tmp_dir):
+        run_items = list(run_items)
+        written.append(len(run_items))
+        return write_run(run_items, tmp_dir)
+
+    monkeypatch.setattr(sort, "_write_run", counting_write_run)
+
+    result = list(sort.external_sort(iter(items), max_items_in_memory=10))
+
+    assert result == sorted(items)
+    # 200 runs of 10 items: every item is spilled, then rewritten at most once per
+    # level of 4-way merges (200 -> 50 -> 12 -> 3)
+    assert sum(written) <= len(items) * 4
+
+
+def test_external_sort_corner_cases() -> None:
+    assert list(sort.external_sort([], max_items_in_memory=2)) == []
+    assert list(sort.external_sort([2, 1], max_items_in_memory=2)) == [1, 2]
+    assert list(sort.external_sort([3, 1, 2], max_items_in_memory=10)) == [1, 2, 3]
+
+
+def test_external_sort_real_data(fake_log_list, fake_log_list_sorted) -> None:
+    result = sort.external_sort(
+        fake_log_list, key=lambda x: x.created_at, max_items_in_memory=1
+    )
+    assert list(result) == fake_log_list_sorted
+
+
+def test_parallel_sort_is_stable_with_duplicate_timestamps(fake_log_list) -> None:
+    rng = random.Random(3)
+    items = [
+        fake_log_list[rng.randrange(len(fake_log_list))].copy(update={"message": index})
+        for index in range(1000)
+    ]
+    expected = sorted(items, key=lambda x: x.created_at)
+
+    sort.parallel_sort(items, key=lambda x: x.created_at, workers=3, threshold=0)
+
+    assert [item.message for item in items] == [item.message for item in expected]
+
+
+def test_parallel_sort_falls_back_to_serial(mocker) -> None:
+    executor = mocker.patch.object(sort, "ProcessPoolExecutor")
+    my_list = [3, 1, 2]
+
+    sort.parallel_sort(my_list, workers=4)
+
+    assert my_list == [1, 2, 3]
+    executor.assert_not_called()
+
+
+def test_sort_by_time_is_stable_with_duplicate_timestamps(fake_log_list) -> None:
+    pytest.importorskip("numpy")
+    rng = random.Random(4)
+    items = [
+        fake_log_list[rng.randrange(len(fake_log_list))].copy(update={"message": index})
+        for index in range(1000)
+    ]
+    expected = sorted(items, key=lambda x: x.created_at)
+
+    sort.sort_by_time(items)
+
+    assert [item.message for item in items] == [item.message for item in expected]
+
+
+def test_sort_by_time_without_numpy(mocker, fake_log_list, fake_log_list_sorted):
+    mocker.patch.object(sort, "numpy", None)
+    parallel_sort = mocker.spy(sort, "parallel_sort")
+
+    sort.sort_by_time(fake_log_list)
+
+    assert fake_log_list == fake_log_list_sorted
+    parallel_sort.assert_called_once()
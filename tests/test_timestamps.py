@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+
+from log_processing_demo import timestamps
+
+
+def test_epoch_round_trip():
+    value = datetime(2021, 1, 23, 0, 48, 18, 123456)
+    assert timestamps.from_epoch_us(timestamps.to_epoch_us(value)) == value
+    assert timestamps.to_epoch_us(datetime(1970, 1, 1, 0, 0, 1)) == 1000000
+
+
+def test_aware_datetime_is_converted_to_utc():
+    value = datetime(2021, 1, 23, 3, 0, tzinfo=timezone(timedelta(hours=3)))
+    assert timestamps.to_epoch_us(value) == timestamps.iso_to_epoch_us(
+        "2021-01-23T00:00:00"
+    )
+
+
+def test_epoch_us_to_iso_matches_str():
+    for value in [
+        datetime(2021, 1, 23, 0, 48, 18),
+        datetime(2021, 1, 23, 23, 59, 59, 999999),
+        datetime(2000, 2, 29, 12, 0, 0, 5),
+        datetime(1970, 1, 1),
+        datetime(2100, 3, 1, 1, 2, 3),
+    ]:
+        assert timestamps.epoch_us_to_iso(timestamps.to_epoch_us(value)) == str(value)
@@ -0,0 +1,84 @@
+import os
+import signal
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from log_processing_demo import database, log_receiver, watch
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def day_records(fake_api_response_dict):
+    # The API appends records in order of creation
+    return sorted(fake_api_response_dict["logs"], key=lambda item: item["created_at"])
+
+
+@pytest.fixture
+def watcher(tmp_db_path, fake_log_api, day_records):
+    fake_log_api.days = {"20210123": day_records[:2]}
+    clock = Clock(datetime(2021, 1, 23, 12, tzinfo=timezone.utc))
+    return watch.Watcher(
+        log_receiver.LogReceiver(fake_log_api.base_url),
+        database.Database(tmp_db_path),
+        interval=0,
+        clock=clock,
+    )
+
+
+def test_poll_stores_only_new_records(watcher, fake_log_api, day_records):
+    assert watcher.poll() == [watch.PollResult("20210123", 2, None)]
+
+    fake_log_api.days["20210123"] = day_records
+    assert watcher.poll() == [watch.PollResult("20210123", len(day_records) - 2, None)]
+    assert watcher.poll() == [watch.PollResult("20210123", 0, None)]
+    assert len(watcher.db.read("2021-01-23")) == len(day_records)
+    # A single keep-alive connection serves all polls
+    assert len(fake_log_api.connections) == 1
+
+
+def test_poll_finishes_previous_day_after_midnight(watcher, fake_log_api, day_records):
+    watcher.poll()
+    fake_log_api.days["20210123"] = day_records
+    fake_log_api.days["20210124"] = []
+    fake_log_api.failing_days.add("20210123")
+    watcher.clock.now = datetime(2021, 1, 24, 0, 1, tzinfo=timezone.utc)
+
+    first, second = watcher.poll()
+    assert first.date_string == "20210123"
+    assert isinstance(first.error, log_receiver.RequestError)
+    assert second == watch.PollResult("20210124", 0, None)
+
+    # The previous day is polled until it succeeds once
+    fake_log_api.failing_days.clear()
+    assert watcher.poll() == [
+        watch.PollResult("20210123", len(day_records) - 2, None),
+        watch.PollResult("20210124", 0, None),
+    ]
+    assert watcher.poll() == [watch.PollResult("20210124", 0, None)]
+
+
+def test_sigterm_stops_after_poll(watcher):
+    previous = signal.getsignal(signal.SIGTERM)
+    results = []
+    with watch.stop_on_signals(watcher):
+        for result in watcher.run():
+            results.append(result)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    assert results == [watch.PollResult("20210123", 2, None)]
+    assert signal.getsignal(signal.SIGTERM) is previous
+
+
+def test_db_errors_stop_watcher(watcher):
+    watcher.db.connection.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        watcher.poll()